@@ -18,6 +18,7 @@ contract ReceiptManager {
     event ReceiptIssued(address indexed buyer, uint256 purchaseAmount, uint256 purchaseTime, uint256 receiptIndex);
     event RefundIssued(address indexed buyer, uint256 refundAmount);
     event FundsReleased(address indexed seller, uint256 amount, uint256 receiptIndex);
+    event FundsReleaseSkipped(address indexed buyer, uint256 receiptIndex, string reason);
     event DebugLog(string message, uint256 value); // New event for logging;
 
     constructor(uint256 _returnWindow) {
@@ -49,6 +50,30 @@ contract ReceiptManager {
         return receiptIndex;
     }
 
+    // Issues several receipts in one transaction. msg.value must equal the sum of amounts;
+    // one ReceiptIssued is emitted per entry, in input order.
+    function issueReceiptsBatch(address[] calldata buyers, uint256[] calldata amounts) public payable returns (uint256) {
+        require(buyers.length == amounts.length, "Buyers and amounts length mismatch");
+        require(buyers.length > 0, "No receipts to issue");
+
+        uint256 total = 0;
+        for (uint256 i = 0; i < buyers.length; i++) {
+            require(amounts[i] > 0, "No funds sent");
+            total += amounts[i];
+
+            receipts[buyers[i]].push(Receipt({
+                purchaseAmount: amounts[i],
+                purchaseTime: block.timestamp,
+                refundIssued: false,
+                fundsReleased: false
+            }));
+            emit ReceiptIssued(buyers[i], amounts[i], block.timestamp, receipts[buyers[i]].length - 1);
+        }
+        require(total == msg.value, "Sent value does not match amounts");
+
+        return buyers.length;
+    }
+
     // Buyer can request a return for a specific transaction within the return window
     function requestReturn(uint256 receiptIndex) public {
         require(receiptIndex < receipts[msg.sender].length, "Invalid receipt index");
@@ -89,6 +114,45 @@ contract ReceiptManager {
         emit FundsReleased(seller, amountToRelease, receiptIndex);
     }
 
+    // Releases many receipts in one transaction with a single transfer to the seller.
+    // Receipts that can't be released are skipped (with a FundsReleaseSkipped event) instead of reverting the batch,
+    // so every entry emits exactly one FundsReleased or FundsReleaseSkipped, in input order.
+    function releaseFundsBatch(address[] calldata buyers, uint256[] calldata indices) public onlySeller returns (uint256) {
+        require(buyers.length == indices.length, "Buyers and indices length mismatch");
+
+        uint256 totalToRelease = 0;
+        for (uint256 i = 0; i < buyers.length; i++) {
+            if (indices[i] >= receipts[buyers[i]].length) {
+                emit FundsReleaseSkipped(buyers[i], indices[i], "Invalid receipt index");
+                continue;
+            }
+
+            Receipt storage receipt = receipts[buyers[i]][indices[i]];
+            if (receipt.refundIssued) {
+                emit FundsReleaseSkipped(buyers[i], indices[i], "Refund already issued");
+                continue;
+            }
+            if (block.timestamp < receipt.purchaseTime + returnWindow) {
+                emit FundsReleaseSkipped(buyers[i], indices[i], "Return window still open");
+                continue;
+            }
+            if (receipt.fundsReleased) {
+                emit FundsReleaseSkipped(buyers[i], indices[i], "Funds already released");
+                continue;
+            }
+
+            receipt.fundsReleased = true;
+            totalToRelease += receipt.purchaseAmount;
+
+            emit FundsReleased(seller, receipt.purchaseAmount, indices[i]);
+        }
+
+        if (totalToRelease > 0) {
+            payable(seller).transfer(totalToRelease);
+        }
+        return totalToRelease;
+    }
+
     // Function to retrieve receipt details
     function getReceipt(address _buyer, uint256 receiptIndex) public view returns (uint256, uint256, bool, bool) {
         require(receiptIndex < receipts[_buyer].length, "Invalid receipt index");
@@ -1,17 +1,29 @@
 from fastapi import FastAPI, Response, HTTPException, File, UploadFile, Form, Request, BackgroundTasks,Depends
 from fastapi.responses import RedirectResponse,JSONResponse, StreamingResponse, PlainTextResponse
 import uvicorn
-from web3.datastructures import AttributeDict
-from hexbytes import HexBytes
-from typing import Any
+from typing import Any, Literal
 from services.dataservice import DataService
-from services.models import create_seller_contract, issue_receipt_model, get_seller_receipts_model,get_buyer_receipts_model, request_return_model, release_return_model,credentials,new_user_data
+from services.models import create_seller_contract, issue_receipt_model, issue_receipts_batch_model, get_seller_receipts_model,get_buyer_receipts_model, request_return_model, release_return_model,release_funds_batch_model,credentials,new_user_data
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 import json
 import requests
+import asyncio
+import os
+import time
+from services.metrics import render_metrics, HTTP_REQUESTS, HTTP_REQUEST_DURATION, HTTP_IN_FLIGHT
+from services.logging_config import configure_logging, request_id_var
+from services.json_encoding import FastJSONResponse, compact_transaction_receipt
+from services.event_indexer import clear_checkpoint
+from services.storage import InvalidNextToken
+import logging
+import uuid
+
+configure_logging()
+logger = logging.getLogger(__name__)
 
 ds = DataService()
-app = FastAPI()
+app = FastAPI(default_response_class=FastJSONResponse)
 
 origins = [
     "*"
@@ -25,35 +37,104 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-def make_json_serializable(data):
-    if isinstance(data, AttributeDict):
-        return {k: make_json_serializable(v) for k, v in data.items()}
-    elif isinstance(data, list):
-        return [make_json_serializable(i) for i in data]
-    elif isinstance(data, HexBytes):
-        return data.hex()  # Convert HexBytes to hex string
-    elif isinstance(data, bytes):
-        return data.decode("utf-8")  # Convert bytes to string if possible
-    elif isinstance(data, (int, float, str, bool)) or data is None:
-        return data
-    else:
-        return str(data) 
+@app.middleware("http")
+async def assign_request_id(request: Request, call_next):
+    # Reuse the caller's id when there is one so logs can be matched across services
+    request_id = request.headers.get('X-Request-ID') or uuid.uuid4().hex
+    token = request_id_var.set(request_id)
+    try:
+        response = await call_next(request)
+    finally:
+        request_id_var.reset(token)
+    response.headers['X-Request-ID'] = request_id
+    return response
 
-@app.get("/reset_tables")
-async def reset_tables():
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    HTTP_IN_FLIGHT.inc()
+    start = time.perf_counter()
+    status = 500
     try:
-        message = ds.clear_tables()
-        response = ds.restart_ganache()
-        with open('data.json', 'w') as json_file:
-            json.dump({}, json_file, indent=4)
-        return {'ganache_response':response,'accounts_table_response':message}
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Label by route template (e.g. /jobs/{job_id}) rather than the raw path to keep label values bounded
+        route = request.scope.get('route')
+        route_path = route.path if route is not None else 'unmatched'
+        HTTP_REQUEST_DURATION.observe(time.perf_counter() - start, method=request.method, route=route_path)
+        HTTP_REQUESTS.inc(method=request.method, route=route_path, status=status)
+        HTTP_IN_FLIGHT.dec()
+
+@app.get("/metrics")
+async def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+@app.on_event("startup")
+async def connect_to_network():
+    await ds.receipt_smart_contract_interface.connect()
+    ds.confirmation_worker.start()
+    if ds.release_scheduler is not None:
+        ds.release_scheduler.start()
+    if os.getenv('RECEIPT_CACHE_WARM_ON_STARTUP', 'true').lower() == 'true':
+        # Warm in the background so startup doesn't wait on a table scan
+        app.state.receipt_cache_warmup = asyncio.create_task(asyncio.to_thread(ds.receipt_cache.warm))
+
+@app.on_event("shutdown")
+async def stop_background_workers():
+    await ds.confirmation_worker.stop()
+    if ds.release_scheduler is not None:
+        await ds.release_scheduler.stop()
+    await ds.receipt_smart_contract_interface.disconnect()
+
+def transaction_details_response(key, details, receipt):
+    """Response for a single-transaction endpoint; receipt='compact' drops the logs from the transaction receipt."""
+    if receipt == 'compact' and 'transaction_receipt' in details:
+        details = {**details, 'transaction_receipt': compact_transaction_receipt(details['transaction_receipt'])}
+    return FastJSONResponse({'success': True, key: details})
+
+async def reset_environment(progress=None):
+    message = await asyncio.to_thread(ds.clear_tables, progress)
+    if ds.release_scheduler is not None:
+        ds.release_scheduler.clear()
+    response = await asyncio.to_thread(ds.restart_ganache, 8545, progress)
+    with open('data.json', 'w') as json_file:
+        json.dump({}, json_file, indent=4)
+    # The new chain starts at block 0; an indexer that is down now must not resume from the old chain's height
+    await asyncio.to_thread(clear_checkpoint)
+    return {'ganache_response':response,'accounts_table_response':message}
+
+@app.get("/reset_tables")
+async def reset_tables(stream:bool=False):
+    """With stream=true, progress is sent as newline-delimited JSON while the reset runs, ending with a 'done' or 'error' line."""
+    if not stream:
+        try:
+            return await reset_environment()
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    # Progress is reported from worker threads, so hand it to the event loop
+    progress = lambda event: loop.call_soon_threadsafe(queue.put_nowait, event)
+    async def run_reset():
+        try:
+            result = await reset_environment(progress)
+            await queue.put({'stage':'done', **result})
+        except Exception as e:
+            await queue.put({'stage':'error', 'detail':str(e)})
+        await queue.put(None)
+    async def progress_lines():
+        task = asyncio.create_task(run_reset())
+        while (event := await queue.get()) is not None:
+            yield json.dumps(event) + "\n"
+        await task
+    return StreamingResponse(progress_lines(), media_type="application/x-ndjson")
     
 @app.get("/get_all_accounts_in_network") #
-async def get_all_accounts_in_network():
+async def get_all_accounts_in_network(block:str='latest'):
     try:
-        all_accounts = ds.get_all_network_accounts()
+        all_accounts = await ds.get_all_network_accounts(int(block) if block.isdigit() else block)
         return {'all_accounts':all_accounts}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -61,7 +142,7 @@ async def get_all_accounts_in_network():
 @app.get("/get_sellers_w_contracts")
 async def get_sellers_w_contracts():
     try:
-        all_sellers = ds.get_sellers_with_contracts()
+        all_sellers = await ds.get_sellers_with_contracts()
         return all_sellers
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -70,7 +151,7 @@ async def get_sellers_w_contracts():
 async def create_seller_contract(params:create_seller_contract):
     try:
         create_seller_contract_json = params.dict()
-        contract_address,success = ds.create_seller_account_contract(create_seller_contract_json['seller_account_address'],create_seller_contract_json['return_window_days'])
+        contract_address,success = await ds.create_seller_account_contract(create_seller_contract_json['seller_account_address'],create_seller_contract_json['return_window_days'])
         if success:
             return {'seller_address':create_seller_contract_json['seller_account_address'], 'contract_address':contract_address, 'return_window_days':create_seller_contract_json['return_window_days']}
         else:
@@ -82,7 +163,13 @@ async def create_seller_contract(params:create_seller_contract):
 async def issue_receipt(params:issue_receipt_model):
     try:
         issue_receipt_json = params.dict()
-        receipt_details, success, error_message = ds.issue_receipt(issue_receipt_json['seller_address'], issue_receipt_json['buyer_address'], issue_receipt_json['amount_eth'], issue_receipt_json['item_name'])
+        if not issue_receipt_json['wait_for_confirmation']:
+            job, success, error_message = await ds.submit_receipt(issue_receipt_json['seller_address'], issue_receipt_json['buyer_address'], issue_receipt_json['amount_eth'], issue_receipt_json['item_name'])
+            if success:
+                return JSONResponse(status_code=202, content={'success':success,'job_id':job['job_id'],'status':job['status']})
+            else:
+                raise HTTPException(status_code=500, detail=error_message)
+        receipt_details, success, error_message = await ds.issue_receipt(issue_receipt_json['seller_address'], issue_receipt_json['buyer_address'], issue_receipt_json['amount_eth'], issue_receipt_json['item_name'])
         if success:
             return {'success':success,'receipt_details':receipt_details}
         else:
@@ -90,15 +177,41 @@ async def issue_receipt(params:issue_receipt_model):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/issue_receipts/batch")
+async def issue_receipts_batch(params:issue_receipts_batch_model):
+    try:
+        issue_receipts_batch_json = params.dict()
+        if not issue_receipts_batch_json['receipts']:
+            raise HTTPException(status_code=400, detail='Provide at least one receipt')
+        issue_batch_details, success, error_message = await ds.issue_receipts_batch(issue_receipts_batch_json['receipts'], payer_address=issue_receipts_batch_json['payer_address'])
+        if success:
+            return {'success':success,'issue_batch_details':issue_batch_details}
+        else:
+            raise HTTPException(status_code=500, detail=error_message)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id:str, wait:float=0):
+    """Status of a receipt issued with wait_for_confirmation=false. Pass wait (seconds, max 30) to long-poll."""
+    job = await ds.get_job(job_id, min(max(wait,0),30))
+    if job is None:
+        raise HTTPException(status_code=404, detail='Job not found')
+    return {'job_id':job['job_id'],'status':job['status'],'receipt_details':job['receipt_details'],'error':job['error']}
+
 @app.post("/get_seller_receipts")
 async def get_seller_receipts(params:get_seller_receipts_model):
     try:
         get_seller_receipts_json = params.dict()
-        all_receipts, success = ds.get_receipts_for_seller(get_seller_receipts_json['seller_address'])
+        all_receipts, next_token, success = await ds.get_receipts_for_seller(get_seller_receipts_json['seller_address'], get_seller_receipts_json['limit'], get_seller_receipts_json['next_token'], get_seller_receipts_json['filter_by'], get_seller_receipts_json['sort_by'], get_seller_receipts_json['ascending'])
         if success:
-            return {'success':success,'all_receipts':all_receipts}
+            return {'success':success,'all_receipts':all_receipts,'next_token':next_token}
         else:
             raise HTTPException(status_code=500, detail='error with DynamoDB lookup')
+    except InvalidNextToken as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -106,54 +219,123 @@ async def get_seller_receipts(params:get_seller_receipts_model):
 async def get_buyer_receipts(params:get_buyer_receipts_model):
     try:
         get_buyer_receipts_json = params.dict()
-        all_receipts, success = ds.get_receipts_for_buyer(get_buyer_receipts_json['buyer_address'])
+        all_receipts, next_token, success = await ds.get_receipts_for_buyer(get_buyer_receipts_json['buyer_address'], get_buyer_receipts_json['limit'], get_buyer_receipts_json['next_token'], get_buyer_receipts_json['filter_by'], get_buyer_receipts_json['sort_by'], get_buyer_receipts_json['ascending'])
         if success:
-            return {'success':success,'all_receipts':all_receipts}
+            return {'success':success,'all_receipts':all_receipts,'next_token':next_token}
         else:
             raise HTTPException(status_code=500, detail='error with DynamoDB lookup')
+    except InvalidNextToken as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/receipts/export")
+async def export_receipts(seller:str=None, buyer:str=None, format:str='ndjson'):
+    """Streams every receipt of a seller or buyer as newline-delimited JSON or CSV, page by page."""
+    if (seller is None) == (buyer is None):
+        raise HTTPException(status_code=400, detail='Provide exactly one of seller or buyer')
+    if format not in ('ndjson', 'csv'):
+        raise HTTPException(status_code=400, detail='format must be ndjson or csv')
+    media_type = 'text/csv' if format == 'csv' else 'application/x-ndjson'
+    filename = f"receipts-{seller or buyer}.{format}"
+    # The generator does blocking DynamoDB reads; StreamingResponse iterates sync generators in a thread pool
+    return StreamingResponse(
+        ds.export_receipts(seller, buyer, format),
+        media_type=media_type,
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
+@app.get("/receipts/{transaction_hash}/eligibility")
+async def receipt_eligibility(transaction_hash:str):
+    """Whether /request_return and /release_funds would currently succeed for the receipt, without submitting a transaction."""
+    try:
+        eligibility, success, error_message = await ds.get_receipt_eligibility(transaction_hash)
     except Exception as e:
+        logger.exception("Request failed")
         raise HTTPException(status_code=500, detail=str(e))
+    if not success:
+        raise HTTPException(status_code=404, detail=error_message)
+    return {'transaction_hash':transaction_hash,'mode':ds.receipt_smart_contract_interface.preflight_mode,**eligibility}
 
 @app.post("/request_return")
-async def request_return(params:request_return_model):
+async def request_return(params:request_return_model, receipt: Literal['full', 'compact'] = 'full'):
     try:
         request_return_json = params.dict()
-        print(request_return_json)
-        return_request_details, success, error_message = ds.request_return(request_return_json['transaction_hash'])
-        print(return_request_details, success, error_message)
+        logger.debug("Return requested: %s", request_return_json)
+        return_request_details, success, error_message = await ds.request_return(request_return_json['transaction_hash'])
+        logger.debug("Return result: %s %s %s", return_request_details, success, error_message)
         if success:
-            return {'success':success,'return_request_details':make_json_serializable(return_request_details)}
+            return transaction_details_response('return_request_details', return_request_details, receipt)
         else:
             raise HTTPException(status_code=500, detail=error_message)
+    except HTTPException:
+        raise
     except Exception as e:
-        print('For some reason the exception is firing', e)
+        logger.exception("Request failed")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/release_funds") #wait for return window to pass then seller can get money
-async def release_funds(params:release_return_model):
+async def release_funds(params:release_return_model, receipt: Literal['full', 'compact'] = 'full'):
     try:
         release_return_json = params.dict()
-        print(release_return_json)
-        release_return_details, success, error_message = ds.funds_release(release_return_json['transaction_hash'])
-        print(release_return_details, success, error_message)
+        logger.debug("Funds release requested: %s", release_return_json)
+        release_return_details, success, error_message = await ds.funds_release(release_return_json['transaction_hash'])
+        logger.debug("Funds release result: %s %s %s", release_return_details, success, error_message)
+        if success:
+            return transaction_details_response('release_return_details', release_return_details, receipt)
+        else:
+            raise HTTPException(status_code=500, detail=error_message)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.exception("Request failed")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/release_funds/batch")
+async def release_funds_batch(params:release_funds_batch_model):
+    try:
+        release_funds_batch_json = params.dict()
+        if not release_funds_batch_json['transaction_hashes'] and not release_funds_batch_json['seller_address']:
+            raise HTTPException(status_code=400, detail='Provide transaction_hashes or seller_address')
+        release_batch_details, success, error_message = await ds.funds_release_batch(release_funds_batch_json['transaction_hashes'], release_funds_batch_json['seller_address'])
         if success:
-            return {'success':success,'release_return_details':make_json_serializable(release_return_details)}
+            return {'success':success,'release_batch_details':release_batch_details}
         else:
             raise HTTPException(status_code=500, detail=error_message)
+    except HTTPException:
+        raise
     except Exception as e:
-        print('For some reason the exception is firing', e)
+        logger.exception("Request failed")
         raise HTTPException(status_code=500, detail=str(e))
 
+bearer = HTTPBearer(auto_error=False)
+
+def current_session(authorization: HTTPAuthorizationCredentials = Depends(bearer)):
+    """Dependency for endpoints that need a logged-in user: checks the bearer token from /verify_login without any I/O."""
+    claims = ds.session_tokens.verify(authorization.credentials) if authorization is not None else None
+    if claims is None:
+        raise HTTPException(status_code=401, detail='Invalid or expired session token', headers={'WWW-Authenticate': 'Bearer'})
+    return claims
+
+@app.get("/session")
+async def get_session(session: dict = Depends(current_session)):
+    return {'user_id':session['sub'],'account_address':session['addr'],'expires_at':session['exp']}
+
+@app.post("/logout")
+async def logout(session: dict = Depends(current_session)):
+    ds.session_tokens.revoke(session)
+    return {'success':True}
+
 @app.post("/verify_login") 
 async def verify_login(params:credentials):
     try:
         credentials_return_json = params.dict()
         username=credentials_return_json["username"]
         password=credentials_return_json["password"]
-        response = ds.verify_login(username,password)
+        response = await ds.verify_login(username,password)
         return response
     except Exception as e:
-        print('For some reason the exception is firing', e)
+        logger.exception("Request failed")
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/create_new_user") 
@@ -163,20 +345,34 @@ async def create_new_user(params:new_user_data):
         username=credentials_return_json["username"]
         password=credentials_return_json["password"]
         return_window=credentials_return_json["returnWindow"]
-        response = ds.create_new_user(username,password,return_window)
+        response = await ds.create_new_user(username,password,return_window)
         return response
        
     except Exception as e:
-        print('For some reason the exception is firing', e)
+        logger.exception("Request failed")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/receipt_cache/stats")
+async def receipt_cache_stats():
+    return ds.receipt_cache.stats()
+
+@app.get("/release_scheduler/stats")
+async def release_scheduler_stats():
+    if ds.release_scheduler is None:
+        return {'enabled': False}
+    return dict(ds.release_scheduler.stats(), enabled=True)
+
+@app.get("/rpc/stats")
+async def rpc_stats():
+    return {'endpoints': ds.receipt_smart_contract_interface.rpc_pool.stats()}
+
 @app.get("/get_user_data")
 async def get_user_data():
     try:
-        all_accounts = ds.get_all_accounts()
+        all_accounts = await ds.get_all_accounts()
         return all_accounts
     except Exception as e:
-        print('For some reason the exception is firing', e)
+        logger.exception("Request failed")
         raise HTTPException(status_code=500, detail=str(e))
 
 
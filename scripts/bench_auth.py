@@ -0,0 +1,66 @@
+"""
+Benchmark of the login and per-request authentication costs in services/auth.py. Nothing is sent to a node:
+
+    python -m scripts.bench_auth --accounts 10000
+
+Reports the scrypt cost of hash_password/verify_password for each PASSWORD_SCRYPT_N given with --scrypt-n,
+and compares checking a session token (SessionTokens.verify) with looking the account up in an SQLite
+Accounts table of --accounts rows (AccountsSQLite.account_exists), which is what an authenticated request
+costs with and without tokens.
+"""
+import argparse
+import asyncio
+import os
+import time
+import tempfile
+import timeit
+from services.auth import SessionTokens, hash_password, verify_password
+from services.sqlite_service import SQLiteDatabase, AccountsSQLite
+
+def per_call_us(statement, iterations, repeat=5):
+    return min(timeit.repeat(statement, number=iterations, repeat=repeat)) / iterations * 1e6
+
+def per_call_us_threaded(function, iterations):
+    """Like per_call_us, but awaiting asyncio.to_thread(function), as DataService calls the stores."""
+    async def run():
+        start = time.perf_counter()
+        for _ in range(iterations):
+            await asyncio.to_thread(function)
+        return time.perf_counter() - start
+    return min(asyncio.run(run()) for _ in range(5)) / iterations * 1e6
+
+def main(args):
+    print(f"{'PASSWORD_SCRYPT_N':>18} {'memory':>8} {'hash_password':>14} {'verify_password':>16}")
+    for exponent in args.scrypt_n:
+        n = 2**exponent
+        stored = hash_password('correct horse', n=n)
+        hash_ms = per_call_us(lambda: hash_password('correct horse', n=n), args.hash_iterations, repeat=3) / 1000
+        verify_ms = per_call_us(lambda: verify_password('correct horse', stored), args.hash_iterations, repeat=3) / 1000
+        print(f"{'2**' + str(exponent):>18} {128 * 8 * n // 2**20:6d}MiB {hash_ms:12.1f}ms {verify_ms:14.1f}ms")
+
+    with tempfile.TemporaryDirectory() as directory:
+        database = SQLiteDatabase(os.path.join(directory, 'bench.db'))
+        accounts = AccountsSQLite(database)
+        with database.transaction() as connection:
+            connection.executemany(
+                "INSERT INTO accounts (user_id, account_address, data) VALUES (?, ?, ?)",
+                ((f"user{i}", f"0x{i:040x}", f'{{"user_id": "user{i}", "account_address": "0x{i:040x}", "password": "x"}}') for i in range(args.accounts))
+            )
+        session_tokens = SessionTokens(secret='bench')
+        token, _ = session_tokens.issue(f"user{args.accounts // 2}", f"0x{args.accounts // 2:040x}")
+
+        lookup = lambda: accounts.account_exists(f"user{args.accounts // 2}")
+        rows = [('account_exists via asyncio.to_thread', per_call_us_threaded(lookup, args.iterations)),
+                ('account_exists, direct call', per_call_us(lookup, args.iterations)),
+                ('SessionTokens.verify', per_call_us(lambda: session_tokens.verify(token), args.iterations))]
+        print(f"\nper-request check, {args.accounts} accounts")
+        for name, microseconds in rows:
+            print(f"{name:40} {microseconds:8.1f}us {rows[0][1] / microseconds:6.1f}x")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scrypt-n', type=int, nargs='+', default=[14, 15, 16], help="exponents of PASSWORD_SCRYPT_N")
+    parser.add_argument('--hash-iterations', type=int, default=5)
+    parser.add_argument('--accounts', type=int, default=10000)
+    parser.add_argument('--iterations', type=int, default=5000)
+    main(parser.parse_args())
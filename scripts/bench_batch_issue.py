@@ -0,0 +1,90 @@
+"""
+Benchmark of issuing receipts one transaction each (DataService.issue_receipt, as POST /issue_receipt does) against
+issueReceiptsBatch transactions (DataService.issue_receipts_batch, as POST /issue_receipts/batch does), including
+the receipt writes, with each buyer paying and with one payer account paying for every buyer. Reports gas and
+wall time per receipt.
+
+Start Ganache with a block time and enough funded accounts for the buyers, then run from the repo root:
+
+    ganache --miner.blockTime 1 --accounts 12
+    STORAGE_BACKEND=sqlite SQLITE_PATH=bench.db python -m scripts.bench_batch_issue --receipts 200 --buyers 10
+
+The first account is the seller, the next --buyers accounts are the buyers and the one after them is the payer.
+The single path sends one receipt per buyer at a time, with all buyers in parallel; the per-buyer batch path
+sends each buyer's receipts in chunks of --batch-size; the payer batch path sends every receipt from the payer
+in chunks of --batch-size. Set --receipts equal to --buyers for a checkout burst of one receipt per buyer. --artifact deploys another compiled ReceiptManager (a JSON file with abi and bytecode) instead
+of build/contracts/ReceiptManager.json.
+"""
+import argparse
+import asyncio
+import json
+import time
+from services.dataservice import DataService
+
+async def gas_used(contract_interface, transaction_hashes):
+    # Receipts from a multi-receipt transaction are keyed <transaction hash>-<position>
+    unique_hashes = {transaction_hash.split('-')[0] for transaction_hash in transaction_hashes}
+    tx_receipts = await contract_interface.get_transaction_receipts(list(unique_hashes))
+    return sum(tx_receipt['gasUsed'] for tx_receipt in tx_receipts.values()), len(unique_hashes)
+
+async def issue_single(ds, seller, buyers, count, amount_eth):
+    async def buyer_worker(index):
+        hashes = []
+        for _ in range(index, count, len(buyers)):
+            receipt_details, success, error_message = await ds.issue_receipt(seller, buyers[index], amount_eth, 'bench')
+            if not success:
+                raise RuntimeError(error_message)
+            hashes.append(receipt_details['transaction_hash'])
+        return hashes
+    return [transaction_hash for hashes in await asyncio.gather(*[buyer_worker(index) for index in range(len(buyers))]) for transaction_hash in hashes]
+
+async def issue_batch(ds, seller, buyers, count, amount_eth, batch_size, payer=None):
+    entries = [{'seller_address': seller, 'buyer_address': buyers[i % len(buyers)], 'amount_eth': amount_eth, 'item_name': 'bench'} for i in range(count)]
+    response, success, error_message = await ds.issue_receipts_batch(entries, max_batch_size=batch_size, payer_address=payer)
+    if not success:
+        raise RuntimeError(error_message)
+    failed = [result['reason'] for result in response['results'] if result['status'] != 'Success']
+    if failed:
+        raise RuntimeError(f"{len(failed)} receipts failed, e.g. {failed[0]}")
+    return [result['receipt_details']['transaction_hash'] for result in response['results']]
+
+async def main(args):
+    ds = DataService()
+    contract_interface = ds.receipt_smart_contract_interface
+    if args.artifact:
+        with open(args.artifact) as f:
+            contract_interface.artifact = json.load(f)
+        await contract_interface.web3.is_connected()
+        contract_interface.rpc_pool.start()
+    else:
+        await contract_interface.connect()
+    accounts = await contract_interface.get_all_accounts_on_ganache()
+    seller, buyers, payer = accounts[0], accounts[1:1 + args.buyers], accounts[1 + args.buyers]
+    # Registers the seller's contract unless SQLITE_PATH already has one from an earlier run
+    await ds.create_seller_account_contract(seller, args.return_window_days)
+
+    rows = []
+    for name, issue in [('single', lambda: issue_single(ds, seller, buyers, args.receipts, args.amount_eth)),
+                        ('batch, buyers pay', lambda: issue_batch(ds, seller, buyers, args.receipts, args.amount_eth, args.batch_size)),
+                        ('batch, payer pays', lambda: issue_batch(ds, seller, buyers, args.receipts, args.amount_eth, args.batch_size, payer))]:
+        start = time.perf_counter()
+        transaction_hashes = await issue()
+        elapsed = time.perf_counter() - start
+        total_gas, transactions = await gas_used(contract_interface, transaction_hashes)
+        rows.append((name, transactions, total_gas / args.receipts, elapsed / args.receipts * 1000, args.receipts / elapsed))
+    await contract_interface.disconnect()
+
+    print(f"{args.receipts} receipts, {len(buyers)} buyers, batches of up to {args.batch_size}")
+    print(f"{'path':18} {'transactions':>12} {'gas/receipt':>12} {'ms/receipt':>11} {'receipts/s':>11}")
+    for name, transactions, gas_per_receipt, ms_per_receipt, throughput in rows:
+        print(f"{name:18} {transactions:12d} {gas_per_receipt:12.0f} {ms_per_receipt:11.1f} {throughput:11.1f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--receipts', type=int, default=200)
+    parser.add_argument('--buyers', type=int, default=10)
+    parser.add_argument('--batch-size', type=int, default=50)
+    parser.add_argument('--amount-eth', type=float, default=0.01)
+    parser.add_argument('--return-window-days', type=int, default=30)
+    parser.add_argument('--artifact')
+    asyncio.run(main(parser.parse_args()))
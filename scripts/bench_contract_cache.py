@@ -0,0 +1,76 @@
+"""
+Microbenchmarks for the contract object cache, the precompiled event decoders and the slim contract artifact
+in ReceiptsContractInterface. Nothing is sent to a node, so no Ganache is needed:
+
+    python -m scripts.bench_contract_cache --iterations 2000
+
+Each row compares the per-request work before (a fresh web3.eth.contract per call, a fresh event object per
+log, parsing the full Truffle artifact) with what the interface does now.
+"""
+import argparse
+import json
+import os
+import time
+import timeit
+from eth_abi import encode
+from eth_utils import event_abi_to_log_topic
+from hexbytes import HexBytes
+from services.smart_contract_interactions import ReceiptsContractInterface, ARTIFACT_PATH, SLIM_ARTIFACT_PATH
+
+CONTRACT_ADDRESS = "0x5FbDB2315678afecb367f032d93F642f64180aa3"
+BUYER_ADDRESS = "0x70997970C51812dc3A010C7d01b50e0d17dc79C8"
+
+def per_call_us(statement, iterations):
+    return min(timeit.repeat(statement, number=iterations, repeat=5)) / iterations * 1e6
+
+def receipt_issued_log(abi):
+    """A ReceiptIssued log as eth_getLogs returns it, built from the ABI."""
+    event_abi = next(entry for entry in abi if entry.get('type') == 'event' and entry['name'] == 'ReceiptIssued')
+    indexed = [entry for entry in event_abi['inputs'] if entry['indexed']]
+    data = [entry for entry in event_abi['inputs'] if not entry['indexed']]
+    values = {'buyer': BUYER_ADDRESS, 'purchaseAmount': 10**16, 'purchaseTime': int(time.time()), 'receiptIndex': 3}
+    return {
+        'address': CONTRACT_ADDRESS,
+        'topics': [HexBytes(event_abi_to_log_topic(event_abi))] + [HexBytes(encode([entry['type']], [values[entry['name']]])) for entry in indexed],
+        'data': HexBytes(encode([entry['type'] for entry in data], [values[entry['name']] for entry in data])),
+        'blockNumber': 1, 'blockHash': HexBytes(b'\x01' * 32), 'transactionHash': HexBytes(b'\x02' * 32),
+        'transactionIndex': 0, 'logIndex': 0, 'removed': False
+    }
+
+def main(args):
+    interface = ReceiptsContractInterface('http://127.0.0.1:8545')
+    web3 = interface.web3
+    abi = interface.contract_abi
+    log = receipt_issued_log(abi)
+
+    rows = []
+    rows.append(('contract object + requestReturn call data',
+        per_call_us(lambda: web3.eth.contract(address=CONTRACT_ADDRESS, abi=abi).functions.requestReturn(0)._encode_transaction_data(), args.iterations),
+        per_call_us(lambda: interface.get_contract(CONTRACT_ADDRESS).functions.requestReturn(0)._encode_transaction_data(), args.iterations)))
+    rows.append(('decode one ReceiptIssued log',
+        per_call_us(lambda: web3.eth.contract(address=CONTRACT_ADDRESS, abi=abi).events.ReceiptIssued().process_log(log), args.iterations),
+        per_call_us(lambda: interface.get_event_decoder('ReceiptIssued').process_log(log), args.iterations)))
+
+    def load_full():
+        with open(ARTIFACT_PATH) as f:
+            contract_json = json.load(f)
+        return contract_json['abi'], contract_json['bytecode']
+
+    def load_slim():
+        interface.artifact = None
+        return interface.load_artifact()
+
+    load_slim()
+    cold_iterations = max(1, args.iterations // 20)
+    rows.append((f'load artifact ({os.path.getsize(ARTIFACT_PATH) // 1024} KiB full vs {os.path.getsize(SLIM_ARTIFACT_PATH) // 1024} KiB slim)',
+        per_call_us(load_full, cold_iterations),
+        per_call_us(load_slim, cold_iterations)))
+
+    print(f"{'':48} {'before':>12} {'after':>12} {'speedup':>8}")
+    for name, before, after in rows:
+        print(f"{name:48} {before:10.1f}us {after:10.1f}us {before / after:7.1f}x")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=2000)
+    main(parser.parse_args())
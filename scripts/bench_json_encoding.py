@@ -0,0 +1,77 @@
+"""
+Benchmark of the response encoding for transaction receipts, on real receipts read from a node. Compares the
+old path (make_json_serializable, then FastAPI's jsonable_encoder and JSONResponse) with FastJSONResponse,
+for the full receipt and for ?receipt=compact.
+
+Issue some receipts first (e.g. with scripts/load_test.py or scripts/bench_batch_issue.py), then:
+
+    python -m scripts.bench_json_encoding --url http://127.0.0.1:8545 --receipts 200
+"""
+import argparse
+import asyncio
+import timeit
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from hexbytes import HexBytes
+from web3 import AsyncWeb3
+from web3.datastructures import AttributeDict
+from services import json_encoding
+from services.json_encoding import FastJSONResponse, compact_transaction_receipt
+
+def make_json_serializable(data):
+    """The recursive converter main.py used before FastJSONResponse, kept here as the reference."""
+    if isinstance(data, AttributeDict):
+        return {k: make_json_serializable(v) for k, v in data.items()}
+    elif isinstance(data, list):
+        return [make_json_serializable(i) for i in data]
+    elif isinstance(data, HexBytes):
+        return data.hex()
+    elif isinstance(data, bytes):
+        return data.decode("utf-8")
+    elif isinstance(data, (int, float, str, bool)) or data is None:
+        return data
+    else:
+        return str(data)
+
+async def fetch_receipts(url, count):
+    """The receipts of the newest count transactions that emitted logs."""
+    web3 = AsyncWeb3(AsyncWeb3.AsyncHTTPProvider(url))
+    receipts = []
+    block_number = await web3.eth.block_number
+    while block_number >= 0 and len(receipts) < count:
+        block = await web3.eth.get_block(block_number)
+        for tx_hash in block['transactions']:
+            tx_receipt = await web3.eth.get_transaction_receipt(tx_hash)
+            if tx_receipt['logs']:
+                receipts.append(tx_receipt)
+        block_number -= 1
+    return receipts[:count]
+
+def per_receipt_us(render, receipts, repeat):
+    return min(timeit.repeat(lambda: [render(tx_receipt) for tx_receipt in receipts], number=1, repeat=repeat)) / len(receipts) * 1e6
+
+def main(args):
+    receipts = asyncio.run(fetch_receipts(args.url, args.receipts))
+    if not receipts:
+        raise SystemExit("No transaction receipts with logs found on the node")
+    logs = sum(len(tx_receipt['logs']) for tx_receipt in receipts)
+
+    renderers = [
+        ('make_json_serializable + JSONResponse', lambda tx_receipt: JSONResponse(jsonable_encoder({'success': True, 'return_request_details': {'transaction_receipt': make_json_serializable(tx_receipt)}})).body),
+        ('FastJSONResponse', lambda tx_receipt: FastJSONResponse({'success': True, 'return_request_details': {'transaction_receipt': tx_receipt}}).body),
+        ('FastJSONResponse, receipt=compact', lambda tx_receipt: FastJSONResponse({'success': True, 'return_request_details': {'transaction_receipt': compact_transaction_receipt(tx_receipt)}}).body)
+    ]
+    print(f"{len(receipts)} receipts, {logs / len(receipts):.1f} logs per receipt on average, encoder: {'orjson' if json_encoding.orjson is not None else 'json'}")
+    baseline = None
+    for name, render in renderers:
+        microseconds = per_receipt_us(render, receipts, args.repeat)
+        size = sum(len(render(tx_receipt)) for tx_receipt in receipts) / len(receipts)
+        baseline = baseline or microseconds
+        print(f"{name:40} {microseconds:9.1f}us/receipt {baseline / microseconds:6.1f}x {size:9.0f} bytes")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:8545')
+    parser.add_argument('--receipts', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=5)
+    main(parser.parse_args())
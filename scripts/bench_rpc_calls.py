@@ -0,0 +1,130 @@
+"""
+Counts the JSON-RPC calls each contract operation makes, as sent to the node by the RPC pool's endpoints.
+Compares ReceiptsContractInterface (gas and fees from the fee oracle, with and without the preflight eth_call)
+with plain web3 calls that let web3 fill in gas, fees, chain id and nonce for every transaction, as the
+interface did before the fee oracle.
+
+Start Ganache without a block time, so each receipt is there at the first poll, then:
+
+    ganache
+    python -m scripts.bench_rpc_calls --runs 5
+
+--artifact uses another compiled ReceiptManager (a JSON file with abi and bytecode) instead of
+build/contracts/ReceiptManager.json. Each operation runs once uncounted first, so the fee oracle has
+learned its gas; the first call of each function after a restart adds one eth_estimateGas.
+"""
+import argparse
+import asyncio
+import json
+from collections import Counter
+from web3 import AsyncWeb3
+from services.smart_contract_interactions import ReceiptsContractInterface
+
+def count_calls(provider, counts):
+    """Counts every request provider sends, by JSON-RPC method."""
+    make_request, make_batch_request = provider.make_request, provider.make_batch_request
+
+    async def counted_request(method, params):
+        counts[method] += 1
+        return await make_request(method, params)
+
+    async def counted_batch_request(requests):
+        counts.update(method for method, _ in requests)
+        return await make_batch_request(requests)
+    provider.make_request, provider.make_batch_request = counted_request, counted_batch_request
+
+class Web3Defaults:
+    """The contract calls as plain web3 transactions, leaving gas, fees, chain id and nonce to web3."""
+    def __init__(self, url, abi, bytecode):
+        self.web3 = AsyncWeb3(AsyncWeb3.AsyncHTTPProvider(url))
+        self.abi = abi
+        self.bytecode = bytecode
+
+    async def transact(self, contract_function, tx_params):
+        tx_hash = await contract_function.transact(tx_params)
+        return await self.web3.eth.wait_for_transaction_receipt(tx_hash)
+
+    async def deploy_new_contract(self, seller_address, return_window_days):
+        deployer = self.web3.eth.contract(abi=self.abi, bytecode=self.bytecode)
+        return (await self.transact(deployer.constructor(return_window_days), {'from': seller_address})).contractAddress
+
+    async def issue_receipt(self, contract_address, seller_address, buyer_address, amount_eth):
+        contract = self.web3.eth.contract(address=contract_address, abi=self.abi)
+        tx_receipt = await self.transact(contract.functions.issueReceipt(buyer_address), {'from': buyer_address, 'value': self.web3.to_wei(amount_eth, 'ether')})
+        await self.web3.eth.get_block(tx_receipt['blockNumber'])
+
+    async def request_return(self, contract_address, buyer_address, receipt_index):
+        contract = self.web3.eth.contract(address=contract_address, abi=self.abi)
+        await self.transact(contract.functions.requestReturn(receipt_index), {'from': buyer_address})
+
+    async def release_funds(self, contract_address, buyer_address, receipt_index, seller_address):
+        contract = self.web3.eth.contract(address=contract_address, abi=self.abi)
+        await self.transact(contract.functions.releaseFunds(buyer_address, receipt_index), {'from': seller_address})
+
+async def main(args):
+    interface = ReceiptsContractInterface(args.url)
+    if args.artifact:
+        with open(args.artifact) as f:
+            interface.artifact = json.load(f)
+    else:
+        interface.check_artifact()
+    counts = Counter()
+    for endpoint in interface.rpc_pool.endpoints:
+        count_calls(endpoint.provider, counts)
+    defaults = Web3Defaults(args.url, interface.contract_abi, interface.contract_bytecode)
+    count_calls(defaults.web3.provider, counts)
+
+    seller, buyer = (await interface.get_all_accounts_on_ganache())[:2]
+    # Receipts on release_contract can be released right away, receipts on return_contract returned for a day
+    release_contract = await interface.deploy_new_contract(seller, 0)
+    return_contract = await interface.deploy_new_contract(seller, 1)
+
+    # Receipts for every return and release below, issued up front so they aren't counted
+    receipts_needed = 3 * (args.runs + 1)
+    for _ in range(receipts_needed):
+        await interface.issue_receipt(return_contract, seller, buyer, args.amount_eth)
+        await interface.issue_receipt(release_contract, seller, buyer, args.amount_eth)
+    return_indices = list(range(receipts_needed))
+    release_indices = list(range(receipts_needed))
+
+    operations = {
+        'deploy_new_contract': lambda client: client.deploy_new_contract(seller, 0),
+        'issue_receipt': lambda client: client.issue_receipt(release_contract, seller, buyer, args.amount_eth),
+        'request_return': lambda client: client.request_return(return_contract, buyer, return_indices.pop()),
+        'release_funds': lambda client: client.release_funds(release_contract, buyer, release_indices.pop(), seller)
+    }
+
+    async def measure(client, operation):
+        await operation(client)
+        before = counts.copy()
+        for _ in range(args.runs):
+            await operation(client)
+        return Counter({method: count / args.runs for method, count in (counts - before).items()})
+
+    columns = [('web3 defaults', defaults, None), ('PREFLIGHT_MODE=off', interface, 'off'), ('preflight', interface, 'view')]
+    results = {}
+    for name, operation in operations.items():
+        for column, client, preflight_mode in columns:
+            if preflight_mode is not None:
+                interface.preflight_mode = preflight_mode
+            results[name, column] = await measure(client, operation)
+            if client is defaults:
+                # web3 took nonces from the same accounts behind the nonce manager's back
+                interface.nonce_manager.reset()
+    await interface.disconnect()
+
+    print(f"JSON-RPC calls per operation, averaged over {args.runs} runs")
+    print(f"{'':22}" + "".join(f"{column:>20}" for column, _, _ in columns))
+    for name in operations:
+        print(f"{name:22}" + "".join(f"{sum(results[name, column].values()):20.1f}" for column, _, _ in columns))
+    print()
+    for (name, column), methods in results.items():
+        print(f"{name:22} {column:20} " + ", ".join(f"{method} {count:g}" for method, count in sorted(methods.items())))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:8545')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--amount-eth', type=float, default=0.01)
+    parser.add_argument('--artifact')
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,106 @@
+"""
+Benchmark of address allocation under concurrent signups. Runs --signups signups at once against an SQLite
+database and compares the old scan (list the node's accounts, then look each address up in the Accounts
+table until a free one turns up) with AccountPool's claim. Nothing is sent to a node:
+
+    python -m scripts.bench_signup --signups 30 --addresses 60 --existing 20 --workers 2 --latency-ms 5
+
+Reports the storage and RPC round-trips per signup, the time per signup, and how many addresses ended up
+with more than one user. --workers runs that many AccountPools on the same database, like API workers that
+each keep their own free set. --existing users already hold the first addresses. --latency-ms is added to
+every round-trip, like a DynamoDB or node call. Password hashing and contract deployment are left out; they cost the same either way.
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from collections import Counter
+from services.account_pool import AccountPool
+from services.sqlite_service import SQLiteDatabase, AccountsSQLite, AccountAddressesSQLite
+
+class CountingProxy:
+    """Forwards method calls to target, counting each one as a round-trip and adding latency to it."""
+    def __init__(self, target, counts, latency):
+        self.target = target
+        self.counts = counts
+        self.latency = latency
+
+    def __getattr__(self, name):
+        method = getattr(self.target, name)
+        def call(*args, **kwargs):
+            self.counts[name] += 1
+            time.sleep(self.latency)
+            return method(*args, **kwargs)
+        return call
+
+class FakeNode:
+    def __init__(self, addresses, counts, latency):
+        self.addresses = addresses
+        self.counts = counts
+        self.latency = latency
+
+    async def get_all_accounts_on_ganache(self):
+        self.counts['eth_accounts'] += 1
+        await asyncio.sleep(self.latency)
+        return list(self.addresses)
+
+async def signup_scan(node, accounts, username):
+    """create_new_user's address lookup before AccountPool."""
+    for address in await node.get_all_accounts_on_ganache():
+        if len(await asyncio.to_thread(accounts.address_used, address)) == 0:
+            break
+    else:
+        return None
+    success, _ = await asyncio.to_thread(accounts.insert_account, {'user_id': username, 'account_address': address, 'password': 'x'})
+    return address if success else None
+
+async def signup_pool(pool, accounts, username):
+    address = await pool.claim(username)
+    if address is None:
+        return None
+    success, _ = await asyncio.to_thread(accounts.insert_account, {'user_id': username, 'account_address': address, 'password': 'x'})
+    return address if success else None
+
+async def run(name, args, addresses):
+    with tempfile.TemporaryDirectory() as directory:
+        database = SQLiteDatabase(os.path.join(directory, 'bench.db'))
+        for index, address in enumerate(addresses[:args.existing]):
+            AccountsSQLite(database).insert_account({'user_id': f'existing{index}', 'account_address': address, 'password': 'x'})
+            AccountAddressesSQLite(database).claim_address(address, f'existing{index}')
+        counts = Counter()
+        latency = args.latency_ms / 1000
+        node = FakeNode(addresses, counts, latency)
+        accounts = CountingProxy(AccountsSQLite(database), counts, latency)
+        claims = CountingProxy(AccountAddressesSQLite(database), counts, latency)
+        if name == 'scan':
+            signup = lambda index: signup_scan(node, accounts, f'user{index}')
+        else:
+            pools = [AccountPool(node, claims, accounts) for _ in range(args.workers)]
+            signup = lambda index: signup_pool(pools[index % args.workers], accounts, f'user{index}')
+
+        start = time.perf_counter()
+        assigned = await asyncio.gather(*[signup(index) for index in range(args.signups)])
+        elapsed = time.perf_counter() - start
+
+        users_per_address = Counter(account['account_address'] for account in AccountsSQLite(database).get_all_accounts())
+        duplicates = sum(users - 1 for users in users_per_address.values() if users > 1)
+        signed_up = sum(1 for address in assigned if address is not None)
+        return name, sum(counts.values()) / args.signups, elapsed / args.signups * 1000, signed_up, duplicates, counts
+
+async def main(args):
+    addresses = [f"0x{index:040x}" for index in range(1, args.addresses + 1)]
+    print(f"{args.signups} concurrent signups, {args.addresses} addresses, {args.existing} already taken, {args.workers} AccountPool workers, {args.latency_ms} ms per round-trip")
+    print(f"{'allocation':12} {'round-trips/signup':>19} {'ms/signup':>10} {'signed up':>10} {'duplicates':>11}  calls")
+    for name in ('scan', 'pool'):
+        name, round_trips, ms_per_signup, signed_up, duplicates, counts = await run(name, args, addresses)
+        print(f"{name:12} {round_trips:19.1f} {ms_per_signup:10.1f} {signed_up:10d} {duplicates:11d}  {dict(counts)}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--signups', type=int, default=30)
+    parser.add_argument('--addresses', type=int, default=60)
+    parser.add_argument('--existing', type=int, default=20)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--latency-ms', type=float, default=5)
+    asyncio.run(main(parser.parse_args()))
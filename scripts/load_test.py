@@ -0,0 +1,94 @@
+"""
+Load test for the receipt API. Issues receipts through POST /issue_receipt with --concurrency requests in flight
+and reports throughput and latency. Meanwhile a probe calls GET /get_sellers_w_contracts every --probe-interval
+seconds; its latency shows whether the API keeps serving other requests while transactions are mining.
+
+Start Ganache with a block time, so each transaction actually waits to be mined, then the API, then the test:
+
+    ganache --miner.blockTime 1
+    STORAGE_BACKEND=sqlite uvicorn main:app --port 8010
+    python scripts/load_test.py --url http://127.0.0.1:8010 --requests 100 --concurrency 20
+
+The first network account becomes the seller (its contract is created if needed). Each of the --concurrency workers
+buys as its own buyer account while there are enough accounts (ganache --accounts N), like separate customers.
+"""
+import argparse
+import asyncio
+import statistics
+from collections import Counter
+import time
+import aiohttp
+
+def percentile(values, fraction):
+    if not values:
+        return float('nan')
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def summary(name, latencies):
+    return (f"{name}: p50 {percentile(latencies, 0.5) * 1000:.0f} ms, p95 {percentile(latencies, 0.95) * 1000:.0f} ms, "
+            f"max {max(latencies, default=float('nan')) * 1000:.0f} ms")
+
+async def setup(session, url, return_window_days):
+    async with session.get(f"{url}/get_all_accounts_in_network") as response:
+        response.raise_for_status()
+        accounts = [account['account_address'] for account in (await response.json())['all_accounts']]
+    seller, buyers = accounts[0], accounts[1:]
+    async with session.post(f"{url}/create_seller_contract", json={'seller_account_address': seller, 'return_window_days': return_window_days}) as response:
+        if response.status != 200 and 'already exists' not in await response.text():
+            raise RuntimeError(f"Could not create the seller contract: {await response.text()}")
+    return seller, buyers
+
+async def issue(session, url, seller, buyer, latencies, failures):
+    start = time.perf_counter()
+    body = {'seller_address': seller, 'buyer_address': buyer, 'amount_eth': 0.01, 'item_name': 'load test'}
+    async with session.post(f"{url}/issue_receipt", json=body) as response:
+        await response.read()
+        if response.status != 200:
+            failures.append((response.status, (await response.text())[:200]))
+    latencies.append(time.perf_counter() - start)
+
+async def probe(session, url, interval, latencies, done):
+    while not done.is_set():
+        start = time.perf_counter()
+        async with session.get(f"{url}/get_sellers_w_contracts") as response:
+            await response.read()
+        latencies.append(time.perf_counter() - start)
+        await asyncio.sleep(interval)
+
+async def main(args):
+    timeout = aiohttp.ClientTimeout(total=args.timeout)
+    connector = aiohttp.TCPConnector(limit=args.concurrency + 1)
+    async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+        seller, buyers = await setup(session, args.url, args.return_window_days)
+        latencies, failures, probe_latencies = [], [], []
+
+        async def worker(index):
+            buyer = buyers[index % len(buyers)]
+            for _ in range(index, args.requests, args.concurrency):
+                await issue(session, args.url, seller, buyer, latencies, failures)
+
+        done = asyncio.Event()
+        probe_task = asyncio.create_task(probe(session, args.url, args.probe_interval, probe_latencies, done))
+        start = time.perf_counter()
+        await asyncio.gather(*[worker(index) for index in range(args.concurrency)])
+        elapsed = time.perf_counter() - start
+        done.set()
+        await probe_task
+
+    print(f"{args.requests} requests, concurrency {args.concurrency}, {len(failures)} failed")
+    print(f"elapsed {elapsed:.2f} s, throughput {args.requests / elapsed:.2f} receipts/s")
+    for (status, detail), count in Counter(failures).most_common(5):
+        print(f"  {count} x HTTP {status}: {detail}")
+    print(summary("issue_receipt", latencies))
+    print(summary("probe", probe_latencies) + f" ({len(probe_latencies)} probes, mean {statistics.fmean(probe_latencies) * 1000:.0f} ms)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://127.0.0.1:8010')
+    parser.add_argument('--requests', type=int, default=100)
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--probe-interval', type=float, default=0.1)
+    parser.add_argument('--return-window-days', type=int, default=30)
+    parser.add_argument('--timeout', type=float, default=300)
+    asyncio.run(main(parser.parse_args()))
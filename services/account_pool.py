@@ -0,0 +1,71 @@
+import asyncio
+from collections import deque
+from eth_account import Account
+from services.signer import derive_keys
+
+def derive_addresses(mnemonic, count, passphrase=""):
+    """Derives the first count addresses of an HD wallet (m/44'/60'/0'/0/i, the path Ganache uses)."""
+    return [Account.from_key(key).address for key in derive_keys(mnemonic, count, passphrase)]
+
+class AccountPool:
+    """
+    Hands out unused network addresses to new users.
+    The free set is computed once per process (node accounts plus any HD-derived addresses, minus what's
+    already claimed). Each signup then pops a candidate and claims it with one conditional write; if another
+    worker got there first the write fails and the next candidate is tried.
+    """
+    def __init__(self, contract_interface, address_claims_db, accounts_db, mnemonic=None, derived_count=0):
+        self.contract_interface = contract_interface
+        self.address_claims_db = address_claims_db
+        self.accounts_db = accounts_db
+        self.mnemonic = mnemonic
+        self.derived_count = derived_count
+        self.free_addresses = None
+        self.pool_size = 0
+        self.lock = asyncio.Lock()
+
+    async def load(self):
+        addresses = list(await self.contract_interface.get_all_accounts_on_ganache())
+        if self.mnemonic and self.derived_count:
+            derived = await asyncio.to_thread(derive_addresses, self.mnemonic, self.derived_count)
+            addresses.extend(address for address in derived if address not in addresses)
+        claimed = await asyncio.to_thread(self.address_claims_db.get_claimed_addresses)
+        if claimed is None:
+            raise RuntimeError("Could not load claimed account addresses")
+        # Users created before the claims table existed only have their address in the Accounts table
+        legacy_accounts = await asyncio.to_thread(self.accounts_db.get_all_accounts)
+        claimed.update(account['account_address'] for account in legacy_accounts)
+        self.pool_size = len(addresses)
+        self.free_addresses = deque(address for address in addresses if address not in claimed)
+
+    async def claim(self, user_id):
+        """Returns a newly claimed address for user_id, or None if the pool is exhausted."""
+        while True:
+            async with self.lock:
+                if self.free_addresses is None:
+                    await self.load()
+                if not self.free_addresses:
+                    return None
+                address = self.free_addresses.popleft()
+            # Only the pop is serialized; the conditional write is what makes the claim safe across workers
+            try:
+                claimed = await asyncio.to_thread(self.address_claims_db.claim_address, address, user_id)
+            except Exception:
+                # The write failed without an answer, so the address may still be free; keep it for the next signup
+                async with self.lock:
+                    if self.free_addresses is not None:
+                        self.free_addresses.appendleft(address)
+                raise
+            if claimed:
+                return address
+
+    async def release(self, address):
+        """Gives a claimed address back, e.g. when creating the user failed after the claim."""
+        await asyncio.to_thread(self.address_claims_db.release_address, address)
+        async with self.lock:
+            if self.free_addresses is not None:
+                self.free_addresses.appendleft(address)
+
+    def reset(self):
+        """Recomputes the free set on the next claim, e.g. after the chain or tables were reset."""
+        self.free_addresses = None
@@ -0,0 +1,101 @@
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+PASSWORD_HASH_PREFIX = 'scrypt'
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode('ascii')
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+def hash_password(password, n=None, r=8, p=1):
+    """
+    Salted scrypt hash of password, stored as 'scrypt$n$r$p$salt$hash' so the cost can be raised later without
+    breaking existing hashes. The default n=2**14 (PASSWORD_SCRYPT_N) takes ~55 ms and 16 MiB per hash;
+    each doubling of n doubles both.
+    """
+    n = n or int(os.getenv('PASSWORD_SCRYPT_N', str(2**14)))
+    salt = os.urandom(16)
+    derived = hashlib.scrypt(password.encode('utf-8'), salt=salt, n=n, r=r, p=p, maxmem=256 * 1024 * 1024, dklen=32)
+    return f"{PASSWORD_HASH_PREFIX}${n}${r}${p}${_b64encode(salt)}${_b64encode(derived)}"
+
+def verify_password(password, stored):
+    """
+    Checks password against a stored hash. Returns (matches, needs_rehash); needs_rehash is True for accounts
+    created before passwords were hashed, whose password is still stored as given.
+    """
+    if not stored.startswith(PASSWORD_HASH_PREFIX + '$'):
+        return hmac.compare_digest(password.encode('utf-8'), stored.encode('utf-8')), True
+    _, n, r, p, salt, expected = stored.split('$')
+    derived = hashlib.scrypt(password.encode('utf-8'), salt=_b64decode(salt), n=int(n), r=int(r), p=int(p), maxmem=256 * 1024 * 1024, dklen=32)
+    return hmac.compare_digest(derived, _b64decode(expected)), False
+
+class TokenRevocationCache:
+    """Ids of tokens logged out before they expire. Entries are dropped once the token would have expired anyway."""
+    def __init__(self):
+        self.revoked = {}
+        self.lock = threading.Lock()
+
+    def revoke(self, token_id, expires_at):
+        with self.lock:
+            self.revoked[token_id] = expires_at
+            now = time.time()
+            for expired_id in [revoked_id for revoked_id, revoked_expiry in self.revoked.items() if revoked_expiry < now]:
+                del self.revoked[expired_id]
+
+    def is_revoked(self, token_id):
+        with self.lock:
+            return token_id in self.revoked
+
+class SessionTokens:
+    """
+    Issues and verifies signed, expiring session tokens carrying the user_id and account_address, so
+    authenticated requests are checked with an HMAC instead of an Accounts table lookup.
+    Tokens are '<payload>.<signature>', both base64url, signed with HMAC-SHA256.
+    Set SESSION_TOKEN_SECRET (shared by every worker); without it a random secret is used and tokens
+    only work against this process until it restarts. Revocations are kept in memory, per process.
+    """
+    def __init__(self, secret=None, ttl=None, revocations=None):
+        secret = secret or os.getenv('SESSION_TOKEN_SECRET')
+        if not secret:
+            logger.warning("SESSION_TOKEN_SECRET is not set; session tokens won't survive a restart.")
+            secret = secrets.token_hex(32)
+        self.secret = secret.encode('utf-8')
+        self.ttl = ttl or int(os.getenv('SESSION_TOKEN_TTL_SECONDS', '3600'))
+        self.revocations = revocations or TokenRevocationCache()
+
+    def _sign(self, payload):
+        return _b64encode(hmac.new(self.secret, payload.encode('ascii'), hashlib.sha256).digest())
+
+    def issue(self, user_id, account_address):
+        """Returns (token, expires_at)."""
+        now = int(time.time())
+        claims = {'sub': user_id, 'addr': account_address, 'iat': now, 'exp': now + self.ttl, 'jti': secrets.token_hex(8)}
+        payload = _b64encode(json.dumps(claims, separators=(',', ':')).encode('utf-8'))
+        return f"{payload}.{self._sign(payload)}", claims['exp']
+
+    def verify(self, token):
+        """Returns the token's claims, or None if it is malformed, tampered with, expired or revoked."""
+        try:
+            payload, signature = token.split('.')
+            if not hmac.compare_digest(signature, self._sign(payload)):
+                return None
+            claims = json.loads(_b64decode(payload))
+        except (ValueError, UnicodeError):
+            return None
+        if claims['exp'] < time.time() or self.revocations.is_revoked(claims['jti']):
+            return None
+        return claims
+
+    def revoke(self, claims):
+        self.revocations.revoke(claims['jti'], claims['exp'])
@@ -0,0 +1,164 @@
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+class ReceiptConfirmationWorker:
+    """
+    Tracks issueReceipt transactions that were submitted without waiting for them to be mined.
+    A background loop polls the pending transaction receipts in batches, fills in the mined
+    receipt fields (receipt_index, purchase_time, block_number) and saves the final receipt.
+
+    Jobs live in memory, so at startup every receipt still Pending in the store is queued again.
+    A job whose transaction is not mined within pending_timeout_seconds (counted from submission,
+    or from the restart for recovered jobs) is marked Failed, e.g. when the node dropped it.
+    """
+    def __init__(self, contract_interface, receipt_db, poll_interval=1.0, batch_size=50, job_retention_seconds=3600, persist_receipts=True, receipt_cache=None, release_scheduler=None, pending_timeout_seconds=600):
+        self.contract_interface = contract_interface
+        self.receipt_db = receipt_db
+        self.receipt_cache = receipt_cache
+        self.release_scheduler = release_scheduler
+        self.persist_receipts = persist_receipts
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.job_retention_seconds = job_retention_seconds
+        self.pending_timeout_seconds = pending_timeout_seconds
+        self.jobs = {}
+        self.job_events = {}
+        self.task = None
+
+    def add_job(self, tx_hash, pending_receipt):
+        """Registers a submitted transaction. The transaction hash doubles as the job id."""
+        job_id = tx_hash
+        self.jobs[job_id] = {
+            'job_id': job_id,
+            'status': 'Pending',
+            'receipt_details': pending_receipt,
+            'error': None,
+            'submitted_at': time.time(),
+            'completed_at': None
+        }
+        self.job_events[job_id] = asyncio.Event()
+        return self.jobs[job_id]
+
+    def get_job(self, job_id):
+        return self.jobs.get(job_id)
+
+    async def wait_for_job(self, job_id, timeout):
+        """Long-poll helper: waits up to timeout seconds for a pending job to finish."""
+        event = self.job_events.get(job_id)
+        if event is not None and timeout > 0:
+            try:
+                await asyncio.wait_for(event.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.get_job(job_id)
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    def load(self):
+        """Reads every Pending receipt from the store. Blocking; returns the pending receipts to queue again."""
+        pending_receipts = []
+        projection = ['transaction_hash', 'buyer_address', 'seller_address', 'seller_contract_address', 'amount', 'item_name', 'status']
+        for items in self.receipt_db.iter_receipt_pages(page_size=None, projection=projection):
+            for item in items:
+                if item.get('status') != 'Pending':
+                    continue
+                pending_receipts.append(dict(item, amount=float(item['amount'])))
+        return pending_receipts
+
+    async def run(self):
+        # With the event indexer running it owns the stored receipt state, so there is nothing to recover here
+        if self.persist_receipts:
+            try:
+                pending_receipts = await asyncio.to_thread(self.load)
+                for pending_receipt in pending_receipts:
+                    if pending_receipt['transaction_hash'] not in self.jobs:
+                        self.add_job(pending_receipt['transaction_hash'], pending_receipt)
+                logger.info("Confirmation worker recovered %d pending receipts.", len(pending_receipts))
+            except Exception:
+                logger.exception("Confirmation worker failed to load pending receipts")
+        while True:
+            try:
+                await self.poll_once()
+            except Exception as e:
+                logger.exception("Confirmation worker poll failed")
+            await asyncio.sleep(self.poll_interval)
+
+    async def poll_once(self):
+        """
+        Checks every pending job and completes the ones that have been mined. Receipts are requested batch_size
+        at a time, so a burst of jobs doesn't open more requests than that, but each job is still checked on every tick.
+        """
+        pending_ids = [job_id for job_id, job in self.jobs.items() if job['status'] == 'Pending']
+        for start in range(0, len(pending_ids), self.batch_size):
+            tx_receipts = await self.contract_interface.get_transaction_receipts(pending_ids[start:start+self.batch_size])
+            mined = [(job_id, tx_receipt) for job_id, tx_receipt in tx_receipts.items() if tx_receipt is not None]
+            await asyncio.gather(*[self.complete_job(job_id, tx_receipt) for job_id, tx_receipt in mined])
+            deadline = time.time() - self.pending_timeout_seconds
+            expired = [job_id for job_id, tx_receipt in tx_receipts.items() if tx_receipt is None and self.jobs[job_id]['submitted_at'] < deadline]
+            await asyncio.gather(*[self.expire_job(job_id) for job_id in expired])
+        self.prune_jobs()
+
+    async def expire_job(self, job_id):
+        job = self.jobs[job_id]
+        job['status'] = 'Failed'
+        job['error'] = f"Transaction was not mined within {self.pending_timeout_seconds} seconds"
+        if self.persist_receipts:
+            try:
+                await asyncio.to_thread(self.receipt_db.change_receipt_status, job_id, 'Failed', 'failed_time')
+            except Exception:
+                logger.exception("Could not mark receipt %s as failed", job_id)
+        job['completed_at'] = time.time()
+        self.job_events.pop(job_id).set()
+
+    async def complete_job(self, job_id, tx_receipt):
+        job = self.jobs[job_id]
+        pending_receipt = job['receipt_details']
+        try:
+            if tx_receipt['status'] != 1:
+                job['status'] = 'Failed'
+                job['error'] = 'Transaction reverted'
+                if self.persist_receipts:
+                    await asyncio.to_thread(self.receipt_db.change_receipt_status, job_id, 'Failed', 'failed_time')
+            else:
+                receipt_details = await self.contract_interface.build_receipt_details(
+                    pending_receipt['seller_contract_address'],
+                    pending_receipt['seller_address'],
+                    pending_receipt['buyer_address'],
+                    pending_receipt['amount'],
+                    tx_receipt
+                )
+                receipt_details['item_name'] = pending_receipt['item_name']
+                receipt_details['status'] = 'Active'
+                if self.persist_receipts:
+                    await asyncio.to_thread(self.receipt_db.insert_receipt, dict(receipt_details))
+                if self.receipt_cache is not None:
+                    self.receipt_cache.put(receipt_details)
+                if self.release_scheduler is not None:
+                    await self.release_scheduler.add(receipt_details)
+                job['receipt_details'] = receipt_details
+                job['status'] = 'Confirmed'
+        except Exception as e:
+            job['status'] = 'Failed'
+            job['error'] = str(e)
+        job['completed_at'] = time.time()
+        self.job_events.pop(job_id).set()
+
+    def prune_jobs(self):
+        """Forgets finished jobs after job_retention_seconds. Their receipts remain in DynamoDB."""
+        cutoff = time.time() - self.job_retention_seconds
+        for job_id in [job_id for job_id, job in self.jobs.items() if job['completed_at'] and job['completed_at'] < cutoff]:
+            del self.jobs[job_id]
@@ -6,10 +6,24 @@ import boto3
 from botocore.exceptions import ClientError
 from decimal import Decimal
 import os 
-from services.dynamoDB_service import ReceiptDyanmoDB,SellersDyanmoDB, AccountsDynamoDB
+from services.storage import create_stores
 from services.smart_contract_interactions import ReceiptsContractInterface
+from services.confirmation_worker import ReceiptConfirmationWorker
+from services.seller_registry import SellerRegistry, InMemoryInvalidationBus, FileInvalidationBus
+from services.account_pool import AccountPool
+from services.receipt_cache import ReceiptDetailsCache
+from services.release_scheduler import ReleaseScheduler
+from services.auth import SessionTokens, hash_password, verify_password
 import subprocess
 import time
+import asyncio
+import socket
+import csv
+import io
+from concurrent.futures import ThreadPoolExecutor
+import logging
+
+logger = logging.getLogger(__name__)
 
 def find_and_kill_process(port):
     """Find and kill the process running on a specific port."""
@@ -20,137 +34,486 @@ def find_and_kill_process(port):
         pid = int(result.split()[1])
         # Kill the process
         os.kill(pid, 9)
-        print(f"Stopped process with PID {pid} running on port {port}.")
+        logger.info("Stopped process with PID %d running on port %d.", pid, port)
     except subprocess.CalledProcessError:
-        print(f"No process found running on port {port}.")
+        logger.info("No process found running on port %d.", port)
+
+# Column order for CSV exports; attributes a receipt doesn't have are left empty
+RECEIPT_EXPORT_FIELDS = [
+    'transaction_hash', 'batch_transaction_hash', 'buyer_address', 'seller_address', 'seller_contract_address',
+    'item_name', 'amount', 'purchase_time', 'block_number', 'receipt_index', 'status', 'return_time', 'funds_release_time'
+]
+
+def export_value(value):
+    """DynamoDB returns numbers as Decimal; exports write them as plain numbers."""
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    return str(value)
+
+def wait_for_port_free(port, timeout=10.0, interval=0.05):
+    """Waits until nothing accepts connections on port. Returns False on timeout."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=interval):
+                pass
+        except OSError:
+            return True
+        time.sleep(interval)
+    return False
+
+def wait_for_rpc(url, timeout=30.0, interval=0.1):
+    """Waits until the node at url answers JSON-RPC requests. Returns False on timeout."""
+    web3 = Web3(Web3.HTTPProvider(url, request_kwargs={'timeout': 1}))
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if web3.is_connected():
+            return True
+        time.sleep(interval)
+    return False
 
 class DataService:
     def __init__(self):
-        self.seller_Dynamo_DB = SellersDyanmoDB()
-        self.receipt_Dynamo_DB = ReceiptDyanmoDB()
-        self.accounts_Dynamo_DB = AccountsDynamoDB()
-        self.receipt_smart_contract_interface = ReceiptsContractInterface("http://127.0.0.1:8545")
-        self.all_sellers = self.get_sellers_with_contracts()
-    def get_all_network_accounts(self):
-        all_accounts = self.receipt_smart_contract_interface.get_all_accounts_on_ganache()
-        all_accounts_enriched = [{'account_index':i,'account_address':account,'balance':self.get_account_balance(account)} for i,account in enumerate(all_accounts)]
+        # STORAGE_BACKEND picks DynamoDB (default) or an embedded SQLite database; the attribute names predate that choice
+        stores = create_stores()
+        self.seller_Dynamo_DB = stores.sellers
+        self.receipt_Dynamo_DB = stores.receipts
+        self.accounts_Dynamo_DB = stores.accounts
+        self.account_addresses_Dynamo_DB = stores.account_addresses
+        # RPC_URLS takes several comma-separated endpoints of the same chain; the first healthy one takes the writes
+        self.receipt_smart_contract_interface = ReceiptsContractInterface(os.getenv('RPC_URLS', 'http://127.0.0.1:8545'))
+        # Sellers are looked up lazily per address; set SELLER_REGISTRY_INVALIDATION_FILE when running several workers
+        invalidation_file = os.getenv('SELLER_REGISTRY_INVALIDATION_FILE')
+        self.seller_registry = SellerRegistry(
+            self.seller_Dynamo_DB,
+            ttl=float(os.getenv('SELLER_REGISTRY_TTL_SECONDS', '300')),
+            negative_ttl=float(os.getenv('SELLER_REGISTRY_NEGATIVE_TTL_SECONDS', '5')),
+            invalidation_bus=FileInvalidationBus(invalidation_file) if invalidation_file else InMemoryInvalidationBus()
+        )
+        # Set ACCOUNT_POOL_MNEMONIC/ACCOUNT_POOL_SIZE to add HD-derived addresses beyond the ones the node exposes
+        self.account_pool = AccountPool(
+            self.receipt_smart_contract_interface,
+            self.account_addresses_Dynamo_DB,
+            self.accounts_Dynamo_DB,
+            mnemonic=os.getenv('ACCOUNT_POOL_MNEMONIC'),
+            derived_count=int(os.getenv('ACCOUNT_POOL_SIZE', '0'))
+        )
+        # When the event indexer (services/event_indexer.py) is running it writes all on-chain receipt state,
+        # so the request path only stores the off-chain fields such as item_name
+        self.indexer_enabled = os.getenv('RECEIPT_INDEXER_ENABLED', 'false').lower() == 'true'
+        # A receipt's contract, buyer and index never change, so return/release lookups are served from memory
+        self.receipt_cache = ReceiptDetailsCache(self.receipt_Dynamo_DB, maxsize=int(os.getenv('RECEIPT_CACHE_SIZE', '10000')))
+        # With RELEASE_SCHEDULER_ENABLED=true funds are released automatically once a receipt's return window closes
+        self.release_scheduler = None
+        if os.getenv('RELEASE_SCHEDULER_ENABLED', 'false').lower() == 'true':
+            self.release_scheduler = ReleaseScheduler(
+                self.receipt_smart_contract_interface,
+                self.receipt_Dynamo_DB,
+                self.seller_registry,
+                self.funds_release_batch,
+                batch_size=int(os.getenv('RELEASE_SCHEDULER_BATCH_SIZE', '100')),
+                min_interval=float(os.getenv('RELEASE_SCHEDULER_MIN_INTERVAL_SECONDS', '1')),
+                retry_delay=float(os.getenv('RELEASE_SCHEDULER_RETRY_SECONDS', '5')),
+                max_attempts=int(os.getenv('RELEASE_SCHEDULER_MAX_ATTEMPTS', '5'))
+            )
+        self.session_tokens = SessionTokens()
+        self.confirmation_worker = ReceiptConfirmationWorker(self.receipt_smart_contract_interface, self.receipt_Dynamo_DB, persist_receipts=not self.indexer_enabled, receipt_cache=self.receipt_cache, release_scheduler=self.release_scheduler, pending_timeout_seconds=float(os.getenv('CONFIRMATION_TIMEOUT_SECONDS', '600')))
+    async def get_all_network_accounts(self, block='latest'):
+        all_accounts = await self.receipt_smart_contract_interface.get_all_accounts_on_ganache()
+        all_balances = await self.receipt_smart_contract_interface.get_balances_of_accounts(all_accounts, block)
+        all_accounts_enriched = [{'account_index':i,'account_address':account,'balance':balance} for i,(account,balance) in enumerate(zip(all_accounts,all_balances))]
         return all_accounts_enriched
-    def get_sellers_with_contracts(self):
-        all_sellers = self.seller_Dynamo_DB.get_all_sellers()
+    async def get_sellers_with_contracts(self):
+        all_sellers = await asyncio.to_thread(self.seller_Dynamo_DB.get_all_sellers)
+        self.seller_registry.prime(all_sellers)
         return {dictionary['seller_address']:dictionary for dictionary in all_sellers}
-    def get_account_balance(self,account_address):
-        balance_eth = self.receipt_smart_contract_interface.get_balance_of_account(account_address)
+    async def get_account_balance(self,account_address):
+        balance_eth = await self.receipt_smart_contract_interface.get_balance_of_account(account_address)
         return balance_eth
-    def create_seller_account_contract(self,account_address,return_window_days):
-        seller_exists = self.seller_Dynamo_DB.seller_exists(account_address)
+    # DynamoDB calls are blocking boto3 calls, so the async methods below push them onto a worker thread
+    async def create_seller_account_contract(self,account_address,return_window_days):
+        seller_exists = await asyncio.to_thread(self.seller_Dynamo_DB.seller_exists, account_address)
         if seller_exists==False:
-            contract_address = self.receipt_smart_contract_interface.deploy_new_contract(account_address,return_window_days)
-            self.seller_Dynamo_DB.insert_seller({'seller_address':account_address,'seller_contract_address':contract_address,'return_window_days':return_window_days})
-            self.all_sellers[account_address] = {'seller_address':account_address,'seller_contract_address':contract_address,'return_window_days':return_window_days}
+            contract_address = await self.receipt_smart_contract_interface.deploy_new_contract(account_address,return_window_days)
+            await asyncio.to_thread(self.seller_Dynamo_DB.insert_seller, {'seller_address':account_address,'seller_contract_address':contract_address,'return_window_days':return_window_days})
+            self.seller_registry.put({'seller_address':account_address,'seller_contract_address':contract_address,'return_window_days':return_window_days})
             return contract_address, True
         else:
             return None, False
-    def issue_receipt(self, seller_address, buyer_address, amount_eth, item_name):
-        # all_sellers = self.get_sellers_with_contracts()
-        if seller_address in self.all_sellers.keys():
-            contract_address = self.all_sellers[seller_address]['seller_contract_address']
-            receipt_details = self.receipt_smart_contract_interface.issue_receipt(contract_address,seller_address, buyer_address, amount_eth)
+    async def issue_receipt(self, seller_address, buyer_address, amount_eth, item_name):
+        seller = await asyncio.to_thread(self.seller_registry.get, seller_address)
+        if seller is not None:
+            contract_address = seller['seller_contract_address']
+            receipt_details = await self.receipt_smart_contract_interface.issue_receipt(contract_address,seller_address, buyer_address, amount_eth)
             receipt_details['item_name'] = item_name
             receipt_details['status'] = 'Active'
-            self.receipt_Dynamo_DB.insert_receipt(receipt_details)
+            self.receipt_cache.put(receipt_details)
+            if self.indexer_enabled:
+                await asyncio.to_thread(self.receipt_Dynamo_DB.upsert_receipts, {receipt_details['transaction_hash']: {'item_name': item_name}})
+            else:
+                await asyncio.to_thread(self.receipt_Dynamo_DB.insert_receipt, receipt_details)
+            if self.release_scheduler is not None:
+                await self.release_scheduler.add(receipt_details)
             return receipt_details, True, None
         else:
             return None, False, "Seller address does not have an associated contract"
-    def get_receipts_for_seller(self,seller_address):
-        all_seller_receipts = self.receipt_Dynamo_DB.search_by_seller_address(seller_address)
+    async def submit_receipt(self, seller_address, buyer_address, amount_eth, item_name):
+        """
+        Submits the issueReceipt transaction and records a pending receipt without waiting for it to be mined.
+        The confirmation worker completes the receipt later; the returned job is keyed by transaction hash.
+        """
+        seller = await asyncio.to_thread(self.seller_registry.get, seller_address)
+        if seller is not None:
+            contract_address = seller['seller_contract_address']
+            tx_hash = await self.receipt_smart_contract_interface.submit_issue_receipt(contract_address, buyer_address, amount_eth)
+            pending_receipt = {
+                "transaction_hash": tx_hash.hex(),
+                "buyer_address": buyer_address,
+                "seller_address": seller_address,
+                "seller_contract_address": contract_address,
+                "amount": amount_eth,
+                "item_name": item_name,
+                "status": "Pending"
+            }
+            if self.indexer_enabled:
+                # The indexer may already have seen the mined transaction, so never overwrite its status
+                await asyncio.to_thread(self.receipt_Dynamo_DB.upsert_receipts, {pending_receipt['transaction_hash']: {'item_name': item_name, 'status': 'Pending'}}, ('status',))
+            else:
+                await asyncio.to_thread(self.receipt_Dynamo_DB.insert_receipt, dict(pending_receipt))
+            job = self.confirmation_worker.add_job(pending_receipt['transaction_hash'], pending_receipt)
+            return job, True, None
+        else:
+            return None, False, "Seller address does not have an associated contract"
+    async def issue_receipts_batch(self, entries, max_batch_size=100, payer_address=None):
+        """
+        Issues many receipts with issueReceiptsBatch, sent as transactions of up to max_batch_size receipts.
+        With payer_address (e.g. a checkout account that has already collected the buyers' payments), that
+        account pays the escrow for every buyer, so entries are grouped per seller contract only and a burst
+        of one receipt per buyer still goes out as one transaction. Without it each buyer pays for their own
+        receipts, so entries are grouped per seller contract and buyer, and distinct buyers cost one
+        transaction each. The receipts are saved with one batch write. Returns a result per entry, in input order.
+        """
+        seller_addresses = list({entry['seller_address'] for entry in entries})
+        sellers = dict(zip(seller_addresses, await asyncio.gather(*[asyncio.to_thread(self.seller_registry.get, address) for address in seller_addresses])))
+        results = [None] * len(entries)
+        groups = {}
+        for position, entry in enumerate(entries):
+            seller = sellers[entry['seller_address']]
+            if seller is None:
+                results[position] = {'status':'Failed','reason':'Seller address does not have an associated contract'}
+            else:
+                groups.setdefault((seller['seller_contract_address'], entry['seller_address'], payer_address or entry['buyer_address']), []).append(position)
+
+        async def issue_group(contract_address, seller_address, group_payer_address, positions):
+            try:
+                issue_details = await self.receipt_smart_contract_interface.issue_receipts_batch(
+                    contract_address,
+                    seller_address,
+                    group_payer_address,
+                    [entries[position]['buyer_address'] for position in positions],
+                    [entries[position]['amount_eth'] for position in positions]
+                )
+            except Exception as e:
+                issue_details = {'status':'Failed','reason':str(e)}
+            if issue_details['status'] != 'Success':
+                for position in positions:
+                    results[position] = {'status':'Failed','reason':issue_details.get('reason','Transaction failed')}
+                return
+            for position, receipt_details in zip(positions, issue_details['receipts']):
+                receipt_details['item_name'] = entries[position]['item_name']
+                receipt_details['status'] = 'Active'
+                self.receipt_cache.put(receipt_details)
+                results[position] = {'status':'Success','receipt_details':receipt_details}
+            # Entries without a decoded ReceiptIssued event can't be keyed or saved
+            for position in positions[len(issue_details['receipts']):]:
+                results[position] = {'status':'Failed','reason':f"Transaction {issue_details['transaction_hash']} was mined but no ReceiptIssued event was found for this entry"}
+
+        # Different payers go out concurrently; chunks from the same payer are pipelined by the nonce manager
+        await asyncio.gather(*[
+            issue_group(contract_address, seller_address, group_payer_address, positions[start:start+max_batch_size])
+            for (contract_address, seller_address, group_payer_address), positions in groups.items()
+            for start in range(0, len(positions), max_batch_size)
+        ])
+
+        issued = [result['receipt_details'] for result in results if result['status'] == 'Success']
+        if issued:
+            if self.indexer_enabled:
+                saved = await asyncio.to_thread(self.receipt_Dynamo_DB.upsert_receipts, {receipt_details['transaction_hash']: {'item_name': receipt_details['item_name']} for receipt_details in issued})
+            else:
+                saved = await asyncio.to_thread(self.receipt_Dynamo_DB.insert_receipts_batch, [dict(receipt_details) for receipt_details in issued])
+            if not saved:
+                for result in results:
+                    if result['status'] == 'Success':
+                        result.update(status='Failed', reason='Receipt issued on chain but could not be saved')
+            if self.release_scheduler is not None:
+                for receipt_details in issued:
+                    await self.release_scheduler.add(receipt_details)
+        return {'issued':sum(1 for result in results if result['status'] == 'Success'),'results':results}, True, None
+    async def get_job(self, job_id, wait_seconds=0):
+        """Returns the issuance job, waiting up to wait_seconds for it to finish. Falls back to DynamoDB for jobs this process doesn't hold."""
+        job = await self.confirmation_worker.wait_for_job(job_id, wait_seconds)
+        if job is not None:
+            return job
+        receipt = await asyncio.to_thread(self.receipt_Dynamo_DB.search_by_transaction_id, job_id)
+        if receipt is None:
+            return None
+        status = receipt.get('status')
+        return {
+            'job_id': job_id,
+            'status': status if status in ('Pending', 'Failed') else 'Confirmed',
+            'receipt_details': receipt,
+            'error': None
+        }
+    async def get_receipts_for_seller(self,seller_address,limit=None,next_token=None,filter_by=None,sort_by=None,ascending=True):
+        all_seller_receipts, next_token = await asyncio.to_thread(self.receipt_Dynamo_DB.search_by_seller_address,seller_address,filter_by,sort_by,ascending,limit,next_token)
         if isinstance(all_seller_receipts,list):
-            return all_seller_receipts, True
+            return all_seller_receipts, next_token, True
         else:
-            return [], False
-    def get_receipts_for_buyer(self,buyer_address):
-        all_buyer_receipts = self.receipt_Dynamo_DB.search_by_buyer_address(buyer_address)
+            return [], None, False
+    async def get_receipts_for_buyer(self,buyer_address,limit=None,next_token=None,filter_by=None,sort_by=None,ascending=True):
+        all_buyer_receipts, next_token = await asyncio.to_thread(self.receipt_Dynamo_DB.search_by_buyer_address,buyer_address,filter_by,sort_by,ascending,limit,next_token)
         if isinstance(all_buyer_receipts,list):
-            return all_buyer_receipts, True
+            return all_buyer_receipts, next_token, True
+        else:
+            return [], None, False
+    def export_receipts(self, seller_address=None, buyer_address=None, export_format='ndjson'):
+        """
+        Generator over the receipts of a seller or buyer (oldest first) rendered as NDJSON lines or CSV rows.
+        Each DynamoDB page is rendered into one chunk as soon as it arrives, so memory use doesn't grow with the history.
+        """
+        if seller_address is not None:
+            pages = self.receipt_Dynamo_DB.iter_receipt_pages('seller_address', seller_address)
+        else:
+            pages = self.receipt_Dynamo_DB.iter_receipt_pages('buyer_address', buyer_address)
+        if export_format == 'csv':
+            buffer = io.StringIO()
+            writer = csv.DictWriter(buffer, fieldnames=RECEIPT_EXPORT_FIELDS, extrasaction='ignore')
+            writer.writeheader()
+            # Send the header right away so the client sees the download start
+            yield buffer.getvalue()
+            for items in pages:
+                buffer.seek(0)
+                buffer.truncate()
+                writer.writerows({key: export_value(value) for key, value in item.items()} for item in items)
+                yield buffer.getvalue()
         else:
-            return [], False
-    def request_return(self, transaction_hash):
-        # all_sellers = self.get_sellers_with_contracts()
-        receipt_details = self.receipt_Dynamo_DB.get_receipt_details(transaction_hash)
-        print(receipt_details)
-        if receipt_details['seller_address'] in self.all_sellers.keys():
-            return_request_details = self.receipt_smart_contract_interface.request_return(receipt_details['contract_address'], receipt_details['buyer_address'], receipt_details['receipt_index'])
-            print("return_request_details:",return_request_details)
+            for items in pages:
+                yield "".join(json.dumps(item, default=export_value) + "\n" for item in items)
+    async def get_receipt_details(self, transaction_hash):
+        """Receipt identity from the cache, going to DynamoDB (on a worker thread) only on a miss."""
+        receipt_details = self.receipt_cache.get(transaction_hash)
+        if receipt_details is None:
+            receipt_details = await asyncio.to_thread(self.receipt_cache.load, transaction_hash)
+        return receipt_details
+    async def request_return(self, transaction_hash):
+        receipt_details = await self.get_receipt_details(transaction_hash)
+        logger.debug("Receipt details for %s: %s", transaction_hash, receipt_details)
+        if receipt_details is None:
+            return None, False, "Receipt not found"
+        if await asyncio.to_thread(self.seller_registry.get, receipt_details['seller_address']) is not None:
+            eligibility = await self.receipt_smart_contract_interface.get_eligibility(receipt_details['contract_address'], receipt_details['buyer_address'], receipt_details['receipt_index'], actions=('return',))
+            if not eligibility['return']['eligible']:
+                return None, False, eligibility['return']['reason']
+            return_request_details = await self.receipt_smart_contract_interface.request_return(receipt_details['contract_address'], receipt_details['buyer_address'], receipt_details['receipt_index'])
+            logger.debug("Return request details: %s", return_request_details)
             if return_request_details['status'] == 'Success':
-                self.receipt_Dynamo_DB.change_receipt_status(transaction_hash,'Returned','return_time')
+                if not self.indexer_enabled:
+                    await asyncio.to_thread(self.receipt_Dynamo_DB.change_receipt_status, transaction_hash,'Returned','return_time')
+                self.receipt_cache.invalidate_status(transaction_hash)
+                if self.release_scheduler is not None:
+                    self.release_scheduler.discard(transaction_hash)
                 return return_request_details, True, None
             else:
                 return None, False, return_request_details['reason']
         else:
             return None, False, "Seller address does not have an associated contract"
-    def funds_release(self, transaction_hash):
-        # all_sellers = self.get_sellers_with_contracts()
-        receipt_details = self.receipt_Dynamo_DB.get_receipt_details(transaction_hash)
-        print(receipt_details)
-        if receipt_details['seller_address'] in self.all_sellers.keys():
-            release_return_details = self.receipt_smart_contract_interface.release_funds(receipt_details['contract_address'], receipt_details['buyer_address'], receipt_details['receipt_index'],receipt_details['seller_address'])
+    async def funds_release(self, transaction_hash):
+        receipt_details = await self.get_receipt_details(transaction_hash)
+        logger.debug("Receipt details for %s: %s", transaction_hash, receipt_details)
+        if receipt_details is None:
+            return None, False, "Receipt not found"
+        if await asyncio.to_thread(self.seller_registry.get, receipt_details['seller_address']) is not None:
+            eligibility = await self.receipt_smart_contract_interface.get_eligibility(receipt_details['contract_address'], receipt_details['buyer_address'], receipt_details['receipt_index'], receipt_details['seller_address'], actions=('release',))
+            if not eligibility['release']['eligible']:
+                return None, False, eligibility['release']['reason']
+            release_return_details = await self.receipt_smart_contract_interface.release_funds(receipt_details['contract_address'], receipt_details['buyer_address'], receipt_details['receipt_index'],receipt_details['seller_address'])
             if release_return_details['status'] == 'Success':
-                self.receipt_Dynamo_DB.change_receipt_status(transaction_hash,'Funds Released to Seller','funds_release_time')
+                if not self.indexer_enabled:
+                    await asyncio.to_thread(self.receipt_Dynamo_DB.change_receipt_status, transaction_hash,'Funds Released to Seller','funds_release_time')
+                self.receipt_cache.invalidate_status(transaction_hash)
+                if self.release_scheduler is not None:
+                    self.release_scheduler.discard(transaction_hash)
                 return release_return_details, True, None
             else:
                 return None, False, release_return_details['reason']
         else:
             return None, False, "Seller address does not have an associated contract"
 
-    def create_new_user(self, username, pwd,return_window):
-        all_network_accounts = self.get_all_network_accounts()
-        all_network_addresses = [account['account_address'] for account in all_network_accounts]
-        found_address = False
-        for network_address in all_network_addresses:
-            response = self.accounts_Dynamo_DB.address_used(network_address)
-            if len(response)==0:
-                found_address = True
-                break
-        if found_address==False:
-            return {"success":False,"message":"All 10 account addresses in Ganache network have been taken"}
-        success, message = self.accounts_Dynamo_DB.insert_account({'user_id':username,'account_address':network_address,'password':pwd})
+    async def get_receipt_eligibility(self, transaction_hash):
+        """Whether the receipt can currently be returned by its buyer and released to its seller, checked without sending anything."""
+        receipt_details = await self.get_receipt_details(transaction_hash)
+        if receipt_details is None:
+            return None, False, "Receipt not found"
+        eligibility = await self.receipt_smart_contract_interface.get_eligibility(receipt_details['contract_address'], receipt_details['buyer_address'], receipt_details['receipt_index'], receipt_details['seller_address'])
+        return eligibility, True, None
+
+    async def funds_release_batch(self, transaction_hashes=None, seller_address=None, max_batch_size=100):
+        """
+        Releases many receipts at once, either the given transaction hashes or every Active receipt of
+        seller_address whose return window has passed. Receipts are grouped per seller contract and sent as
+        releaseFundsBatch transactions of up to max_batch_size entries. Returns per-item results.
+        """
+        if seller_address is not None:
+            seller = await asyncio.to_thread(self.seller_registry.get, seller_address)
+            if seller is None:
+                return None, False, "Seller address does not have an associated contract"
+            seller_receipts, _ = await asyncio.to_thread(self.receipt_Dynamo_DB.search_by_seller_address, seller_address)
+            if seller_receipts is None:
+                return None, False, "error with DynamoDB lookup"
+            return_window_seconds = int(seller['return_window_days']) * 86400
+            now = datetime.utcnow()
+            receipts_details = {
+                receipt['transaction_hash']: {
+                    'contract_address': receipt['seller_contract_address'],
+                    'buyer_address': receipt['buyer_address'],
+                    'seller_address': receipt['seller_address'],
+                    'receipt_index': int(receipt['receipt_index'])
+                }
+                for receipt in seller_receipts
+                if receipt.get('status') == 'Active' and (now - datetime.strptime(receipt['purchase_time'], '%Y-%m-%d %H:%M:%S')).total_seconds() >= return_window_seconds
+            }
+            transaction_hashes = list(receipts_details.keys())
+        else:
+            # A hash listed twice would be released by its first entry and reported Failed by the second
+            transaction_hashes = list(dict.fromkeys(transaction_hashes))
+            receipts_details = await asyncio.to_thread(self.receipt_cache.get_many, transaction_hashes)
+            if receipts_details is None:
+                return None, False, "error with DynamoDB lookup"
+
+        seller_addresses = list({receipt_details['seller_address'] for receipt_details in receipts_details.values()})
+        sellers = dict(zip(seller_addresses, await asyncio.gather(*[asyncio.to_thread(self.seller_registry.get, address) for address in seller_addresses])))
+        results = {}
+        batches = {}
+        for transaction_hash in transaction_hashes:
+            receipt_details = receipts_details.get(transaction_hash)
+            if receipt_details is None:
+                results[transaction_hash] = {'status':'Failed','reason':'Receipt not found'}
+            elif sellers[receipt_details['seller_address']] is None:
+                results[transaction_hash] = {'status':'Failed','reason':'Seller address does not have an associated contract'}
+            else:
+                batches.setdefault((receipt_details['contract_address'], receipt_details['seller_address']), []).append(transaction_hash)
+
+        async def release_batch(contract_address, seller_address, batch_hashes):
+            try:
+                release_details = await self.receipt_smart_contract_interface.release_funds_batch(
+                    contract_address,
+                    [receipts_details[transaction_hash]['buyer_address'] for transaction_hash in batch_hashes],
+                    [receipts_details[transaction_hash]['receipt_index'] for transaction_hash in batch_hashes],
+                    seller_address
+                )
+            except Exception as e:
+                release_details = {'status':'Failed','reason':str(e)}
+            if release_details['status'] != 'Success':
+                for transaction_hash in batch_hashes:
+                    results[transaction_hash] = {'status':'Failed','reason':release_details.get('reason','Transaction failed')}
+                return
+            for transaction_hash, item_result in zip(batch_hashes, release_details['results']):
+                results[transaction_hash] = dict(item_result, release_transaction_hash=release_details['transaction_hash'])
+
+        # Different contracts go out concurrently; batches from the same seller are pipelined by the nonce manager
+        await asyncio.gather(*[
+            release_batch(contract_address, seller_address, batch_hashes[start:start+max_batch_size])
+            for (contract_address, seller_address), batch_hashes in batches.items()
+            for start in range(0, len(batch_hashes), max_batch_size)
+        ])
+
+        released_hashes = [transaction_hash for transaction_hash in transaction_hashes if results[transaction_hash]['status'] == 'Success']
+        if released_hashes and not self.indexer_enabled:
+            await asyncio.to_thread(self.receipt_Dynamo_DB.change_receipts_status_batch, released_hashes, 'Funds Released to Seller', 'funds_release_time')
+        for transaction_hash in released_hashes:
+            self.receipt_cache.invalidate_status(transaction_hash)
+        item_results = [dict(results[transaction_hash], transaction_hash=transaction_hash) for transaction_hash in transaction_hashes]
+        return {'released':len(released_hashes),'results':item_results}, True, None
+
+    async def create_new_user(self, username, pwd,return_window):
+        network_address = await self.account_pool.claim(username)
+        if network_address is None:
+            return {"success":False,"message":f"All {self.account_pool.pool_size} account addresses in the network have been taken"}
+        password_hash = await asyncio.to_thread(hash_password, pwd)
+        success, message = await asyncio.to_thread(self.accounts_Dynamo_DB.insert_account, {'user_id':username,'account_address':network_address,'password':password_hash})
         if not success:
+            await self.account_pool.release(network_address)
             res={"success":success,"message":message}
             return res
-        contract,success=self.create_seller_account_contract(network_address,return_window)
+        contract,success=await self.create_seller_account_contract(network_address,return_window)
         if not contract:
             contract=""
         return {"success":success,"message":message+" Contract: "+contract}
-    def verify_login(self,username,pwd):
-        accounts = self.accounts_Dynamo_DB.account_exists(username)
+    async def verify_login(self,username,pwd):
+        """Checks the credentials and, if they match, issues a session token for the account."""
+        accounts = await asyncio.to_thread(self.accounts_Dynamo_DB.account_exists, username)
         if len(accounts)==0:
             return {"success":False,"message":"Account doesn't exist"}
         account = accounts[0]
-        if account['password'] == pwd:
-            return {"success":True,"message":account["account_address"]}
-        else:
+        # The key derivation is deliberately slow, so keep it off the event loop
+        matches, needs_rehash = await asyncio.to_thread(verify_password, pwd, account['password'])
+        if not matches:
             return {"success":False,"message":"Password is wrong"}
+        if needs_rehash:
+            password_hash = await asyncio.to_thread(hash_password, pwd)
+            await asyncio.to_thread(self.accounts_Dynamo_DB.update_password, username, password_hash)
+        token, expires_at = self.session_tokens.issue(username, account["account_address"])
+        return {"success":True,"message":account["account_address"],"token":token,"expires_at":expires_at}
 
-    def get_all_accounts(self):
-        all_accounts = self.accounts_Dynamo_DB.get_all_accounts()
+    async def get_all_accounts(self):
+        all_accounts = await asyncio.to_thread(self.accounts_Dynamo_DB.get_all_accounts)
         return all_accounts
     
-    def clear_tables(self):
-        self.seller_Dynamo_DB.clear_table()
-        self.receipt_Dynamo_DB.clear_table()
-        message = self.accounts_Dynamo_DB.clear_table()
-        return {"message":message}
-    def restart_ganache(self,port=8545):
+    def clear_tables(self, progress=None):
+        """
+        Clears every table concurrently (each one with a parallel scan). progress, when given, receives a dict
+        per scanned page with the table name and the running count of deleted items.
+        """
+        tables = {
+            'Sellers': self.seller_Dynamo_DB,
+            'Receipts': self.receipt_Dynamo_DB,
+            'Accounts': self.accounts_Dynamo_DB,
+            'AccountAddresses': self.account_addresses_Dynamo_DB
+        }
+        def clear(table_name):
+            table_progress = None
+            if progress is not None:
+                table_progress = lambda deleted: progress({'stage': 'clear_table', 'table': table_name, 'deleted': deleted})
+            return tables[table_name].clear_table(progress=table_progress)
+        with ThreadPoolExecutor(max_workers=len(tables)) as executor:
+            results = dict(zip(tables, executor.map(clear, tables)))
+        self.account_pool.reset()
+        self.seller_registry.invalidate()
+        self.receipt_cache.clear()
+        return {"message":results['Accounts']}
+    def restart_ganache(self,port=8545,progress=None):
         try:
             find_and_kill_process(port)
-            # Wait for a moment to ensure the port is freed
-            time.sleep(2)
+            # A fresh chain has new accounts, balances and nonces
+            self.receipt_smart_contract_interface.reset_chain_state()
+            self.account_pool.reset()
+            if not wait_for_port_free(port):
+                return {"success":False, "message":f"Port {port} is still in use"}
+            if progress is not None:
+                progress({'stage': 'ganache', 'status': 'starting'})
 
             # Start a new Ganache instance on the specified port
+            # Use the account pool's mnemonic when there is one so every pool address is unlocked and funded on the node
+            account_count = max(int(os.getenv('GANACHE_ACCOUNTS', '10')), self.account_pool.derived_count)
+            wallet_args = ["--mnemonic", self.account_pool.mnemonic] if self.account_pool.mnemonic else ["--deterministic"]
             subprocess.Popen(
-                ["ganache-cli", "--port", str(port), "--deterministic", "--accounts", "10", "--defaultBalanceEther", "10000"],
+                ["ganache-cli", "--port", str(port), *wallet_args, "--accounts", str(account_count), "--defaultBalanceEther", "10000"],
                 stdout=subprocess.PIPE,
                 stderr=subprocess.PIPE,
             )
+            # Return once the new node answers requests rather than after a fixed delay
+            if not wait_for_rpc(f"http://127.0.0.1:{port}", timeout=float(os.getenv('GANACHE_READY_TIMEOUT_SECONDS', '30'))):
+                return {"success":False, "message":"Ganache did not become ready in time"}
             return {"success":True, "message":"Ganache restarted with fresh accounts"}
         except Exception as e:
             return {"success":False, "message":str(e)}
\ No newline at end of file
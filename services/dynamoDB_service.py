@@ -1,19 +1,122 @@
-import json
 from datetime import datetime
 import boto3
+from botocore.config import Config
 from botocore.exceptions import ClientError
 import os
 from decimal import Decimal
+from boto3.dynamodb.conditions import Key, Attr
+from boto3.dynamodb.types import TypeSerializer
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import logging
+from services.metrics import instrument_dynamodb_client
+from services.storage import SellerStore, ReceiptStore, AccountStore, AccountAddressStore, encode_next_token, decode_next_token
 
-class SellersDyanmoDB:
+# Global secondary indexes on the Receipts table, both with purchase_time as the sort key
+RECEIPT_INDEXES = {
+    'buyer_address': 'buyer_address-purchase_time-index',
+    'seller_address': 'seller_address-purchase_time-index'
+}
+
+logger = logging.getLogger(__name__)
+
+_thread_local = threading.local()
+_resource_lock = threading.Lock()
+
+def dynamodb_config():
+    """Connection pool, keep-alive, retry and timeout settings shared by every DynamoDB call."""
+    return Config(
+        region_name='us-east-2',
+        max_pool_connections=int(os.getenv('DYNAMODB_MAX_POOL_CONNECTIONS', '50')),
+        tcp_keepalive=True,
+        connect_timeout=float(os.getenv('DYNAMODB_CONNECT_TIMEOUT_SECONDS', '2')),
+        read_timeout=float(os.getenv('DYNAMODB_READ_TIMEOUT_SECONDS', '10')),
+        retries={'mode': 'adaptive', 'total_max_attempts': int(os.getenv('DYNAMODB_MAX_ATTEMPTS', '5'))}
+    )
+
+def get_dynamodb_resource():
+    """
+    Returns the calling thread's DynamoDB resource, creating it (with its own session) on the thread's first
+    use. boto3 sessions and resources, and the Table objects built from them, aren't thread-safe, and the
+    table wrappers are called from asyncio.to_thread and thread pool workers, so each thread keeps its own;
+    they're reused for the life of the thread, so it's still one credential lookup and one connection pool
+    per worker thread rather than per call. Creation is serialized with a lock.
+    """
+    resource = getattr(_thread_local, 'resource', None)
+    if resource is None:
+        with _resource_lock:
+            session = boto3.session.Session(
+                aws_access_key_id=os.getenv('blockchain_class_access_key'),
+                aws_secret_access_key=os.getenv('blockchain_class_secret_key')
+            )
+            resource = session.resource('dynamodb', config=dynamodb_config())
+        instrument_dynamodb_client(resource.meta.client)
+        _thread_local.resource = resource
+        _thread_local.tables = {}
+    return resource
+
+def get_table(table_name):
+    """Returns the calling thread's Table object for table_name, built from its resource on first use."""
+    resource = get_dynamodb_resource()
+    table = _thread_local.tables.get(table_name)
+    if table is None:
+        table = _thread_local.tables[table_name] = resource.Table(table_name)
+    return table
+
+def clear_table_parallel(table_name, key_names, total_segments=None, progress=None):
+    """
+    Deletes every item in table_name using a parallel scan: each of total_segments segments is scanned for its key
+    attributes only and deleted through its own batch_writer, in a thread pool. progress, when given, is called
+    with the running number of deleted items after every page. Returns the number of deleted items.
+    """
+    total_segments = total_segments or int(os.getenv('DYNAMODB_RESET_SEGMENTS', '4'))
+    projection = {f"#k{i}": key_name for i, key_name in enumerate(key_names)}
+    deleted = [0]
+    lock = threading.Lock()
+
+    def clear_segment(segment):
+        scan_kwargs = {
+            'Segment': segment,
+            'TotalSegments': total_segments,
+            'ProjectionExpression': ", ".join(projection.keys()),
+            'ExpressionAttributeNames': projection
+        }
+        table = get_table(table_name)
+        with table.batch_writer() as batch:
+            while True:
+                response = table.scan(**scan_kwargs)
+                items = response.get('Items', [])
+                for item in items:
+                    batch.delete_item(Key={key_name: item[key_name] for key_name in key_names})
+                with lock:
+                    deleted[0] += len(items)
+                    if progress is not None:
+                        progress(deleted[0])
+                if 'LastEvaluatedKey' not in response:
+                    break
+                scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    with ThreadPoolExecutor(max_workers=total_segments) as executor:
+        # list() re-raises the first error from any segment
+        list(executor.map(clear_segment, range(total_segments)))
+    return deleted[0]
+
+class DynamoDBTable:
+    """Base of the table wrappers: dynamodb and table are looked up for the calling thread on every use."""
+    def __init__(self, table_name):
+        self.table_name = table_name
+
+    @property
+    def dynamodb(self):
+        return get_dynamodb_resource()
+
+    @property
+    def table(self):
+        return get_table(self.table_name)
+
+class SellersDyanmoDB(DynamoDBTable, SellerStore):
     def __init__(self, table_name='Sellers'):
-        self.dynamodb = boto3.resource(
-            'dynamodb',
-            region_name='us-east-2',
-            aws_access_key_id=os.getenv('blockchain_class_access_key'),
-            aws_secret_access_key=os.getenv('blockchain_class_secret_key')
-        )
-        self.table = self.dynamodb.Table(table_name)
+        super().__init__(table_name)
 
     def insert_seller(self, seller_data):
         """
@@ -25,12 +128,12 @@ class SellersDyanmoDB:
                 Item=seller_data,
                 ConditionExpression="attribute_not_exists(seller_address)"
             )
-            print("Seller inserted successfully:", response)
+            logger.debug("Seller inserted: %s", response)
         except ClientError as e:
             if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
-                print("Seller already exists.")
+                logger.info("Seller already exists.")
             else:
-                print("Error inserting seller:", e.response['Error']['Message'])
+                logger.error("Error inserting seller: %s", e.response['Error']['Message'])
 
     def seller_exists(self, seller_address):
         """
@@ -41,8 +144,19 @@ class SellersDyanmoDB:
             response = self.table.get_item(Key={'seller_address': seller_address})
             return 'Item' in response  # Returns True if item exists, False otherwise
         except ClientError as e:
-            print("Error checking seller existence:", e.response['Error']['Message'])
+            logger.error("Error checking seller existence: %s", e.response['Error']['Message'])
             return False
+    def get_seller(self, seller_address):
+        """
+        Returns the seller record for seller_address, or None if there isn't one.
+        Uses a consistent read so a seller created by another worker is visible right away.
+        """
+        try:
+            response = self.table.get_item(Key={'seller_address': seller_address}, ConsistentRead=True)
+            return response.get('Item')
+        except ClientError as e:
+            logger.error("Error retrieving seller: %s", e.response['Error']['Message'])
+            return None
     def get_all_sellers(self):
         """
         Retrieves all sellers with their associated contract addresses.
@@ -65,43 +179,23 @@ class SellersDyanmoDB:
                 )
                 sellers.extend(response.get('Items', []))
                 
-            print(f"Retrieved {len(sellers)} sellers.")
+            logger.debug("Retrieved %d sellers.", len(sellers))
             return sellers
         except ClientError as e:
-            print(f"Error retrieving sellers: {e.response['Error']['Message']}")
+            logger.error("Error retrieving sellers: %s", e.response['Error']['Message'])
             return []
-    def clear_table(self):
+    def clear_table(self, progress=None):
         """Clears all items from the Sellers table."""
         try:
-            response = self.table.scan()
-            items = response.get('Items', [])
-            
-            with self.table.batch_writer() as batch:
-                for item in items:
-                    batch.delete_item(Key={'seller_address': item['seller_address']})
-            
-            # Paginate if there are more items
-            while 'LastEvaluatedKey' in response:
-                response = self.table.scan(ExclusiveStartKey=response['LastEvaluatedKey'])
-                items = response.get('Items', [])
-                with self.table.batch_writer() as batch:
-                    for item in items:
-                        batch.delete_item(Key={'seller_address': item['seller_address']})
-
-            print("Sellers table cleared successfully.")
+            deleted = clear_table_parallel(self.table_name, ['seller_address'], progress=progress)
+            logger.info("Sellers table cleared successfully (%d items).", deleted)
         except ClientError as e:
-            print(f"Error clearing Sellers table: {e.response['Error']['Message']}")
+            logger.error("Error clearing Sellers table: %s", e.response['Error']['Message'])
         
-class ReceiptDyanmoDB:
-    def __init__(self,table_name='Receipts'):
-        self.dynamodb = boto3.resource(
-            'dynamodb',
-            region_name='us-east-2',  # Update with your region
-            aws_access_key_id=os.getenv('blockchain_class_access_key'),
-            aws_secret_access_key=os.getenv('blockchain_class_secret_key')
-        )
+class ReceiptDyanmoDB(DynamoDBTable, ReceiptStore):
+    def __init__(self, table_name='Receipts'):
         # create_receipts_table(table_name)
-        self.table = self.dynamodb.Table(table_name)
+        super().__init__(table_name)
 
     def insert_receipt(self, receipt_details):
         """Inserts a new receipt record in DynamoDB."""
@@ -113,9 +207,23 @@ class ReceiptDyanmoDB:
             response = self.table.put_item(
                 Item=receipt_details
             )
-            print("Data saved successfully:", response)
+            logger.debug("Receipt saved: %s", response)
         except ClientError as e:
-            print("Error saving data to DynamoDB:", e.response['Error']['Message'])
+            logger.error("Error saving receipt to DynamoDB: %s", e.response['Error']['Message'])
+
+    def insert_receipts_batch(self, receipts):
+        """Inserts many receipt records through one batch_writer. Returns True if all of them were written."""
+        try:
+            with self.table.batch_writer(overwrite_by_pkeys=['transaction_hash']) as batch:
+                for receipt_details in receipts:
+                    if 'amount' in receipt_details:
+                        receipt_details['amount'] = Decimal(str(receipt_details['amount']))
+                    batch.put_item(Item=receipt_details)
+            logger.debug("Saved %d receipts.", len(receipts))
+            return True
+        except ClientError as e:
+            logger.error("Error saving receipts to DynamoDB: %s", e.response['Error']['Message'])
+            return False
 
     def search_by_transaction_id(self, transaction_id):
         """Searches for a receipt by transaction ID (primary key)."""
@@ -123,47 +231,95 @@ class ReceiptDyanmoDB:
             response = self.table.get_item(Key={'transaction_hash': transaction_id})
             return response.get('Item')
         except ClientError as e:
-            print(f"Failed to retrieve receipt: {e.response['Error']['Message']}")
+            logger.error("Failed to retrieve receipt: %s", e.response['Error']['Message'])
             return None
 
-    def search_by_buyer_address(self, buyer_address, filter_by=None, sort_by=None, ascending=True):
-        """Searches receipts by buyer address with optional filtering and sorting."""
-        return self._search_by_attribute('buyer_address', buyer_address, filter_by, sort_by, ascending)
+    def search_by_buyer_address(self, buyer_address, filter_by=None, sort_by=None, ascending=True, limit=None, next_token=None):
+        """Searches receipts by buyer address with optional filtering, sorting and pagination."""
+        return self._search_by_attribute('buyer_address', buyer_address, filter_by, sort_by, ascending, limit, next_token)
 
-    def search_by_seller_address(self, seller_address, filter_by=None, sort_by=None, ascending=True):
-        """Searches receipts by seller address with optional filtering and sorting."""
-        return self._search_by_attribute('seller_address', seller_address, filter_by, sort_by, ascending)
+    def search_by_seller_address(self, seller_address, filter_by=None, sort_by=None, ascending=True, limit=None, next_token=None):
+        """Searches receipts by seller address with optional filtering, sorting and pagination."""
+        return self._search_by_attribute('seller_address', seller_address, filter_by, sort_by, ascending, limit, next_token)
 
-    def _search_by_attribute(self, attribute, value, filter_by=None, sort_by=None, ascending=True):
-        """Internal method to search by a specific attribute (buyer or seller) with filtering and sorting."""
+    def _search_by_attribute(self, attribute, value, filter_by=None, sort_by=None, ascending=True, limit=None, next_token=None):
+        """
+        Internal method to query receipts by buyer or seller through the matching secondary index.
+        Results come back ordered by purchase_time (the index sort key). Filtering happens in DynamoDB.
+        If limit is given, at most limit items are returned along with a next_token to resume from;
+        otherwise every page is read and next_token is None.
+        Returns (items, next_token), or (None, None) on failure.
+        """
         try:
-            # Query using the specified attribute
-            response = self.table.scan(
-                FilterExpression=boto3.dynamodb.conditions.Attr(attribute).eq(value)
-            )
-            items = response.get('Items', [])
-            
-            # Filter items if a filter criterion is provided
+            key_condition = Key(attribute).eq(value)
+            filter_expression = None
             if filter_by:
-                if 'amount' in filter_by:
-                    amount_filter = Decimal(str(filter_by['amount']))
-                    items = [item for item in items if item['amount'] == amount_filter]
                 if 'purchase_time' in filter_by:
-                    items = [item for item in items if item['purchase_time'] == filter_by['purchase_time']]
-
-            # Sort items if a sorting criterion is provided
-            if sort_by:
-                reverse_order = not ascending
-                if sort_by == 'amount':
-                    items.sort(key=lambda x: x['amount'], reverse=reverse_order)
-                elif sort_by == 'purchase_time':
-                    items.sort(key=lambda x: x['purchase_time'], reverse=reverse_order)
-            
-            return items
+                    key_condition = key_condition & Key('purchase_time').eq(filter_by['purchase_time'])
+                if 'amount' in filter_by:
+                    filter_expression = Attr('amount').eq(Decimal(str(filter_by['amount'])))
+
+            query_kwargs = {
+                'IndexName': RECEIPT_INDEXES[attribute],
+                'KeyConditionExpression': key_condition,
+                'ScanIndexForward': ascending
+            }
+            if filter_expression is not None:
+                query_kwargs['FilterExpression'] = filter_expression
+
+            items = []
+            start_key = decode_next_token(next_token)
+            while True:
+                if start_key:
+                    query_kwargs['ExclusiveStartKey'] = start_key
+                if limit:
+                    # Limit caps items evaluated per call, so asking for the remainder never overshoots
+                    query_kwargs['Limit'] = limit - len(items)
+                response = self.table.query(**query_kwargs)
+                items.extend(response.get('Items', []))
+                start_key = response.get('LastEvaluatedKey')
+                if not start_key or (limit and len(items) >= limit):
+                    break
+
+            # The index can only order by purchase_time, so an amount sort is applied to the returned page
+            if sort_by == 'amount':
+                items.sort(key=lambda x: x['amount'], reverse=not ascending)
+
+            return items, encode_next_token(start_key)
         except ClientError as e:
-            print(f"Failed to search receipts: {e.response['Error']['Message']}")
-            return None
+            logger.error("Failed to search receipts: %s", e.response['Error']['Message'])
+            return None, None
         
+    def iter_receipt_pages(self, attribute=None, value=None, ascending=True, page_size=500, projection=None):
+        """
+        Yields receipts one DynamoDB page at a time, oldest first unless ascending is False, for exports.
+        With attribute ('buyer_address' or 'seller_address') the matching index is queried, otherwise the whole table
+        is scanned (in no particular order). Only one page is held in memory at a time; page_size=None reads 1 MB pages.
+        projection optionally limits the attributes returned.
+        """
+        if attribute is not None:
+            read = self.table.query
+            read_kwargs = {
+                'IndexName': RECEIPT_INDEXES[attribute],
+                'KeyConditionExpression': Key(attribute).eq(value),
+                'ScanIndexForward': ascending
+            }
+        else:
+            read = self.table.scan
+            read_kwargs = {}
+        if page_size:
+            read_kwargs['Limit'] = page_size
+        if projection:
+            names = {f"#p{i}": attribute_name for i, attribute_name in enumerate(projection)}
+            read_kwargs['ProjectionExpression'] = ", ".join(names.keys())
+            read_kwargs['ExpressionAttributeNames'] = names
+        while True:
+            response = read(**read_kwargs)
+            yield response.get('Items', [])
+            if 'LastEvaluatedKey' not in response:
+                break
+            read_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
     def get_receipt_details(self, transaction_hash):
         """
         Retrieves contract_address, buyer_address, seller_address, and receipt_index for a given transaction_hash.
@@ -173,7 +329,7 @@ class ReceiptDyanmoDB:
             item = response.get('Item')
             
             if not item:
-                print("No item found with the given transaction hash.")
+                logger.info("No receipt found for transaction hash %s.", transaction_hash)
                 return None
             
             # Extract the required fields
@@ -185,7 +341,7 @@ class ReceiptDyanmoDB:
             }
             return receipt_details
         except ClientError as e:
-            print(f"Error retrieving receipt details: {e.response['Error']['Message']}")
+            logger.error("Error retrieving receipt details: %s", e.response['Error']['Message'])
             return None
         
     def change_receipt_status(self, transaction_hash,status,time_key):
@@ -203,34 +359,124 @@ class ReceiptDyanmoDB:
                     ':release_time': Decimal(datetime.timestamp(datetime.now()))  # Storing current timestamp
                 }
             )
-            print("Marked as funds released:", response)
+            logger.debug("Receipt %s marked as %s: %s", transaction_hash, status, response)
         except ClientError as e:
-            print(f"Error marking funds released: {e.response['Error']['Message']}")
+            logger.error("Error changing receipt status: %s", e.response['Error']['Message'])
 
-    def get_all_transactions(self,max_number_of_pages = 5):
-        """Retrieves all transactions from the DynamoDB table."""
+    def get_receipts_details_batch(self, transaction_hashes):
+        """
+        Batch version of get_receipt_details using BatchGetItem (100 keys per request).
+        Returns a dictionary of transaction_hash to receipt details; hashes that don't exist are left out.
+        """
         try:
-            # Initialize an empty list to store all transactions
-            transactions = []
+            receipts_details = {}
+            unique_hashes = list(dict.fromkeys(transaction_hashes))
+            for start in range(0, len(unique_hashes), 100):
+                request_items = {
+                    self.table_name: {
+                        'Keys': [{'transaction_hash': transaction_hash} for transaction_hash in unique_hashes[start:start+100]],
+                        'ProjectionExpression': 'transaction_hash, seller_contract_address, buyer_address, seller_address, receipt_index'
+                    }
+                }
+                # DynamoDB may hand back part of the request as UnprocessedKeys under load, so keep going until it's empty
+                while request_items:
+                    response = self.dynamodb.batch_get_item(RequestItems=request_items)
+                    for item in response.get('Responses', {}).get(self.table_name, []):
+                        receipts_details[item['transaction_hash']] = {
+                            'contract_address': item.get('seller_contract_address'),
+                            'buyer_address': item.get('buyer_address'),
+                            'seller_address': item.get('seller_address'),
+                            'receipt_index': int(item.get('receipt_index'))
+                        }
+                    request_items = response.get('UnprocessedKeys')
+            return receipts_details
+        except ClientError as e:
+            logger.error("Error retrieving receipt details in batch: %s", e.response['Error']['Message'])
+            return None
 
-            # Use the scan operation to retrieve all items
-            response = self.table.scan()
+    def change_receipts_status_batch(self, transaction_hashes, status, time_key):
+        """
+        Batch version of change_receipt_status. Sends the updates through TransactWriteItems,
+        100 per transaction. Returns True if every update was applied.
+        """
+        change_time = Decimal(datetime.timestamp(datetime.now()))
+        return self.upsert_receipts({transaction_hash: {'status': status, time_key: change_time} for transaction_hash in transaction_hashes})
+
+    def upsert_receipts(self, receipts_fields, keep_existing=()):
+        """
+        Creates or updates many receipts at once without overwriting attributes that aren't given.
+        receipts_fields maps transaction_hash to the attributes to SET on that receipt. Attributes listed in
+        keep_existing are only written if the receipt doesn't have them yet.
+        Updates go through TransactWriteItems, 100 per transaction. Returns True if every update was applied.
+        """
+        serializer = TypeSerializer()
+        try:
+            transaction_hashes = list(receipts_fields.keys())
+            for start in range(0, len(transaction_hashes), 100):
+                transact_items = []
+                for transaction_hash in transaction_hashes[start:start+100]:
+                    fields = receipts_fields[transaction_hash]
+                    set_clauses = []
+                    attribute_names = {}
+                    attribute_values = {}
+                    for i, (name, value) in enumerate(fields.items()):
+                        if isinstance(value, float):
+                            value = Decimal(str(value))
+                        attribute_names[f'#f{i}'] = name
+                        attribute_values[f':v{i}'] = serializer.serialize(value)
+                        if name in keep_existing:
+                            set_clauses.append(f"#f{i} = if_not_exists(#f{i}, :v{i})")
+                        else:
+                            set_clauses.append(f"#f{i} = :v{i}")
+                    transact_items.append({
+                        'Update': {
+                            'TableName': self.table_name,
+                            'Key': {'transaction_hash': serializer.serialize(transaction_hash)},
+                            'UpdateExpression': "SET " + ", ".join(set_clauses),
+                            'ExpressionAttributeNames': attribute_names,
+                            'ExpressionAttributeValues': attribute_values
+                        }
+                    })
+                self.dynamodb.meta.client.transact_write_items(TransactItems=transact_items)
+            logger.debug("Upserted %d receipts.", len(transaction_hashes))
+            return True
+        except ClientError as e:
+            logger.error("Error upserting receipts: %s", e.response['Error']['Message'])
+            return False
 
-            # Append the first batch of items to the list
-            transactions.extend(response.get('Items', []))
+    def find_receipt_hash(self, contract_address, buyer_address, receipt_index):
+        """Finds the transaction_hash of the receipt with the given on-chain (contract, buyer, index) identity."""
+        try:
+            query_kwargs = {
+                'IndexName': RECEIPT_INDEXES['buyer_address'],
+                'KeyConditionExpression': Key('buyer_address').eq(buyer_address),
+                'FilterExpression': Attr('seller_contract_address').eq(contract_address) & Attr('receipt_index').eq(receipt_index),
+                'ProjectionExpression': 'transaction_hash'
+            }
+            while True:
+                response = self.table.query(**query_kwargs)
+                items = response.get('Items', [])
+                if items:
+                    return items[0]['transaction_hash']
+                if 'LastEvaluatedKey' not in response:
+                    return None
+                query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+        except ClientError as e:
+            logger.error("Error finding receipt: %s", e.response['Error']['Message'])
+            return None
 
-            # Continue fetching if there are more items
-            page = 1
-            while 'LastEvaluatedKey' in response:
-                if page>max_number_of_pages:
+    def get_all_transactions(self,max_number_of_pages = None):
+        """Retrieves all transactions from the DynamoDB table, or the first max_number_of_pages pages. Use iter_receipt_pages to stream them instead."""
+        try:
+            transactions = []
+            for page, items in enumerate(self.iter_receipt_pages(page_size=None)):
+                transactions.extend(items)
+                if max_number_of_pages is not None and page + 1 >= max_number_of_pages:
                     break
-                response = self.table.scan(ExclusiveStartKey=response['LastEvaluatedKey'])
-                transactions.extend(response.get('Items', []))
-                page+=1
-            print(f"Retrieved {len(transactions)} transactions.")
+            logger.debug("Retrieved %d transactions.", len(transactions))
             return transactions
         except ClientError as e:
-            print(f"Error retrieving transactions: {e.response['Error']['Message']}")
+            logger.error("Error retrieving transactions: %s", e.response['Error']['Message'])
             return None
 
     def get_unique_buyers(self):
@@ -259,43 +505,23 @@ class ReceiptDyanmoDB:
                         unique_buyers.add(buyer_address)
                         buyers.append(buyer_address)
 
-            print(f"Found {len(buyers)} unique buyers.")
+            logger.debug("Found %d unique buyers.", len(buyers))
             return buyers
         except ClientError as e:
-            print(f"Error retrieving unique buyers: {e.response['Error']['Message']}")
+            logger.error("Error retrieving unique buyers: %s", e.response['Error']['Message'])
             return []
 
-    def clear_table(self):
+    def clear_table(self, progress=None):
         """Clears all items from the Receipts table."""
         try:
-            response = self.table.scan()
-            items = response.get('Items', [])
-            
-            with self.table.batch_writer() as batch:
-                for item in items:
-                    batch.delete_item(Key={'transaction_hash': item['transaction_hash']})
-            
-            # Paginate if there are more items
-            while 'LastEvaluatedKey' in response:
-                response = self.table.scan(ExclusiveStartKey=response['LastEvaluatedKey'])
-                items = response.get('Items', [])
-                with self.table.batch_writer() as batch:
-                    for item in items:
-                        batch.delete_item(Key={'transaction_hash': item['transaction_hash']})
-
-            print("Receipts table cleared successfully.")
+            deleted = clear_table_parallel(self.table_name, ['transaction_hash'], progress=progress)
+            logger.info("Receipts table cleared successfully (%d items).", deleted)
         except ClientError as e:
-            print(f"Error clearing Receipts table: {e.response['Error']['Message']}")
+            logger.error("Error clearing Receipts table: %s", e.response['Error']['Message'])
 
-class AccountsDynamoDB:
+class AccountsDynamoDB(DynamoDBTable, AccountStore):
     def __init__(self, table_name='Accounts'):
-        self.dynamodb = boto3.resource(
-            'dynamodb',
-            region_name='us-east-2',
-            aws_access_key_id=os.getenv('blockchain_class_access_key'),
-            aws_secret_access_key=os.getenv('blockchain_class_secret_key')
-        )
-        self.table = self.dynamodb.Table(table_name)
+        super().__init__(table_name)
 
     def insert_account(self, accounts_data):
         try:
@@ -303,11 +529,11 @@ class AccountsDynamoDB:
                 Item=accounts_data,
                 ConditionExpression="attribute_not_exists(user_id)"
             )
-            print("Account address inserted successfully:", response)
+            logger.debug("Account inserted: %s", response)
             return True,f"Account address inserted successfully"
         except ClientError as e:
             if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
-                print("Account already exists.")
+                logger.info("Account already exists.")
                 return False,f"Account already exists."
             else:
                 return False,f"Error creating account: {e.response['Error']['Message']}"
@@ -318,15 +544,24 @@ class AccountsDynamoDB:
         """
         try:
             response = self.table.get_item(Key={'user_id': user_id})
-            print(response)
             item = response.get('Item', {})
             if len(list(item.keys()))==0:
                 return []
             else:
                 return [item]
         except ClientError as e:
-            print("Error checking seller existence:", e.response['Error']['Message'])
+            logger.error("Error checking seller existence: %s", e.response['Error']['Message'])
             return {}
+    def update_password(self, user_id, password_hash):
+        try:
+            self.table.update_item(
+                Key={'user_id': user_id},
+                UpdateExpression="SET password = :password",
+                ConditionExpression="attribute_exists(user_id)",
+                ExpressionAttributeValues={':password': password_hash}
+            )
+        except ClientError as e:
+            logger.error("Error updating password: %s", e.response['Error']['Message'])
     def address_used(self, address):
         """Searches receipts by buyer address with optional filtering and sorting."""
         return self._search_by_attribute('account_address', address)      
@@ -352,10 +587,10 @@ class AccountsDynamoDB:
                 )
                 accounts.extend(response.get('Items', []))
                 
-            print(f"Retrieved {len(accounts)} accounts.")
+            logger.debug("Retrieved %d accounts.", len(accounts))
             return accounts
         except ClientError as e:
-            print(f"Error retrieving accounts: {e.response['Error']['Message']}")
+            logger.error("Error retrieving accounts: %s", e.response['Error']['Message'])
             return []
     def _search_by_attribute(self, attribute, value):
         """Internal method to search by a specific attribute (buyer or seller) with filtering and sorting."""
@@ -367,27 +602,60 @@ class AccountsDynamoDB:
             items = response.get('Items', [])        
             return items
         except ClientError as e:
-            print(f"Failed to search receipts: {e.response['Error']['Message']}")
+            logger.error("Failed to search receipts: %s", e.response['Error']['Message'])
             return []
     
-    def clear_table(self):
+    def clear_table(self, progress=None):
         """Clears all items from the Accounts table."""
         try:
-            response = self.table.scan()
-            items = response.get('Items', [])
-            
-            with self.table.batch_writer() as batch:
-                for item in items:
-                    batch.delete_item(Key={'user_id': item['user_id']})
-            
-            # Paginate if there are more items
-            while 'LastEvaluatedKey' in response:
-                response = self.table.scan(ExclusiveStartKey=response['LastEvaluatedKey'])
-                items = response.get('Items', [])
-                with self.table.batch_writer() as batch:
-                    for item in items:
-                        batch.delete_item(Key={'user_id': item['user_id']})
-
+            clear_table_parallel(self.table_name, ['user_id'], progress=progress)
             return "Accounts table cleared successfully."
         except ClientError as e:
             return f"Error clearing Accounts table: {e.response['Error']['Message']}"
+
+class AccountAddressesDynamoDB(DynamoDBTable, AccountAddressStore):
+    """One item per network address that has been handed to a user, so a claim is a single conditional write."""
+    def __init__(self, table_name='AccountAddresses'):
+        super().__init__(table_name)
+
+    def claim_address(self, account_address, user_id):
+        """Atomically claims account_address for user_id. Returns False if someone else already holds it; other errors are raised."""
+        try:
+            self.table.put_item(
+                Item={'account_address': account_address, 'user_id': user_id},
+                ConditionExpression="attribute_not_exists(account_address)"
+            )
+            return True
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                return False
+            logger.error("Error claiming account address: %s", e.response['Error']['Message'])
+            raise
+
+    def release_address(self, account_address):
+        try:
+            self.table.delete_item(Key={'account_address': account_address})
+        except ClientError as e:
+            logger.error("Error releasing account address: %s", e.response['Error']['Message'])
+
+    def get_claimed_addresses(self):
+        """Returns the set of every claimed address."""
+        try:
+            claimed = set()
+            response = self.table.scan(ProjectionExpression="account_address")
+            claimed.update(item['account_address'] for item in response.get('Items', []))
+            while 'LastEvaluatedKey' in response:
+                response = self.table.scan(ProjectionExpression="account_address", ExclusiveStartKey=response['LastEvaluatedKey'])
+                claimed.update(item['account_address'] for item in response.get('Items', []))
+            return claimed
+        except ClientError as e:
+            logger.error("Error retrieving claimed addresses: %s", e.response['Error']['Message'])
+            return None
+
+    def clear_table(self, progress=None):
+        """Clears all items from the AccountAddresses table."""
+        try:
+            deleted = clear_table_parallel(self.table_name, ['account_address'], progress=progress)
+            logger.info("AccountAddresses table cleared successfully (%d items).", deleted)
+        except ClientError as e:
+            logger.error("Error clearing AccountAddresses table: %s", e.response['Error']['Message'])
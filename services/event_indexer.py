@@ -0,0 +1,227 @@
+import asyncio
+import json
+import logging
+import os
+from datetime import datetime
+from decimal import Decimal
+from eth_utils import event_abi_to_log_topic
+from web3 import AsyncWeb3
+from web3.exceptions import BlockNotFound
+from services.storage import create_stores
+from services.smart_contract_interactions import ReceiptsContractInterface, batch_receipt_hash
+from services.logging_config import configure_logging
+
+logger = logging.getLogger(__name__)
+
+INDEXED_EVENTS = ['ReceiptIssued', 'RefundIssued', 'FundsReleased', 'FundsReleaseSkipped']
+CHECKPOINT_PATH = os.getenv('INDEXER_CHECKPOINT_PATH', 'indexer_checkpoint.json')
+
+def clear_checkpoint(checkpoint_path=CHECKPOINT_PATH):
+    """Forgets the indexed block range, e.g. when /reset_tables starts a new chain."""
+    try:
+        os.remove(checkpoint_path)
+    except FileNotFoundError:
+        pass
+
+class ReceiptEventIndexer:
+    """
+    Follows new blocks and mirrors ReceiptManager events from every seller contract into the Receipts table.
+    Logs are read with eth_getLogs, merged per receipt and written as one bulk upsert per block range.
+    The contract to seller map is loaded from the Sellers table once and reloaded only when a log comes from a
+    contract it doesn't know yet, so logs are filtered by event topic rather than by the known addresses.
+    The last indexed block and its hash are checkpointed in its own file so a restarted indexer resumes where it
+    stopped. On start and on every tick the hash is compared with the chain's block at that height; a different
+    or missing block means the chain was replaced (e.g. Ganache restarted), so indexing starts again from block 0.
+    """
+    def __init__(self, contract_interface, receipt_db, seller_db, checkpoint_path=CHECKPOINT_PATH, confirmations=0, max_block_range=1000, poll_interval=2.0):
+        self.contract_interface = contract_interface
+        self.web3 = contract_interface.web3
+        self.receipt_db = receipt_db
+        self.seller_db = seller_db
+        self.checkpoint_path = checkpoint_path
+        self.confirmations = confirmations
+        self.max_block_range = max_block_range
+        self.poll_interval = poll_interval
+        self.decoder = contract_interface.abi_contract
+        self.event_topics = {
+            AsyncWeb3.to_hex(event_abi_to_log_topic(abi)): abi['name']
+            for abi in contract_interface.contract_abi
+            if abi.get('type') == 'event' and abi['name'] in INDEXED_EVENTS
+        }
+        self.block_timestamps = {}
+        self.sellers_by_contract = None
+        self.last_indexed_block = -1
+        self.last_indexed_hash = None
+
+    def load_checkpoint(self):
+        """Returns (last_indexed_block, its block hash). Checkpoints written before hashes were stored have no hash."""
+        try:
+            with open(self.checkpoint_path) as f:
+                checkpoint = json.load(f)
+            return checkpoint.get('last_indexed_block', -1), checkpoint.get('block_hash')
+        except (FileNotFoundError, json.JSONDecodeError):
+            return -1, None
+
+    def save_checkpoint(self, block_number, block_hash):
+        # Write to a temporary file first so a crash never leaves a half-written checkpoint
+        with open(self.checkpoint_path + '.tmp', 'w') as f:
+            json.dump({'last_indexed_block': block_number, 'block_hash': block_hash}, f, indent=4)
+        os.replace(self.checkpoint_path + '.tmp', self.checkpoint_path)
+
+    async def get_block_hash(self, block_number):
+        """The hash of the chain's block at block_number, or None if the chain has no such block."""
+        try:
+            block = await self.web3.eth.get_block(block_number)
+        except BlockNotFound:
+            return None
+        return block['hash'].hex()
+
+    async def checkpoint_on_chain(self, block_number, block_hash):
+        """Whether the checkpointed block is still part of the chain."""
+        if block_number < 0:
+            return True
+        chain_hash = await self.get_block_hash(block_number)
+        # Without a stored hash there is nothing to compare, only that the block exists
+        return chain_hash is not None and (block_hash is None or chain_hash == block_hash)
+
+    async def load_sellers(self):
+        all_sellers = await asyncio.to_thread(self.seller_db.get_all_sellers)
+        self.sellers_by_contract = {AsyncWeb3.to_checksum_address(seller['seller_contract_address']): seller['seller_address'] for seller in all_sellers}
+
+    async def run(self):
+        self.last_indexed_block, self.last_indexed_hash = self.load_checkpoint()
+        logger.info("Indexer starting after block %d.", self.last_indexed_block)
+        while True:
+            try:
+                await self.poll_once()
+            except Exception as e:
+                logger.exception("Indexer error, retrying")
+            await asyncio.sleep(self.poll_interval)
+
+    async def poll_once(self):
+        """Indexes every block between the checkpoint and the latest confirmed block, checkpointing after each range."""
+        if not await self.checkpoint_on_chain(self.last_indexed_block, self.last_indexed_hash):
+            # The chain was replaced (e.g. Ganache restarted), so start again from the beginning
+            logger.warning("Block %d is no longer the checkpointed one, re-indexing from block 0.", self.last_indexed_block)
+            self.last_indexed_block, self.last_indexed_hash = -1, None
+            self.block_timestamps.clear()
+            self.sellers_by_contract = None
+        latest_block = await self.web3.eth.block_number
+        target_block = latest_block - self.confirmations
+        while self.last_indexed_block < target_block:
+            to_block = min(self.last_indexed_block + self.max_block_range, target_block)
+            await self.index_range(self.last_indexed_block + 1, to_block)
+            block_hash = await self.get_block_hash(to_block)
+            self.save_checkpoint(to_block, block_hash)
+            self.last_indexed_block, self.last_indexed_hash = to_block, block_hash
+
+    async def index_range(self, from_block, to_block):
+        """Reads every indexed event between from_block and to_block (inclusive) and upserts the affected receipts."""
+        logs = await self.web3.eth.get_logs({
+            'fromBlock': from_block,
+            'toBlock': to_block,
+            'topics': [list(self.event_topics.keys())]
+        })
+        if not logs:
+            return
+
+        if self.sellers_by_contract is None or any(AsyncWeb3.to_checksum_address(log['address']) not in self.sellers_by_contract for log in logs):
+            # A seller registered since the last load; contracts that still aren't known aren't ours
+            await self.load_sellers()
+        sellers_by_contract = self.sellers_by_contract
+        logs = [log for log in logs if AsyncWeb3.to_checksum_address(log['address']) in sellers_by_contract]
+        if not logs:
+            return
+
+        # Group logs per transaction, keeping chain order, so batch releases can be matched to their inputs
+        logs_by_transaction = {}
+        for log in logs:
+            logs_by_transaction.setdefault(log['transactionHash'], []).append(log)
+
+        receipts_fields = {}
+        issued_hashes = {}
+        for tx_hash, tx_logs in logs_by_transaction.items():
+            events = [self.decode_log(log) for log in tx_logs]
+            issued_count = sum(1 for event in events if event['event'] == 'ReceiptIssued')
+            issued_position = 0
+            if any(event['event'] != 'ReceiptIssued' for event in events):
+                tx = await self.web3.eth.get_transaction(tx_hash)
+                function, function_args = self.decoder.decode_function_input(tx['input'])
+            for position, (log, event) in enumerate(zip(tx_logs, events)):
+                contract_address = AsyncWeb3.to_checksum_address(log['address'])
+                if event['event'] == 'ReceiptIssued':
+                    # Same keys as the API uses for issueReceiptsBatch transactions
+                    receipt_hash = tx_hash.hex() if issued_count == 1 else batch_receipt_hash(tx_hash.hex(), issued_position)
+                    issued_position += 1
+                    issued_hashes[(contract_address, event['args']['buyer'], event['args']['receiptIndex'])] = receipt_hash
+                    if issued_count > 1:
+                        receipts_fields.setdefault(receipt_hash, {})['batch_transaction_hash'] = tx_hash.hex()
+                    receipts_fields.setdefault(receipt_hash, {}).update({
+                        'buyer_address': event['args']['buyer'],
+                        'seller_address': sellers_by_contract[contract_address],
+                        'seller_contract_address': contract_address,
+                        'amount': Decimal(str(self.web3.from_wei(event['args']['purchaseAmount'], 'ether'))),
+                        'purchase_time': datetime.utcfromtimestamp(event['args']['purchaseTime']).strftime('%Y-%m-%d %H:%M:%S'),
+                        'block_number': log['blockNumber'],
+                        'receipt_index': event['args']['receiptIndex'],
+                        'status': 'Active'
+                    })
+                    continue
+
+                if event['event'] == 'FundsReleaseSkipped':
+                    continue
+                if event['event'] == 'RefundIssued':
+                    buyer_address, receipt_index = event['args']['buyer'], function_args['receiptIndex']
+                    status, time_key = 'Returned', 'return_time'
+                elif function.fn_name == 'releaseFundsBatch':
+                    # releaseFundsBatch emits one FundsReleased/FundsReleaseSkipped per input, in order
+                    buyer_address, receipt_index = function_args['buyers'][position], function_args['indices'][position]
+                    status, time_key = 'Funds Released to Seller', 'funds_release_time'
+                else:
+                    buyer_address, receipt_index = function_args['_buyer'], function_args['receiptIndex']
+                    status, time_key = 'Funds Released to Seller', 'funds_release_time'
+
+                buyer_address = AsyncWeb3.to_checksum_address(buyer_address)
+                receipt_hash = issued_hashes.get((contract_address, buyer_address, receipt_index))
+                if receipt_hash is None:
+                    receipt_hash = await asyncio.to_thread(self.receipt_db.find_receipt_hash, contract_address, buyer_address, receipt_index)
+                if receipt_hash is None:
+                    logger.warning("No receipt found for %s on %s buyer %s index %d.", event['event'], contract_address, buyer_address, receipt_index)
+                    continue
+                receipts_fields.setdefault(receipt_hash, {}).update({
+                    'status': status,
+                    time_key: Decimal(await self.get_block_timestamp(log['blockNumber']))
+                })
+
+        if receipts_fields:
+            if not await asyncio.to_thread(self.receipt_db.upsert_receipts, receipts_fields):
+                raise RuntimeError(f"Failed to upsert receipts for blocks {from_block}-{to_block}")
+            logger.info("Indexed %d events into %d receipts for blocks %d-%d.", len(logs), len(receipts_fields), from_block, to_block)
+
+    def decode_log(self, log):
+        event_name = self.event_topics[AsyncWeb3.to_hex(log['topics'][0])]
+        return self.contract_interface.get_event_decoder(event_name).process_log(log)
+
+    async def get_block_timestamp(self, block_number):
+        if block_number not in self.block_timestamps:
+            block = await self.web3.eth.get_block(block_number)
+            self.block_timestamps[block_number] = block['timestamp']
+        return self.block_timestamps[block_number]
+
+async def main():
+    contract_interface = ReceiptsContractInterface(os.getenv('INDEXER_RPC_URL') or os.getenv('RPC_URLS', 'http://127.0.0.1:8545'))
+    await contract_interface.connect()
+    stores = create_stores()
+    indexer = ReceiptEventIndexer(
+        contract_interface,
+        stores.receipts,
+        stores.sellers,
+        checkpoint_path=CHECKPOINT_PATH,
+        confirmations=int(os.getenv('INDEXER_CONFIRMATIONS', '0')),
+        poll_interval=float(os.getenv('INDEXER_POLL_SECONDS', '2'))
+    )
+    await indexer.run()
+
+if __name__ == "__main__":
+    configure_logging()
+    asyncio.run(main())
@@ -0,0 +1,133 @@
+import asyncio
+import logging
+import math
+import time
+from collections import OrderedDict, deque
+from web3.exceptions import Web3Exception
+from services.metrics import track_rpc
+
+logger = logging.getLogger(__name__)
+
+# Lowest priority fee offered when the node reports no tips (empty blocks, dev chains); web3 uses the same floor
+MIN_PRIORITY_FEE_WEI = 10**9
+
+def gas_key(contract_function):
+    """
+    What gas limits are learned per: the contract function name, or 'constructor' for deployments.
+    None for calls with array arguments (issueReceiptsBatch, releaseFundsBatch), whose gas grows with their length.
+    """
+    if any(isinstance(arg, (list, tuple)) for arg in getattr(contract_function, 'args', None) or ()):
+        return None
+    return getattr(contract_function, 'fn_name', None) or 'constructor'
+
+class FeeOracle:
+    """
+    Supplies the gas limit and fee fields of outgoing transactions, so sending one doesn't cost an
+    eth_estimateGas plus the fee lookups web3 would otherwise make for every transaction.
+
+    Gas: a ReceiptManager function uses nearly the same gas on every call. The first call of each function is
+    estimated; after that the limit is the larger of that estimate and the gas used by the last `window`
+    successful transactions, plus `margin`. Unused gas is refunded, so the margin costs nothing. A transaction
+    that runs out of gas drops its function back to estimating.
+
+    Fees: one eth_feeHistory call gives the next block's base fee and the `reward_percentile` tip paid in the
+    latest block. They are reused until a receipt from a newer block is seen, or for refresh_seconds at most.
+    maxFeePerGas is twice the base fee plus the tip, as web3 computes it. Nodes without EIP-1559 fee
+    history get a legacy gasPrice instead.
+    """
+    def __init__(self, web3, margin=0.25, window=20, refresh_seconds=12.0, reward_percentile=50, max_pending=10000):
+        self.web3 = web3
+        self.margin = margin
+        self.window = window
+        self.refresh_seconds = refresh_seconds
+        self.reward_percentile = reward_percentile
+        self.max_pending = max_pending
+        self.estimates = {}
+        self.gas_used = {}
+        # Transactions sent with a gas limit from here, by hash, until their receipt is seen
+        self.pending = OrderedDict()
+        self.fees = None
+        self.fees_block = None
+        self.fees_expire_at = 0.0
+        self.fees_lock = asyncio.Lock()
+
+    def is_learned(self, contract_function):
+        """Whether gas_limit will answer for this call without an eth_estimateGas."""
+        key = gas_key(contract_function)
+        return key is not None and key in self.estimates
+
+    async def gas_limit(self, contract_function, tx_params):
+        key = gas_key(contract_function)
+        if key is None or key not in self.estimates:
+            with track_rpc('estimate_gas'):
+                estimate = await contract_function.estimate_gas(tx_params)
+            if key is None:
+                return estimate
+            self.estimates[key] = estimate
+        needed = max([self.estimates[key], *self.gas_used.get(key, ())])
+        return math.ceil(needed * (1 + self.margin))
+
+    def expect(self, tx_hash, contract_function, gas):
+        """Notes a sent transaction so its receipt can update the learned gas of its function."""
+        key = gas_key(contract_function)
+        if key is not None:
+            self.pending[tx_hash] = (key, gas)
+            if len(self.pending) > self.max_pending:
+                self.pending.popitem(last=False)
+
+    def observe_receipt(self, tx_receipt):
+        self.note_block(tx_receipt['blockNumber'])
+        expected = self.pending.pop(tx_receipt['transactionHash'], None)
+        if expected is None:
+            return
+        key, gas = expected
+        if tx_receipt['status'] == 1:
+            self.gas_used.setdefault(key, deque(maxlen=self.window)).append(tx_receipt['gasUsed'])
+        elif tx_receipt['gasUsed'] >= gas:
+            logger.warning("%s ran out of gas at %d; estimating it again", key, gas)
+            self.forget(key)
+
+    def forget(self, key):
+        self.estimates.pop(key, None)
+        self.gas_used.pop(key, None)
+
+    def note_block(self, block_number):
+        """A newer block has a new base fee."""
+        if self.fees_block is not None and block_number > self.fees_block:
+            self.fees = None
+
+    async def fee_params(self):
+        """maxFeePerGas/maxPriorityFeePerGas, or gasPrice on chains without EIP-1559."""
+        if self.fees is not None and time.monotonic() < self.fees_expire_at:
+            return self.fees
+        async with self.fees_lock:
+            # Concurrent senders wait for the one refresh instead of each making their own
+            if self.fees is None or time.monotonic() >= self.fees_expire_at:
+                self.fees, self.fees_block = await self.fetch_fees()
+                self.fees_expire_at = time.monotonic() + self.refresh_seconds
+        return self.fees
+
+    async def fetch_fees(self):
+        try:
+            with track_rpc('fee_history'):
+                history = await self.web3.eth.fee_history(1, 'latest', [self.reward_percentile])
+        except Web3Exception as e:
+            logger.debug("eth_feeHistory unavailable, using gasPrice: %s", e)
+            history = None
+        if history and history['baseFeePerGas'] and history['baseFeePerGas'][-1]:
+            # baseFeePerGas ends with the base fee of the block after the latest one
+            base_fee = history['baseFeePerGas'][-1]
+            rewards = history.get('reward') or []
+            priority_fee = max(rewards[-1][0] if rewards and rewards[-1] else 0, MIN_PRIORITY_FEE_WEI)
+            fees = {'maxFeePerGas': 2 * base_fee + priority_fee, 'maxPriorityFeePerGas': priority_fee}
+            return fees, history['oldestBlock'] + len(history['gasUsedRatio']) - 1
+        with track_rpc('gas_price'):
+            return {'gasPrice': await self.web3.eth.gas_price}, None
+
+    def reset(self):
+        """Forgets learned gas and fees, e.g. after the local chain is restarted."""
+        self.estimates.clear()
+        self.gas_used.clear()
+        self.pending.clear()
+        self.fees = None
+        self.fees_block = None
@@ -0,0 +1,57 @@
+import json
+from collections.abc import Mapping
+from decimal import Decimal
+from functools import singledispatch
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; the standard library encoder produces the same output, only slower
+    orjson = None
+
+# Fields kept by compact_transaction_receipt
+COMPACT_RECEIPT_FIELDS = ('transactionHash', 'blockHash', 'blockNumber', 'from', 'to', 'gasUsed', 'effectiveGasPrice', 'status')
+
+@singledispatch
+def encode_value(value):
+    """
+    Called by the encoder for values it can't write natively. Containers are returned as plain dicts and
+    lists, which the encoder then walks itself, so only the leaves go through this dispatch.
+    """
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+@encode_value.register
+def _(value: Mapping):  # web3's AttributeDict
+    return dict(value)
+
+@encode_value.register
+def _(value: bytes):  # includes HexBytes
+    return value.hex()
+
+@encode_value.register
+def _(value: Decimal):
+    return int(value) if value == value.to_integral_value() else float(value)
+
+@encode_value.register
+def _(value: set):
+    return list(value)
+
+def dumps(content):
+    """Serializes content to JSON bytes, with orjson when it's installed."""
+    if orjson is not None:
+        return orjson.dumps(content, default=encode_value, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=encode_value, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response that writes web3 results (AttributeDict, HexBytes, bytes) and DynamoDB numbers (Decimal) directly.
+    Return it from an endpoint to skip FastAPI's jsonable_encoder pass over the content.
+    """
+    def render(self, content):
+        return dumps(content)
+
+def compact_transaction_receipt(tx_receipt):
+    """The outcome of a transaction (hashes, block, gas, status) without its logs and bloom filter."""
+    compact = {field: tx_receipt[field] for field in COMPACT_RECEIPT_FIELDS if field in tx_receipt}
+    compact['logCount'] = len(tx_receipt.get('logs', []))
+    return compact
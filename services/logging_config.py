@@ -0,0 +1,81 @@
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import sys
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+# Set by the request middleware in main.py; asyncio tasks and asyncio.to_thread inherit it
+request_id_var = ContextVar('request_id', default=None)
+
+# Attributes every LogRecord has, so anything else on a record came from extra= and is logged as a field
+STANDARD_RECORD_ATTRIBUTES = set(logging.LogRecord('', 0, '', 0, '', (), None).__dict__) | {'message', 'asctime', 'request_id', 'taskName'}
+
+class RequestIdFilter(logging.Filter):
+    """Stamps each record with the id of the request being handled when it was logged."""
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+class RecordQueueHandler(QueueHandler):
+    """
+    QueueHandler that only merges the message arguments on the calling side and keeps the traceback
+    separate, leaving the actual formatting to the listener thread.
+    """
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: timestamp, level, logger, message, request_id and any extra= fields."""
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'request_id': getattr(record, 'request_id', None)
+        }
+        entry.update({key: value for key, value in record.__dict__.items() if key not in STANDARD_RECORD_ATTRIBUTES})
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s')
+
+_listener = None
+
+def configure_logging():
+    """
+    Routes every log record through a queue: callers only enqueue the record, and a background thread
+    formats it and writes it to stdout. Level comes from LOG_LEVEL (default INFO, so debug payload dumps are
+    skipped before they're formatted) and LOG_FORMAT picks json (default) or text output. Safe to call twice.
+    """
+    global _listener
+    if _listener is not None:
+        return
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(TextFormatter() if os.getenv('LOG_FORMAT', 'json') == 'text' else JsonFormatter())
+    log_queue = queue.SimpleQueue()
+    queue_handler = RecordQueueHandler(log_queue)
+    # The request id must be read on the calling side, where the context variable is set
+    queue_handler.addFilter(RequestIdFilter())
+
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(os.getenv('LOG_LEVEL', 'INFO').upper())
+    _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
@@ -0,0 +1,169 @@
+import threading
+import time
+from contextlib import contextmanager
+
+# Latency buckets in seconds, from a cached DynamoDB read up to waiting on a slow block
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+class Metric:
+    """Base for the metric types below. Values are kept per label combination and rendered in Prometheus text format."""
+    metric_type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self.lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(labelname, '')) for labelname in self.labelnames)
+
+    def _format_labels(self, key, extra=None):
+        pairs = list(zip(self.labelnames, key))
+        if extra:
+            pairs.append(extra)
+        if not pairs:
+            return ''
+        escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+        return '{' + ','.join(f'{labelname}="{value}"' for (labelname, _), value in zip(pairs, escaped)) + '}'
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+        with self.lock:
+            for key, value in self.values.items():
+                lines.extend(self._render_value(key, value))
+        return lines
+
+    def _render_value(self, key, value):
+        return [f"{self.name}{self._format_labels(key)} {value}"]
+
+class Counter(Metric):
+    metric_type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+class Gauge(Metric):
+    metric_type = 'gauge'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[self._key(labels)] = value
+
+class Histogram(Metric):
+    metric_type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self.lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state['counts'][i] += 1
+            state['sum'] += value
+            state['count'] += 1
+
+    def _render_value(self, key, state):
+        lines = [
+            f"{self.name}_bucket{self._format_labels(key, ('le', repr(float(bound))))} {count}"
+            for bound, count in zip(self.buckets, state['counts'])
+        ]
+        lines.append(f"{self.name}_bucket{self._format_labels(key, ('le', '+Inf'))} {state['count']}")
+        lines.append(f"{self.name}_sum{self._format_labels(key)} {state['sum']}")
+        lines.append(f"{self.name}_count{self._format_labels(key)} {state['count']}")
+        return lines
+
+REGISTRY = []
+
+def render_metrics():
+    """All metrics of this process in the Prometheus text exposition format."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+HTTP_REQUESTS = Counter('http_requests_total', 'HTTP requests by route and status code.', ('method', 'route', 'status'))
+HTTP_REQUEST_DURATION = Histogram('http_request_duration_seconds', 'HTTP request latency by route.', ('method', 'route'))
+HTTP_IN_FLIGHT = Gauge('http_requests_in_flight', 'HTTP requests currently being handled.')
+
+RPC_STAGE_DURATION = Histogram('rpc_stage_duration_seconds', 'Time spent in each blockchain interaction stage.', ('stage',))
+RPC_ERRORS = Counter('rpc_errors_total', 'Blockchain interaction stages that raised an error.', ('stage',))
+RPC_IN_FLIGHT = Gauge('rpc_in_flight', 'Blockchain interaction stages currently running.')
+RPC_ENDPOINT_UP = Gauge('rpc_endpoint_up', 'Whether the last health probe of each JSON-RPC endpoint succeeded.', ('endpoint',))
+RPC_ENDPOINT_LATENCY = Gauge('rpc_endpoint_latency_seconds', 'Smoothed health probe latency of each JSON-RPC endpoint.', ('endpoint',))
+RPC_ENDPOINT_FAILOVERS = Counter('rpc_endpoint_failovers_total', 'Times the write endpoint moved, by the endpoint it moved to.', ('endpoint',))
+
+DYNAMODB_CALL_DURATION = Histogram('dynamodb_call_duration_seconds', 'DynamoDB API call latency.', ('table', 'operation'))
+DYNAMODB_ERRORS = Counter('dynamodb_errors_total', 'DynamoDB API calls that failed.', ('table', 'operation'))
+DYNAMODB_IN_FLIGHT = Gauge('dynamodb_in_flight', 'DynamoDB API calls currently running.')
+
+RELEASE_QUEUE_DEPTH = Gauge('release_scheduler_queue_depth', 'Receipts waiting in the release scheduler.')
+RELEASE_LAG = Gauge('release_scheduler_lag_seconds', 'Chain time since the oldest due receipt became eligible for release.')
+RELEASE_OUTCOMES = Counter('release_scheduler_receipts_total', 'Receipts handled by the release scheduler by outcome.', ('outcome',))
+
+@contextmanager
+def track_rpc(stage):
+    """Times one stage of a blockchain interaction (submit, wait_for_receipt, get_block, process_log, ...)."""
+    RPC_IN_FLIGHT.inc()
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        RPC_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        RPC_STAGE_DURATION.observe(time.perf_counter() - start, stage=stage)
+        RPC_IN_FLIGHT.dec()
+
+def instrument_dynamodb_client(client):
+    """
+    Hooks into a boto3 DynamoDB client's event system so every API call made through it (including the ones
+    issued by resources and batch_writer) is timed and counted per table and operation.
+    """
+    def before_parameter_build(params, model, context, **kwargs):
+        # The serialized request no longer exposes the table name, so note it (and the operation) here
+        context['metrics_table'] = params.get('TableName') or ','.join(params.get('RequestItems', {}).keys()) or '-'
+        context['metrics_operation'] = model.name
+
+    def before_call(context, **kwargs):
+        context['metrics_start'] = time.perf_counter()
+        DYNAMODB_IN_FLIGHT.inc()
+
+    def finish(context, failed):
+        start = context.pop('metrics_start', None)
+        if start is None:
+            return
+        labels = {'table': context.get('metrics_table', '-'), 'operation': context.get('metrics_operation', '-')}
+        DYNAMODB_CALL_DURATION.observe(time.perf_counter() - start, **labels)
+        if failed:
+            DYNAMODB_ERRORS.inc(**labels)
+        DYNAMODB_IN_FLIGHT.dec()
+
+    def after_call(http_response, context, **kwargs):
+        finish(context, http_response.status_code >= 300)
+
+    def after_call_error(context, **kwargs):
+        finish(context, True)
+
+    client.meta.events.register('before-parameter-build.dynamodb', before_parameter_build)
+    client.meta.events.register('before-call.dynamodb', before_call)
+    client.meta.events.register('after-call.dynamodb', after_call)
+    client.meta.events.register('after-call-error.dynamodb', after_call_error)
@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import List
+from pydantic import BaseModel, Field
+from typing import List, Optional, Dict, Any
 
 class create_seller_contract(BaseModel):
     seller_account_address:str
@@ -10,12 +10,27 @@ class issue_receipt_model(BaseModel):
     buyer_address:str
     amount_eth:float
     item_name:str
+    wait_for_confirmation:bool = True
+
+class issue_receipts_batch_model(BaseModel):
+    receipts:List[issue_receipt_model]
+    payer_address:Optional[str] = None
 
 class get_seller_receipts_model(BaseModel):
     seller_address:str
+    limit:Optional[int] = Field(None, ge=1)
+    next_token:Optional[str] = None
+    filter_by:Optional[Dict[str,Any]] = None
+    sort_by:Optional[str] = None
+    ascending:bool = True
 
 class get_buyer_receipts_model(BaseModel):
     buyer_address:str
+    limit:Optional[int] = Field(None, ge=1)
+    next_token:Optional[str] = None
+    filter_by:Optional[Dict[str,Any]] = None
+    sort_by:Optional[str] = None
+    ascending:bool = True
 
 class request_return_model(BaseModel):
     # seller_address:str
@@ -26,6 +41,10 @@ class request_return_model(BaseModel):
 class release_return_model(BaseModel):
     transaction_hash:str
 
+class release_funds_batch_model(BaseModel):
+    transaction_hashes:Optional[List[str]] = None
+    seller_address:Optional[str] = None
+
 class credentials(BaseModel):
     username:str
     password:str
@@ -0,0 +1,52 @@
+import asyncio
+import heapq
+
+class NonceManager:
+    """
+    Hands out transaction nonces per sender address from local state instead of letting the node
+    pick one inside every transact(). Many transactions from one account can be in flight at once,
+    each with its own nonce, before any of them is mined.
+
+    The starting point for an address is eth_getTransactionCount(address, 'pending'). Nonces that were
+    handed out but never broadcast are given back with release_nonce and reused first so no gap is left.
+    After a nonce error from the node, resync re-reads the pending count.
+    """
+    def __init__(self, web3):
+        self.web3 = web3
+        self.next_nonces = {}
+        self.released_nonces = {}
+        self.locks = {}
+
+    def _lock(self, address):
+        return self.locks.setdefault(address, asyncio.Lock())
+
+    async def next_nonce(self, address):
+        """Atomically reserves the next nonce for address."""
+        address = self.web3.to_checksum_address(address)
+        async with self._lock(address):
+            released = self.released_nonces.get(address)
+            if released:
+                return heapq.heappop(released)
+            if address not in self.next_nonces:
+                self.next_nonces[address] = await self.web3.eth.get_transaction_count(address, 'pending')
+            nonce = self.next_nonces[address]
+            self.next_nonces[address] = nonce + 1
+            return nonce
+
+    def release_nonce(self, address, nonce):
+        """Gives back a nonce whose transaction was never broadcast so the next send fills the gap."""
+        address = self.web3.to_checksum_address(address)
+        if nonce < self.next_nonces.get(address, 0):
+            heapq.heappush(self.released_nonces.setdefault(address, []), nonce)
+
+    async def resync(self, address):
+        """Drops local state for address and reloads it from the node's pending transaction count."""
+        address = self.web3.to_checksum_address(address)
+        async with self._lock(address):
+            self.released_nonces.pop(address, None)
+            self.next_nonces[address] = await self.web3.eth.get_transaction_count(address, 'pending')
+
+    def reset(self):
+        """Forgets every address, e.g. after the local chain is restarted."""
+        self.next_nonces.clear()
+        self.released_nonces.clear()
@@ -0,0 +1,121 @@
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Fields that never change once a receipt is issued
+IMMUTABLE_FIELDS = ('contract_address', 'buyer_address', 'seller_address', 'receipt_index')
+
+class ReceiptDetailsCache:
+    """
+    Read-through LRU cache of the on-chain identity of receipts (contract, buyer, seller, receipt index),
+    keyed by transaction hash, in front of the receipt store's get_receipt_details.
+    Those fields are fixed at issue time so they never go stale. The last known status is kept alongside
+    and dropped by invalidate_status whenever the receipt's status changes.
+    """
+    def __init__(self, receipt_db, maxsize=10000):
+        self.receipt_db = receipt_db
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, transaction_hash):
+        """Returns the cached details without touching DynamoDB, or None on a miss."""
+        with self.lock:
+            entry = self.entries.get(transaction_hash)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(transaction_hash)
+            self.hits += 1
+            return dict(entry)
+
+    def load(self, transaction_hash):
+        """Reads the receipt details from DynamoDB and caches them. Returns None if the receipt doesn't exist."""
+        receipt_details = self.receipt_db.get_receipt_details(transaction_hash)
+        if receipt_details is not None:
+            self._store(transaction_hash, receipt_details)
+        return receipt_details
+
+    def get_many(self, transaction_hashes):
+        """Read-through lookup for many receipts; all misses are loaded with one batch read. Returns None if that read fails."""
+        receipts_details = {}
+        missing = []
+        for transaction_hash in dict.fromkeys(transaction_hashes):
+            receipt_details = self.get(transaction_hash)
+            if receipt_details is None:
+                missing.append(transaction_hash)
+            else:
+                receipts_details[transaction_hash] = receipt_details
+        if missing:
+            loaded = self.receipt_db.get_receipts_details_batch(missing)
+            if loaded is None:
+                return None
+            for transaction_hash, receipt_details in loaded.items():
+                self._store(transaction_hash, receipt_details)
+            receipts_details.update(loaded)
+        return receipts_details
+
+    def put(self, receipt):
+        """Primes the cache with a receipt as stored in the Receipts table (e.g. right after issuing it)."""
+        self._store(receipt['transaction_hash'], {
+            'contract_address': receipt['seller_contract_address'],
+            'buyer_address': receipt['buyer_address'],
+            'seller_address': receipt['seller_address'],
+            'receipt_index': int(receipt['receipt_index']),
+            'status': receipt.get('status')
+        })
+
+    def invalidate_status(self, transaction_hash):
+        """Forgets the cached status of a receipt; its immutable fields stay cached."""
+        with self.lock:
+            entry = self.entries.get(transaction_hash)
+            if entry is not None:
+                entry.pop('status', None)
+
+    def warm(self):
+        """Fills the cache from a keys-and-identity-only scan of the Receipts table, up to maxsize receipts."""
+        loaded = 0
+        projection = ['transaction_hash', 'seller_contract_address', 'buyer_address', 'seller_address', 'receipt_index', 'status']
+        try:
+            for items in self.receipt_db.iter_receipt_pages(page_size=None, projection=projection):
+                for item in items:
+                    # Pending receipts don't have their receipt index yet
+                    if item.get('receipt_index') is not None and item.get('seller_contract_address'):
+                        self.put(item)
+                        loaded += 1
+                if loaded >= self.maxsize:
+                    break
+        except Exception:
+            # Whichever backend is configured; the cache just starts out colder
+            logger.exception("Error warming receipt cache")
+        logger.info("Receipt cache warmed with %d receipts.", min(loaded, self.maxsize))
+        return loaded
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+                'size': len(self.entries),
+                'maxsize': self.maxsize
+            }
+
+    def _store(self, transaction_hash, receipt_details):
+        entry = {field: receipt_details[field] for field in IMMUTABLE_FIELDS}
+        if receipt_details.get('status') is not None:
+            entry['status'] = receipt_details['status']
+        with self.lock:
+            self.entries[transaction_hash] = entry
+            self.entries.move_to_end(transaction_hash)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
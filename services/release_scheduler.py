@@ -0,0 +1,211 @@
+import asyncio
+import calendar
+import heapq
+import logging
+import time
+from datetime import datetime
+from services.metrics import RELEASE_QUEUE_DEPTH, RELEASE_LAG, RELEASE_OUTCOMES
+
+logger = logging.getLogger(__name__)
+
+# Reasons a receipt can't be released that won't change by trying again
+FINAL_FAILURE_REASONS = {
+    'Refund already issued',
+    'Funds already released',
+    'Invalid receipt index',
+    'Receipt not found',
+    'Seller address does not have an associated contract'
+}
+
+def purchase_timestamp(purchase_time):
+    """Receipts store the purchase block's timestamp as a UTC '%Y-%m-%d %H:%M:%S' string."""
+    return calendar.timegm(datetime.strptime(purchase_time, '%Y-%m-%d %H:%M:%S').timetuple())
+
+class ReleaseScheduler:
+    """
+    Releases escrowed funds on its own once a receipt's return window has closed, instead of waiting for the
+    seller to call /release_funds. Receipts wait in a min-heap keyed by the chain time at which the contract
+    will accept the release (purchase time + the seller's return window). The loop sleeps until the earliest
+    one is due, then hands due receipts to release (DataService.funds_release_batch) batch_size at a time,
+    sending at most one batch every min_interval seconds.
+
+    Chain time is the latest block's timestamp, or the wall clock if that is later: the release goes into the
+    next block, whose timestamp is at least the current time. Receipts the contract still considers open are
+    checked again after retry_delay; failed releases are retried with exponential backoff up to max_attempts.
+    """
+    def __init__(self, contract_interface, receipt_db, seller_registry, release, batch_size=100, min_interval=1.0, max_sleep=60.0, retry_delay=5.0, max_attempts=5):
+        self.contract_interface = contract_interface
+        self.receipt_db = receipt_db
+        self.seller_registry = seller_registry
+        self.release = release
+        self.batch_size = batch_size
+        self.min_interval = min_interval
+        self.max_sleep = max_sleep
+        self.retry_delay = retry_delay
+        self.max_attempts = max_attempts
+        # (due, transaction_hash) entries; an entry whose due no longer matches self.due is stale and skipped
+        self.heap = []
+        self.due = {}
+        self.attempts = {}
+        self.last_release = 0.0
+        self.lag = 0.0
+        self.wakeup = asyncio.Event()
+        self.task = None
+
+    def schedule(self, transaction_hash, due):
+        self.due[transaction_hash] = due
+        heapq.heappush(self.heap, (due, transaction_hash))
+        RELEASE_QUEUE_DEPTH.set(len(self.due))
+        if self.heap[0][1] == transaction_hash:
+            self.wakeup.set()
+
+    async def add(self, receipt):
+        """Schedules an Active receipt (as stored in the Receipts table) for release."""
+        seller = await asyncio.to_thread(self.seller_registry.get, receipt['seller_address'])
+        if seller is not None and receipt.get('purchase_time'):
+            self.schedule(receipt['transaction_hash'], purchase_timestamp(receipt['purchase_time']) + int(seller['return_window_days']) * 86400)
+
+    def discard(self, transaction_hash):
+        """Stops tracking a receipt that was returned or released some other way."""
+        if self.due.pop(transaction_hash, None) is not None:
+            self.attempts.pop(transaction_hash, None)
+            RELEASE_QUEUE_DEPTH.set(len(self.due))
+
+    def clear(self):
+        self.heap = []
+        self.due.clear()
+        self.attempts.clear()
+        RELEASE_QUEUE_DEPTH.set(0)
+
+    def load(self):
+        """Reads every Active receipt from the store. Blocking; returns (transaction_hash, due) pairs."""
+        entries = []
+        projection = ['transaction_hash', 'seller_address', 'purchase_time', 'status']
+        for items in self.receipt_db.iter_receipt_pages(page_size=None, projection=projection):
+            for item in items:
+                if item.get('status') != 'Active' or not item.get('purchase_time'):
+                    continue
+                seller = self.seller_registry.get(item['seller_address'])
+                if seller is not None:
+                    entries.append((item['transaction_hash'], purchase_timestamp(item['purchase_time']) + int(seller['return_window_days']) * 86400))
+        return entries
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def run(self):
+        try:
+            for transaction_hash, due in await asyncio.to_thread(self.load):
+                self.schedule(transaction_hash, due)
+            logger.info("Release scheduler loaded %d receipts.", len(self.due))
+        except Exception:
+            logger.exception("Release scheduler failed to load receipts")
+        while True:
+            # Cleared before the pass so receipts scheduled during it cut the following sleep short
+            self.wakeup.clear()
+            try:
+                delay = await self.release_due()
+            except Exception:
+                logger.exception("Release scheduler pass failed")
+                delay = self.retry_delay
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+
+    def _peek(self):
+        """The earliest live (due, transaction_hash) entry, dropping stale ones, or None."""
+        while self.heap:
+            due, transaction_hash = self.heap[0]
+            if self.due.get(transaction_hash) == due:
+                return self.heap[0]
+            heapq.heappop(self.heap)
+        return None
+
+    async def chain_time(self):
+        return max(await self.contract_interface.get_chain_time(), time.time())
+
+    async def release_due(self):
+        """Releases one batch of due receipts. Returns how long to sleep before the next pass."""
+        head = self._peek()
+        if head is None:
+            self.lag = 0.0
+            RELEASE_LAG.set(0)
+            return self.max_sleep
+        now = await self.chain_time()
+        if head[0] > now:
+            self.lag = 0.0
+            RELEASE_LAG.set(0)
+            return min(head[0] - now, self.max_sleep)
+        self.lag = now - head[0]
+        RELEASE_LAG.set(self.lag)
+
+        wait = self.last_release + self.min_interval - time.monotonic()
+        if wait > 0:
+            return wait
+        batch = []
+        while len(batch) < self.batch_size:
+            head = self._peek()
+            if head is None or head[0] > now:
+                break
+            heapq.heappop(self.heap)
+            batch.append(head[1])
+        self.last_release = time.monotonic()
+        await self.release_batch(batch, now)
+        return 0
+
+    async def release_batch(self, transaction_hashes, now):
+        try:
+            release_details, success, error_message = await self.release(transaction_hashes=transaction_hashes)
+        except Exception as e:
+            logger.exception("Scheduled release failed")
+            release_details, success, error_message = None, False, str(e)
+        if not success:
+            for transaction_hash in transaction_hashes:
+                self.retry(transaction_hash, now, error_message)
+            return
+        for item_result in release_details['results']:
+            transaction_hash = item_result['transaction_hash']
+            reason = item_result.get('reason')
+            if item_result['status'] == 'Success':
+                self.discard(transaction_hash)
+                RELEASE_OUTCOMES.inc(outcome='released')
+            elif reason == 'Return window still open':
+                self.schedule(transaction_hash, now + self.retry_delay)
+            elif reason in FINAL_FAILURE_REASONS:
+                self.discard(transaction_hash)
+                RELEASE_OUTCOMES.inc(outcome='skipped')
+            else:
+                self.retry(transaction_hash, now, reason)
+        logger.info("Scheduled release: %d of %d receipts released.", release_details['released'], len(transaction_hashes))
+
+    def retry(self, transaction_hash, now, reason):
+        attempts = self.attempts.get(transaction_hash, 0) + 1
+        if attempts >= self.max_attempts:
+            logger.warning("Giving up releasing %s after %d attempts: %s", transaction_hash, attempts, reason)
+            self.discard(transaction_hash)
+            RELEASE_OUTCOMES.inc(outcome='failed')
+            return
+        self.attempts[transaction_hash] = attempts
+        RELEASE_OUTCOMES.inc(outcome='retried')
+        self.schedule(transaction_hash, now + self.retry_delay * 2 ** (attempts - 1))
+
+    def stats(self):
+        head = self._peek()
+        return {
+            'queue_depth': len(self.due),
+            'next_due': head[0] if head is not None else None,
+            'lag_seconds': self.lag,
+            'running': self.task is not None
+        }
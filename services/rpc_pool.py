@@ -0,0 +1,273 @@
+import asyncio
+import logging
+import os
+import time
+from urllib.parse import urlsplit
+from aiohttp import ClientConnectorError
+from web3 import AsyncWeb3
+from web3.exceptions import ProviderConnectionError
+from web3.providers.async_base import AsyncJSONBaseProvider
+from services.metrics import RPC_ENDPOINT_UP, RPC_ENDPOINT_LATENCY, RPC_ENDPOINT_FAILOVERS
+
+logger = logging.getLogger(__name__)
+
+# Methods any endpoint that is caught up can answer. Everything else (sending, nonces, receipts of our own
+# transactions, the node's accounts, evm_* test methods) goes to the sticky write endpoint
+READ_METHODS = frozenset({
+    'eth_blockNumber',
+    'eth_getBlockByNumber',
+    'eth_getBlockByHash',
+    'eth_getBalance',
+    'eth_getCode',
+    'eth_getStorageAt',
+    'eth_call',
+    'eth_getLogs',
+    'eth_chainId',
+    'eth_gasPrice',
+    'eth_feeHistory',
+    'eth_maxPriorityFeePerGas',
+    'net_version',
+    'web3_clientVersion'
+})
+
+def endpoint_name(url):
+    """host:port of an RPC URL, for logs and metric labels. Drops credentials and the path, which often holds an API key."""
+    return urlsplit(url).netloc.rsplit('@', 1)[-1]
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold consecutive failures and stops calls to the endpoint for reset_timeout seconds.
+    After that it is half-open: calls go through again, the first success closes it and the first failure reopens it.
+    """
+    def __init__(self, failure_threshold=3, reset_timeout=10.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        return 'half_open' if time.monotonic() - self.opened_at >= self.reset_timeout else 'open'
+
+    def allows(self):
+        return self.state != 'open'
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self):
+        self.failures += 1
+        if self.state == 'half_open' or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+    def trip(self):
+        """Opens immediately, e.g. when the endpoint refused the connection."""
+        self.failures = max(self.failures, self.failure_threshold)
+        self.opened_at = time.monotonic()
+
+class Endpoint:
+    def __init__(self, url, breaker):
+        self.url = url
+        self.name = endpoint_name(url)
+        # The pool fails over to another endpoint instead, so the provider's own retries (with backoff) are turned off
+        self.provider = AsyncWeb3.AsyncHTTPProvider(url, exception_retry_configuration=None)
+        self.breaker = breaker
+        self.latency = None
+        self.block_number = None
+
+    async def call(self, request, timeout):
+        """Awaits request(provider) within timeout, recording the outcome on the breaker."""
+        try:
+            response = await asyncio.wait_for(request(self.provider), timeout)
+        except ClientConnectorError:
+            # Nothing is listening; no point trying it again until the breaker resets
+            self.breaker.trip()
+            raise
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        # A JSON-RPC error (a revert, a bad nonce, ...) is still a healthy node answering
+        self.breaker.record_success()
+        return response
+
+    def observe_latency(self, seconds, alpha=0.3):
+        self.latency = seconds if self.latency is None else alpha * seconds + (1 - alpha) * self.latency
+
+class RPCPool(AsyncJSONBaseProvider):
+    """
+    web3 provider over several JSON-RPC endpoints of the same chain.
+
+    Read-only methods (READ_METHODS) go to the endpoint with the lowest probe latency among those whose breaker
+    allows calls and that are caught up, falling over to the next one if a call fails. Caught up means within
+    max_block_lag blocks of the highest head seen and at or past the block of the last transaction receipt we
+    fetched, so a read after our own write doesn't hit a node that hasn't imported it yet. The write endpoint
+    always qualifies. Every other method goes to that one sticky write endpoint, the first healthy one in
+    configured order, so nonces, pending transactions and their receipts all come from the node that accepted
+    them. A write is only retried elsewhere when the connection was refused, since anything else may have reached
+    the node. When the write endpoint changes, on_failover is called (the contract interface resyncs its nonces).
+
+    A background task calls eth_blockNumber on every endpoint each health_interval seconds to measure latency
+    and head block, and lets endpoints with an open breaker back in once they answer. Every call is bounded by timeout.
+    """
+    def __init__(self, urls, timeout=10.0, failure_threshold=3, reset_timeout=10.0, health_interval=5.0, max_block_lag=2):
+        super().__init__()
+        if not urls:
+            raise ValueError("RPCPool needs at least one endpoint URL")
+        self.endpoints = [Endpoint(url, CircuitBreaker(failure_threshold, reset_timeout)) for url in urls]
+        self.timeout = timeout
+        self.health_interval = health_interval
+        self.max_block_lag = max_block_lag
+        self.write_endpoint = self.endpoints[0]
+        # Block of the newest transaction receipt fetched through the pool
+        self.min_read_block = 0
+        # web3's validation middleware asks for the chain id before every eth_call, eth_estimateGas and
+        # eth_sendTransaction; every endpoint serves the same chain, so the first answer is reused
+        self.chain_id_response = None
+        self.on_failover = None
+        self.task = None
+
+    @classmethod
+    def from_env(cls, urls):
+        """urls is a list or a comma-separated string, e.g. RPC_URLS."""
+        if isinstance(urls, str):
+            urls = [url.strip() for url in urls.split(',') if url.strip()]
+        return cls(
+            urls,
+            timeout=float(os.getenv('RPC_TIMEOUT_SECONDS', '10')),
+            failure_threshold=int(os.getenv('RPC_BREAKER_FAILURES', '3')),
+            reset_timeout=float(os.getenv('RPC_BREAKER_RESET_SECONDS', '10')),
+            health_interval=float(os.getenv('RPC_HEALTH_INTERVAL_SECONDS', '5')),
+            max_block_lag=int(os.getenv('RPC_MAX_BLOCK_LAG', '2'))
+        )
+
+    def __str__(self):
+        return f"RPC pool {', '.join(endpoint.name for endpoint in self.endpoints)}"
+
+    def select_write_endpoint(self):
+        if self.write_endpoint.breaker.allows():
+            return self.write_endpoint
+        for endpoint in self.endpoints:
+            if endpoint.breaker.allows():
+                logger.warning("RPC write endpoint failing over from %s to %s", self.write_endpoint.name, endpoint.name)
+                RPC_ENDPOINT_FAILOVERS.inc(endpoint=endpoint.name)
+                self.write_endpoint = endpoint
+                if self.on_failover is not None:
+                    self.on_failover()
+                return endpoint
+        raise ProviderConnectionError(f"No healthy RPC endpoint ({self})")
+
+    def select_read_endpoints(self):
+        """Endpoints that are available and caught up, fastest first."""
+        write_endpoint = self.select_write_endpoint()
+        heads = [endpoint.block_number for endpoint in self.endpoints if endpoint.block_number is not None and endpoint.breaker.allows()]
+        lowest = max(max(heads, default=0) - self.max_block_lag, self.min_read_block)
+        available = [
+            endpoint for endpoint in self.endpoints
+            if endpoint is write_endpoint or (endpoint.breaker.allows() and endpoint.block_number is not None and endpoint.block_number >= lowest)
+        ]
+        return sorted(available, key=lambda endpoint: endpoint.latency if endpoint.latency is not None else float('inf'))
+
+    async def route(self, read_only, request):
+        if read_only:
+            error = None
+            for endpoint in self.select_read_endpoints():
+                try:
+                    return await endpoint.call(request, self.timeout)
+                except Exception as e:
+                    logger.warning("RPC read from %s failed: %r", endpoint.name, e)
+                    error = e
+            raise error
+        for _ in self.endpoints:
+            endpoint = self.select_write_endpoint()
+            try:
+                return await endpoint.call(request, self.timeout)
+            except ClientConnectorError as e:
+                # Refused before anything was sent, so it is safe to send it to the next endpoint
+                logger.warning("RPC endpoint %s refused the connection: %r", endpoint.name, e)
+                error = e
+        raise error
+
+    async def make_request(self, method, params):
+        if method == 'eth_chainId' and self.chain_id_response is not None:
+            return self.chain_id_response
+        response = await self.route(method in READ_METHODS, lambda provider: provider.make_request(method, params))
+        if method == 'eth_getTransactionReceipt' and response.get('result'):
+            self.min_read_block = max(self.min_read_block, int(response['result']['blockNumber'], 16))
+        elif method == 'eth_chainId' and 'result' in response:
+            self.chain_id_response = response
+        return response
+
+    async def make_batch_request(self, requests):
+        read_only = all(method in READ_METHODS for method, _ in requests)
+        return await self.route(read_only, lambda provider: provider.make_batch_request(requests))
+
+    async def is_connected(self, show_traceback=False):
+        await self.check_health()
+        connected = any(endpoint.breaker.allows() for endpoint in self.endpoints)
+        if not connected and show_traceback:
+            raise ProviderConnectionError(f"No healthy RPC endpoint ({self})")
+        return connected
+
+    async def probe(self, endpoint):
+        start = time.perf_counter()
+        try:
+            response = await endpoint.call(lambda provider: provider.make_request('eth_blockNumber', []), self.timeout)
+            if 'error' in response:
+                raise ProviderConnectionError(str(response['error']))
+        except Exception as e:
+            if endpoint.breaker.state != 'closed':
+                logger.warning("RPC endpoint %s is unhealthy: %r", endpoint.name, e)
+            RPC_ENDPOINT_UP.set(0, endpoint=endpoint.name)
+            return
+        endpoint.observe_latency(time.perf_counter() - start)
+        endpoint.block_number = int(response['result'], 16)
+        RPC_ENDPOINT_UP.set(1, endpoint=endpoint.name)
+        RPC_ENDPOINT_LATENCY.set(endpoint.latency, endpoint=endpoint.name)
+
+    async def check_health(self):
+        await asyncio.gather(*(self.probe(endpoint) for endpoint in self.endpoints))
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.health_interval)
+            try:
+                await self.check_health()
+            except Exception:
+                logger.exception("RPC health check failed")
+
+    def reset(self):
+        """Closes every breaker and forgets head blocks, e.g. after the local node was restarted with a fresh chain."""
+        for endpoint in self.endpoints:
+            endpoint.breaker.record_success()
+            endpoint.block_number = None
+        self.write_endpoint = self.endpoints[0]
+        self.min_read_block = 0
+        self.chain_id_response = None
+
+    def stats(self):
+        return [
+            {
+                'endpoint': endpoint.name,
+                'state': endpoint.breaker.state,
+                'latency_ms': round(endpoint.latency * 1000, 2) if endpoint.latency is not None else None,
+                'block_number': endpoint.block_number,
+                'write': endpoint is self.write_endpoint
+            }
+            for endpoint in self.endpoints
+        ]
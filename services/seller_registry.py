@@ -0,0 +1,120 @@
+import json
+import os
+import threading
+import time
+import uuid
+
+class InMemoryInvalidationBus:
+    """Delivers invalidations to subscribers in this process only. Enough for a single worker."""
+    def __init__(self):
+        self.subscribers = []
+
+    def subscribe(self, callback):
+        self.subscribers.append(callback)
+
+    def publish(self, key):
+        for callback in self.subscribers:
+            callback(key)
+
+    def poll(self):
+        pass
+
+class FileInvalidationBus:
+    """
+    Local pub/sub stand-in for several uvicorn workers on one host. Every worker appends invalidations
+    to the same file and picks up the others' lines on poll(), which only costs a stat() when nothing changed.
+    Messages carry the publishing process's id so a worker doesn't drop its own fresh entries.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.origin = uuid.uuid4().hex
+        self.subscribers = []
+        self.lock = threading.Lock()
+        try:
+            self.offset = os.path.getsize(path)
+        except OSError:
+            self.offset = 0
+
+    def subscribe(self, callback):
+        self.subscribers.append(callback)
+
+    def publish(self, key):
+        with open(self.path, 'a') as f:
+            f.write(json.dumps({'origin': self.origin, 'key': key}) + "\n")
+
+    def poll(self):
+        try:
+            size = os.path.getsize(self.path)
+        except OSError:
+            return
+        with self.lock:
+            if size < self.offset:
+                # The file was truncated, start reading from the top again
+                self.offset = 0
+            if size == self.offset:
+                return
+            with open(self.path, 'rb') as f:
+                f.seek(self.offset)
+                data = f.read()
+            # Leave a partially written last line for the next poll
+            consumed = data.rfind(b"\n") + 1
+            self.offset += consumed
+            lines = data[:consumed].decode('utf-8').splitlines()
+        for line in lines:
+            message = json.loads(line)
+            if message['origin'] != self.origin:
+                for callback in self.subscribers:
+                    callback(message['key'])
+
+class SellerRegistry:
+    """
+    Read-through cache of the Sellers table keyed by seller address.
+    A miss is filled with a single get_item, unknown sellers are negatively cached for a short time,
+    and changes are announced on the invalidation bus so other workers drop their copy.
+    """
+    def __init__(self, seller_db, ttl=300, negative_ttl=5, invalidation_bus=None):
+        self.seller_db = seller_db
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.invalidation_bus = invalidation_bus or InMemoryInvalidationBus()
+        self.invalidation_bus.subscribe(self._drop)
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def get(self, seller_address):
+        """Returns the seller record, or None if the address has no contract."""
+        self.invalidation_bus.poll()
+        with self.lock:
+            entry = self.entries.get(seller_address)
+        if entry is not None and entry[0] > time.monotonic():
+            return entry[1]
+        seller = self.seller_db.get_seller(seller_address)
+        self._store(seller_address, seller)
+        return seller
+
+    def put(self, seller):
+        """Caches a seller this worker just created and tells the other workers to forget their copy."""
+        self.invalidation_bus.publish(seller['seller_address'])
+        self._store(seller['seller_address'], seller)
+
+    def prime(self, sellers):
+        for seller in sellers:
+            self._store(seller['seller_address'], seller)
+
+    def invalidate(self, seller_address=None):
+        """Drops one seller, or every seller when no address is given, here and in the other workers."""
+        key = seller_address or '*'
+        self._drop(key)
+        self.invalidation_bus.publish(key)
+
+    def _store(self, seller_address, seller):
+        ttl = self.ttl if seller is not None else self.negative_ttl
+        with self.lock:
+            self.entries[seller_address] = (time.monotonic() + ttl, seller)
+
+    def _drop(self, key):
+        with self.lock:
+            if key == '*':
+                self.entries.clear()
+            else:
+                self.entries.pop(key, None)
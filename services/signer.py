@@ -0,0 +1,80 @@
+import asyncio
+import glob
+import json
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from eth_account import Account
+from eth_account.hdaccount import seed_from_mnemonic, key_from_seed
+from eth_utils import to_checksum_address
+
+logger = logging.getLogger(__name__)
+
+def derive_keys(mnemonic, count, passphrase=""):
+    """Derives the private keys of the first count HD wallet addresses (m/44'/60'/0'/0/i, the path Ganache uses)."""
+    # The seed is the expensive part (PBKDF2), so compute it once for every index
+    seed = seed_from_mnemonic(mnemonic, passphrase)
+    return [key_from_seed(seed, f"m/44'/60'/0'/0/{i}") for i in range(count)]
+
+class LocalSigner:
+    """
+    Holds private keys in process and signs transactions locally, so they can be sent with
+    eth_sendRawTransaction to any node instead of relying on accounts unlocked on one Ganache.
+    Keys come from an HD mnemonic and/or a directory of encrypted JSON keystore files. Both are
+    decrypted or derived in load(), off the event loop. Signing runs on a small thread pool.
+    """
+    def __init__(self, mnemonic=None, account_count=10, keystore_dir=None, keystore_password=None, workers=4):
+        self.mnemonic = mnemonic
+        self.account_count = account_count
+        self.keystore_dir = keystore_dir
+        self.keystore_password = keystore_password
+        self.accounts = {}
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='signer')
+
+    @classmethod
+    def from_env(cls):
+        """
+        A signer for SIGNER_MNEMONIC and/or SIGNER_KEYSTORE_DIR, or None when neither is set and the node's
+        own accounts should sign.
+        """
+        mnemonic = os.getenv('SIGNER_MNEMONIC')
+        keystore_dir = os.getenv('SIGNER_KEYSTORE_DIR')
+        if not mnemonic and not keystore_dir:
+            return None
+        return cls(
+            mnemonic=mnemonic,
+            account_count=int(os.getenv('SIGNER_ACCOUNT_COUNT', '10')),
+            keystore_dir=keystore_dir,
+            keystore_password=os.getenv('SIGNER_KEYSTORE_PASSWORD', ''),
+            workers=int(os.getenv('SIGNER_WORKERS', '4'))
+        )
+
+    def _load_keys(self):
+        keys = []
+        if self.mnemonic:
+            keys.extend(derive_keys(self.mnemonic, self.account_count))
+        if self.keystore_dir:
+            for path in sorted(glob.glob(os.path.join(self.keystore_dir, '*'))):
+                with open(path) as f:
+                    keystore = json.load(f)
+                # Keystores are encrypted with a deliberately slow KDF, which is why this runs on a thread
+                keys.append(Account.decrypt(keystore, self.keystore_password))
+        return {account.address: account for account in map(Account.from_key, keys)}
+
+    async def load(self):
+        self.accounts = await asyncio.to_thread(self._load_keys)
+        logger.info("Local signer loaded %d accounts.", len(self.accounts))
+
+    @property
+    def addresses(self):
+        return list(self.accounts.keys())
+
+    def can_sign(self, address):
+        return to_checksum_address(address) in self.accounts
+
+    async def sign_transaction(self, transaction):
+        """Signs a fully built transaction (nonce, gas, fees and chainId set) and returns the raw bytes to broadcast."""
+        account = self.accounts[to_checksum_address(transaction['from'])]
+        unsigned = {key: value for key, value in transaction.items() if key != 'from'}
+        signed = await asyncio.get_running_loop().run_in_executor(self.executor, account.sign_transaction, unsigned)
+        return signed.raw_transaction
@@ -1,41 +1,308 @@
-from web3 import Web3
-from web3.exceptions import ContractLogicError, Web3RPCError
+from web3 import AsyncWeb3
+from web3.exceptions import ContractLogicError, Web3RPCError, TransactionNotFound
+from web3.logs import DISCARD
 import json
+import asyncio
+import hashlib
 import os
+import time
 from datetime import datetime
 from decimal import Decimal
+from collections import OrderedDict
+from services.nonce_manager import NonceManager
+from services.signer import LocalSigner
+from services.rpc_pool import RPCPool
+from services.fee_oracle import FeeOracle
+from services.metrics import track_rpc
+import logging
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_PATH = "build/contracts/ReceiptManager.json"
+SLIM_ARTIFACT_PATH = "build/contracts/ReceiptManager.slim.json"
+CONTRACT_SOURCE_PATH = "contracts/ReceiptManager.sol"
+# Contract functions and events the services call or decode; an artifact without them predates the batch endpoints
+REQUIRED_ABI_NAMES = ('issueReceipt', 'issueReceiptsBatch', 'requestReturn', 'releaseFunds', 'releaseFundsBatch', 'getReceipt', 'ReceiptIssued', 'RefundIssued', 'FundsReleased', 'FundsReleaseSkipped')
+
+def batch_receipt_hash(transaction_hash, position):
+    """
+    Receipts are keyed by transaction hash, so when one transaction issues several receipts (issueReceiptsBatch)
+    each gets the transaction hash suffixed with its position among the transaction's ReceiptIssued events.
+    """
+    return f"{transaction_hash}-{position}"
+
+def source_digest(source):
+    """sha256 of a Solidity source, ignoring line endings so a checkout with CRLF endings still matches."""
+    return hashlib.sha256(source.replace('\r\n', '\n').encode('utf-8')).hexdigest()
+
+def revert_reason(error):
+    """The require() message of a ContractLogicError, e.g. 'Return window has closed'."""
+    return str(error.message or '').split('execution reverted: ', 1)[-1]
+
+def receipt_eligibility(receipt_state, return_window, chain_time, action):
+    """
+    Applies the checks requestReturn ('return') or releaseFunds ('release') make, in the same order, to a receipt
+    state from get_receipt_state. Returns (eligible, reason) where reason is the revert message the transaction would get.
+    """
+    deadline = receipt_state['purchase_time'] + return_window
+    if action == 'return':
+        if chain_time > deadline:
+            return False, "Return window has closed"
+        if receipt_state['refund_issued']:
+            return False, "Refund already issued"
+    else:
+        if receipt_state['refund_issued']:
+            return False, "Refund already issued"
+        if chain_time < deadline:
+            return False, "Return window still open"
+        if receipt_state['funds_released']:
+            return False, "Funds already released"
+    return True, None
 
 class ReceiptsContractInterface:
-    def __init__(self,ganache_url):
-        self.web3 = Web3(Web3.HTTPProvider(ganache_url))
-        assert self.web3.is_connected()
-        with open("build/contracts/ReceiptManager.json") as f:
-            self.contract_json = json.load(f)
-            self.contract_abi = self.contract_json["abi"]
-            self.contract_bytecode = self.contract_json["bytecode"]
-    def issue_receipt(self,contract_address, seller_address, buyer_address, amount_eth):
+    def __init__(self,rpc_urls):
+        # rpc_urls is one URL or several (a list or comma-separated) serving the same chain; see services/rpc_pool.py
+        self.rpc_pool = RPCPool.from_env(rpc_urls)
+        self.web3 = AsyncWeb3(self.rpc_pool)
+        # send_transaction fills every fee field from the fee oracle; this middleware would still fetch the latest block
+        # before each eth_sendTransaction just to validate them
+        self.web3.middleware_onion.remove('gas_price_strategy')
+        self.artifact = None
+        # Contract objects are rebuilt from the ABI on every web3.eth.contract call, so keep the recent ones per address
+        self.contract_cache = OrderedDict()
+        self.contract_cache_size = int(os.getenv('CONTRACT_CACHE_SIZE', '256'))
+        self.event_decoders = {}
+        self._abi_contract = None
+        self._deployer = None
+        self.nonce_manager = NonceManager(self.web3)
+        self.rpc_pool.on_failover = self.on_rpc_failover
+        # The node's account list only changes when the chain is restarted
+        self.accounts_cache = None
+        # Balances are cached for balance_cache_ttl seconds per block identifier, and dropped whenever we send a transaction.
+        # Balances read at 'latest' (or another tag) are also dropped once a receipt from a newer block is seen
+        self.balance_cache_ttl = float(os.getenv('BALANCE_CACHE_TTL_SECONDS', '2'))
+        self.balance_cache = {}
+        # Pre-flight checks before requestReturn/releaseFunds: 'view' (cached getReceipt state), 'simulate' (eth_call) or 'off'.
+        # Unless 'off', transactions sent with a learned gas limit are also run as an eth_call first
+        self.preflight_mode = os.getenv('PREFLIGHT_MODE', 'view')
+        # A contract's return window is fixed at deployment
+        self.return_windows = {}
+        # getReceipt results per (contract, buyer, index). The refund/release flags only ever go from false to true,
+        # so a cached true is always right and a stale false just lets the transaction find out, as before
+        self.receipt_states = OrderedDict()
+        self.receipt_state_cache_size = int(os.getenv('RECEIPT_STATE_CACHE_SIZE', '10000'))
+        # Accounts with a key in the local signer send raw transactions; any other sender is signed by the node
+        self.signer = LocalSigner.from_env()
+        self.chain_id = None
+        # Gas limits learned per contract function and fees refreshed once per block, instead of asking the node per transaction
+        self.fee_oracle = FeeOracle(
+            self.web3,
+            margin=float(os.getenv('GAS_LIMIT_MARGIN', '0.25')),
+            window=int(os.getenv('GAS_SAMPLE_WINDOW', '20')),
+            refresh_seconds=float(os.getenv('FEE_REFRESH_SECONDS', '12')),
+            reward_percentile=float(os.getenv('FEE_REWARD_PERCENTILE', '50'))
+        )
+    def load_artifact(self):
+        """
+        Loads the contract ABI and bytecode. The full Truffle artifact is large (AST, source maps, ...) and we only
+        need two keys from it, so they are extracted once into a slim artifact next to it and read from there, along
+        with a digest of the source it was compiled from (see check_artifact).
+        The slim file is regenerated whenever the full artifact is newer, e.g. after truffle compile.
+        """
+        if self.artifact is None:
+            if os.path.exists(SLIM_ARTIFACT_PATH) and os.path.getmtime(SLIM_ARTIFACT_PATH) >= os.path.getmtime(ARTIFACT_PATH):
+                with open(SLIM_ARTIFACT_PATH) as f:
+                    self.artifact = json.load(f)
+            if self.artifact is None or 'source_sha256' not in self.artifact:
+                with open(ARTIFACT_PATH) as f:
+                    contract_json = json.load(f)
+                self.artifact = {"abi": contract_json["abi"], "bytecode": contract_json["bytecode"], "source_sha256": source_digest(contract_json.get("source", ""))}
+                try:
+                    with open(SLIM_ARTIFACT_PATH, 'w') as f:
+                        json.dump(self.artifact, f)
+                except OSError as e:
+                    logger.warning("Could not write slim contract artifact: %s", e)
+        return self.artifact
+    def check_artifact(self):
+        """
+        Raises RuntimeError if the compiled artifact doesn't match contracts/ReceiptManager.sol or lacks a function
+        or event the services use, instead of failing later with a missing ABI entry or a call into old bytecode.
+        """
+        artifact = self.load_artifact()
+        missing = [name for name in REQUIRED_ABI_NAMES if name not in {entry.get('name') for entry in artifact['abi']}]
+        stale_source = False
+        if os.path.exists(CONTRACT_SOURCE_PATH):
+            with open(CONTRACT_SOURCE_PATH) as f:
+                stale_source = source_digest(f.read()) != artifact['source_sha256']
+        if missing or stale_source:
+            reason = f"its ABI has no {', '.join(missing)}" if missing else f"{CONTRACT_SOURCE_PATH} changed since it was compiled"
+            raise RuntimeError(f"{ARTIFACT_PATH} is out of date ({reason}). Run `truffle compile` to rebuild it.")
+    @property
+    def contract_abi(self):
+        return self.load_artifact()["abi"]
+    @property
+    def contract_bytecode(self):
+        return self.load_artifact()["bytecode"]
+    @property
+    def abi_contract(self):
+        """A contract object without an address, used to decode logs and call data from any seller contract."""
+        if self._abi_contract is None:
+            self._abi_contract = self.web3.eth.contract(abi=self.contract_abi)
+        return self._abi_contract
+    def get_contract(self, contract_address):
+        """Returns the contract object for contract_address from a bounded LRU cache."""
+        contract = self.contract_cache.get(contract_address)
+        if contract is not None:
+            self.contract_cache.move_to_end(contract_address)
+            return contract
+        contract = self.web3.eth.contract(address=contract_address, abi=self.contract_abi)
+        self.contract_cache[contract_address] = contract
+        if len(self.contract_cache) > self.contract_cache_size:
+            self.contract_cache.popitem(last=False)
+        return contract
+    def get_event_decoder(self, event_name):
+        """Returns a reusable event object whose process_log/process_receipt decode that event from any seller contract."""
+        if event_name not in self.event_decoders:
+            self.event_decoders[event_name] = getattr(self.abi_contract.events, event_name)()
+        return self.event_decoders[event_name]
+    async def connect(self):
+        """
+        Probes the RPC endpoints and starts their background health checks. Called once from the app's startup hook
+        since __init__ can't await. Starting without a reachable node is allowed; calls fail until one comes up.
+        A stale contract artifact is not: it raises, so the app fails at startup.
+        """
+        self.check_artifact()
+        if not await self.web3.is_connected():
+            logger.error("No RPC endpoint is reachable (%s)", self.rpc_pool)
+        self.rpc_pool.start()
+        if self.signer is not None:
+            await self.signer.load()
+    async def disconnect(self):
+        await self.rpc_pool.stop()
+    def on_rpc_failover(self):
+        """The new write endpoint has its own view of pending nonces and its own unlocked accounts."""
+        self.nonce_manager.reset()
+        self.accounts_cache = None
+    def reset_chain_state(self):
+        """Forgets everything cached about the chain, e.g. after Ganache is restarted."""
+        self.nonce_manager.reset()
+        self.rpc_pool.reset()
+        self.accounts_cache = None
+        self.balance_cache.clear()
+        self.return_windows.clear()
+        self.receipt_states.clear()
+        self.chain_id = None
+        self.fee_oracle.reset()
+    async def get_chain_id(self):
+        if self.chain_id is None:
+            self.chain_id = await self.web3.eth.chain_id
+        return self.chain_id
+    async def sign_locally(self, contract_function, tx_params):
+        """Builds and signs the transaction in process. tx_params has every field filled in, so building it makes no RPC call."""
+        transaction = await contract_function.build_transaction(tx_params)
+        return await self.signer.sign_transaction(transaction)
+    async def send_transaction(self, contract_function, tx_params):
+        """
+        Sends a contract function or constructor call with a nonce from the local nonce manager,
+        so several transactions from the same account can be pipelined without waiting on each other.
+        Senders the local signer holds a key for are signed here and broadcast with send_raw_transaction.
+        Gas, fees and chain id come from the fee oracle and caches, so web3 has nothing left to look up.
+        """
+        sender = tx_params['from']
+        lookups = [self.fee_oracle.fee_params(), self.get_chain_id()]
+        if 'gas' not in tx_params:
+            # Deployments have no call to run (and ReceiptManager's constructor has no require() to fail)
+            if self.preflight_mode != 'off' and self.fee_oracle.is_learned(contract_function) and hasattr(contract_function, 'call'):
+                # A learned gas limit skips eth_estimateGas, which is what rejected a call that would revert; one eth_call
+                # does the same for less, so the revert still comes back before a nonce is reserved or any gas is spent
+                lookups.append(self.preflight_call(contract_function, tx_params))
+            else:
+                # When the function's gas isn't learned yet, estimating before reserving a nonce means a call that would revert fails without using one
+                tx_params['gas'] = await self.fee_oracle.gas_limit(contract_function, tx_params)
+        fees, chain_id, *_ = await asyncio.gather(*lookups)
+        if 'gas' not in tx_params:
+            tx_params['gas'] = await self.fee_oracle.gas_limit(contract_function, tx_params)
+        tx_params = {**tx_params, **fees, 'chainId': chain_id}
+        nonce = await self.nonce_manager.next_nonce(sender)
+        try:
+            if self.signer is not None and self.signer.can_sign(sender):
+                with track_rpc('sign'):
+                    raw_transaction = await self.sign_locally(contract_function, {**tx_params, 'nonce': nonce})
+                with track_rpc('submit'):
+                    tx_hash = await self.web3.eth.send_raw_transaction(raw_transaction)
+            else:
+                with track_rpc('submit'):
+                    tx_hash = await contract_function.transact({**tx_params, 'nonce': nonce})
+            self.fee_oracle.expect(tx_hash, contract_function, tx_params['gas'])
+            # Any transaction we send can move balances, so don't serve cached ones after it
+            self.balance_cache.clear()
+            return tx_hash
+        except Exception as e:
+            if 'nonce' in str(e).lower():
+                await self.nonce_manager.resync(sender)
+            else:
+                self.nonce_manager.release_nonce(sender, nonce)
+            raise
+    async def preflight_call(self, contract_function, tx_params):
+        """Runs the transaction as an eth_call on the latest state. Raises ContractLogicError with the reason if it would revert."""
+        with track_rpc('preflight'):
+            await contract_function.call({key: value for key, value in tx_params.items() if key in ('from', 'value')})
+    async def wait_for_receipt(self, tx_hash):
+        with track_rpc('wait_for_receipt'):
+            tx_receipt = await self.web3.eth.wait_for_transaction_receipt(tx_hash)
+        self.fee_oracle.observe_receipt(tx_receipt)
+        self.note_block(tx_receipt['blockNumber'])
+        return tx_receipt
+    async def wait_for_outcome(self, tx_hash):
+        """
+        Waits for the receipt and raises ContractLogicError, with the revert reason, if the transaction reverted.
+        Transactions sent with a learned gas limit aren't estimated first, so a revert that the preflight call
+        didn't catch (PREFLIGHT_MODE=off, or the state changed before the transaction was mined) shows up as a
+        mined transaction with status 0 instead of an error; replaying it as a call on the state before its block
+        recovers the reason. If the replay goes through (e.g. the transaction ran out of gas, or an earlier
+        transaction in the same block changed the outcome) it still raises, without a reason.
+        """
+        tx_receipt = await self.wait_for_receipt(tx_hash)
+        if tx_receipt['status'] == 0:
+            with track_rpc('get_transaction'):
+                transaction = await self.web3.eth.get_transaction(tx_hash)
+            replay = {'from': transaction['from'], 'to': transaction['to'], 'data': transaction['input'], 'value': transaction['value'], 'gas': transaction['gas']}
+            with track_rpc('call'):
+                await self.web3.eth.call(replay, tx_receipt['blockNumber'] - 1)
+            raise ContractLogicError(f"Transaction {tx_receipt['transactionHash'].hex()} reverted (gas used {tx_receipt['gasUsed']} of {transaction['gas']})")
+        return tx_receipt
+    async def issue_receipt(self,contract_address, seller_address, buyer_address, amount_eth):
         """Issues a receipt for the given buyer address and amount (in Ether) using a specific contract."""
+        tx_hash = await self.submit_issue_receipt(contract_address, buyer_address, amount_eth)
+        
+        # Wait for the transaction receipt to confirm
+        tx_receipt = await self.wait_for_outcome(tx_hash)
+
+        return await self.build_receipt_details(contract_address, seller_address, buyer_address, amount_eth, tx_receipt)
+    async def submit_issue_receipt(self,contract_address, buyer_address, amount_eth):
+        """Sends the issueReceipt transaction without waiting for it to be mined. Returns the transaction hash."""
         # Convert amount to Wei, since Ether is the base unit in web3.py
         amount_wei = self.web3.to_wei(amount_eth, 'ether')
         
         # Create a contract instance for the specific seller's contract address
-        seller_contract = self.web3.eth.contract(address=contract_address, abi=self.contract_abi)
+        seller_contract = self.get_contract(contract_address)
         
         # Send the transaction to the contract's issueReceipt function
-        tx_hash = seller_contract.functions.issueReceipt(buyer_address).transact({
+        tx_hash = await self.send_transaction(seller_contract.functions.issueReceipt(buyer_address), {
             'from': buyer_address,  # Pass in the seller's address from the API
             'value': amount_wei  # The amount to hold in escrow
         })
-        
-        # Wait for the transaction receipt to confirm
-        tx_receipt = self.web3.eth.wait_for_transaction_receipt(tx_hash)
-
+        return tx_hash
+    async def build_receipt_details(self,contract_address, seller_address, buyer_address, amount_eth, tx_receipt):
+        """Turns a mined issueReceipt transaction receipt into the receipt object stored and returned to the frontend."""
         # Retrieve the actual timestamp from the block containing this transaction
-        block = self.web3.eth.get_block(tx_receipt['blockNumber'])
+        with track_rpc('get_block'):
+            block = await self.web3.eth.get_block(tx_receipt['blockNumber'])
         purchase_time = datetime.utcfromtimestamp(block['timestamp']).strftime('%Y-%m-%d %H:%M:%S')
         
         # Retrieve the ReceiptIssued event data from the transaction receipt
-        receipt_event = seller_contract.events.ReceiptIssued().process_log(tx_receipt.logs[0])
+        with track_rpc('process_log'):
+            receipt_event = self.get_event_decoder('ReceiptIssued').process_log(tx_receipt.logs[0])
         
         # Extract the receiptIndex from the event
         receipt_index = receipt_event['args']['receiptIndex']
@@ -53,17 +320,87 @@ class ReceiptsContractInterface:
             "receipt_index": receipt_index
         }
         return receipt_details
-    def request_return(self,contract_address, buyer_address, receiptIndex):
+    async def issue_receipts_batch(self, contract_address, seller_address, payer_address, buyer_addresses, amounts_eth):
+        """
+        Issues several receipts in one issueReceiptsBatch transaction paid by payer_address.
+        Returns one receipt object per entry, in input order, or a failure with the revert reason.
+        """
+        amounts_wei = [self.web3.to_wei(amount_eth, 'ether') for amount_eth in amounts_eth]
+        contract = self.get_contract(contract_address)
+        try:
+            tx_hash = await self.send_transaction(contract.functions.issueReceiptsBatch(buyer_addresses, amounts_wei), {
+                'from': payer_address,
+                'value': sum(amounts_wei)
+            })
+            tx_receipt = await self.wait_for_outcome(tx_hash)
+        except ContractLogicError as e:
+            error_message = revert_reason(e)
+            logger.info("Contract call reverted: %s", error_message)
+            return {
+                "status": "Failed",
+                "reason": str(error_message),
+                "receipts": []
+            }
+
+        with track_rpc('get_block'):
+            block = await self.web3.eth.get_block(tx_receipt['blockNumber'])
+        purchase_time = datetime.utcfromtimestamp(block['timestamp']).strftime('%Y-%m-%d %H:%M:%S')
+        # The contract emits one ReceiptIssued per entry, so log order matches input order
+        with track_rpc('process_log'):
+            receipt_events = sorted(self.get_event_decoder('ReceiptIssued').process_receipt(tx_receipt, errors=DISCARD), key=lambda event: event['logIndex'])
+        transaction_hash = tx_receipt['transactionHash'].hex()
+        receipts = []
+        for position, (buyer_address, amount_eth, event) in enumerate(zip(buyer_addresses, amounts_eth, receipt_events)):
+            receipt_details = {
+                "buyer_address": buyer_address,
+                "seller_address": seller_address,
+                "seller_contract_address": contract_address,
+                "amount": amount_eth,
+                "purchase_time": purchase_time,
+                "transaction_hash": transaction_hash,
+                "block_number": tx_receipt['blockNumber'],
+                "status": "Success" if tx_receipt['status'] == 1 else "Failed",
+                "receipt_index": event['args']['receiptIndex']
+            }
+            if len(receipt_events) > 1:
+                receipt_details["transaction_hash"] = batch_receipt_hash(transaction_hash, position)
+                receipt_details["batch_transaction_hash"] = transaction_hash
+            receipts.append(receipt_details)
+        return {
+            "transaction_hash": transaction_hash,
+            "status": "Success" if tx_receipt['status'] == 1 else "Failed",
+            "receipts": receipts
+        }
+    async def get_transaction_receipts(self, tx_hashes):
+        """
+        Looks up receipts for many transactions at once without waiting on any of them.
+        Returns a dictionary of tx hash to receipt, with None for transactions that are not mined yet.
+        """
+        async def get_receipt(tx_hash):
+            try:
+                with track_rpc('get_transaction_receipt'):
+                    return await self.web3.eth.get_transaction_receipt(tx_hash)
+            except TransactionNotFound:
+                return None
+        tx_receipts = await asyncio.gather(*[get_receipt(tx_hash) for tx_hash in tx_hashes])
+        for tx_receipt in tx_receipts:
+            if tx_receipt is not None:
+                self.fee_oracle.observe_receipt(tx_receipt)
+                self.note_block(tx_receipt['blockNumber'])
+        return dict(zip(tx_hashes, tx_receipts))
+    async def request_return(self,contract_address, buyer_address, receiptIndex):
         """Request a return for a specific receipt and capture revert reasons if it fails."""
         # Create a contract instance for the specific seller's contract address
-        contract = self.web3.eth.contract(address=contract_address, abi=self.contract_abi)
+        contract = self.get_contract(contract_address)
         try:
-            tx_hash = contract.functions.requestReturn(receiptIndex).transact({
+            tx_hash = await self.send_transaction(contract.functions.requestReturn(receiptIndex), {
                 'from': buyer_address
             })
             
             # Wait for the transaction receipt
-            tx_receipt = self.web3.eth.wait_for_transaction_receipt(tx_hash)
+            tx_receipt = await self.wait_for_outcome(tx_hash)
+            if tx_receipt['status'] == 1:
+                self.mark_receipt_state(contract_address, buyer_address, receiptIndex, refund_issued=True)
             
             # Return transaction details if successful
             return {
@@ -74,24 +411,25 @@ class ReceiptsContractInterface:
             
         except ContractLogicError as e:
         # Decode any unexpected errors during the actual transact call
-            # print("ERRRRRRRROR:",e)
-            error_message = e.args[1].get('reason', '')
-            print('Error Message:', error_message)
+            error_message = revert_reason(e)
+            logger.info("Contract call reverted: %s", error_message)
             # error_message = decode_revert_message(error_data)
             return {
                 "status": "Failed",
                 "reason": str(error_message)
             }
-    def release_funds(self,contract_address, buyer_address, receipt_index, seller_address):
+    async def release_funds(self,contract_address, buyer_address, receipt_index, seller_address):
         """Releases funds to the seller after the return window has expired."""
-        contract = self.web3.eth.contract(address=contract_address, abi=self.contract_abi)
+        contract = self.get_contract(contract_address)
         try:
-            tx_hash = contract.functions.releaseFunds(buyer_address, receipt_index).transact({
+            tx_hash = await self.send_transaction(contract.functions.releaseFunds(buyer_address, receipt_index), {
                 'from': seller_address
             })
         
             # Wait for the transaction receipt
-            tx_receipt = self.web3.eth.wait_for_transaction_receipt(tx_hash)
+            tx_receipt = await self.wait_for_outcome(tx_hash)
+            if tx_receipt['status'] == 1:
+                self.mark_receipt_state(contract_address, buyer_address, receipt_index, funds_released=True)
             
             return {
                 "transaction_hash": tx_receipt['transactionHash'].hex(),
@@ -100,32 +438,179 @@ class ReceiptsContractInterface:
             }
         except ContractLogicError as e:
             # Decode any unexpected errors during the actual transact call
-            error_message = e.args[1].get('reason', '')
-            print('Error Message:', error_message)
+            error_message = revert_reason(e)
+            logger.info("Contract call reverted: %s", error_message)
             # error_message = decode_revert_message(error_data)
             return {
                 "status": "Failed",
                 "reason": str(error_message)
             }
 
-    def deploy_new_contract(self,seller_account,return_window_days):
+    async def release_funds_batch(self,contract_address, buyer_addresses, receipt_indices, seller_address):
+        """
+        Releases funds for many receipts of one seller contract in a single releaseFundsBatch transaction.
+        Receipts that aren't eligible are skipped by the contract, so the result lists one entry per input, in order.
+        """
+        contract = self.get_contract(contract_address)
+        try:
+            tx_hash = await self.send_transaction(contract.functions.releaseFundsBatch(buyer_addresses, receipt_indices), {
+                'from': seller_address
+            })
+            tx_receipt = await self.wait_for_outcome(tx_hash)
+        except ContractLogicError as e:
+            error_message = revert_reason(e)
+            logger.info("Contract call reverted: %s", error_message)
+            return {
+                "status": "Failed",
+                "reason": str(error_message),
+                "results": []
+            }
+
+        # The contract emits exactly one FundsReleased or FundsReleaseSkipped per entry, so log order matches input order
+        with track_rpc('process_log'):
+            released_events = self.get_event_decoder('FundsReleased').process_receipt(tx_receipt, errors=DISCARD)
+            skipped_events = self.get_event_decoder('FundsReleaseSkipped').process_receipt(tx_receipt, errors=DISCARD)
+        item_events = sorted(released_events + skipped_events, key=lambda event: event['logIndex'])
+        results = []
+        for buyer_address, receipt_index, event in zip(buyer_addresses, receipt_indices, item_events):
+            if event['event'] == 'FundsReleased':
+                self.mark_receipt_state(contract_address, buyer_address, receipt_index, funds_released=True)
+                results.append({"buyer_address": buyer_address, "receipt_index": receipt_index, "status": "Success", "amount": self.web3.from_wei(event['args']['amount'], 'ether')})
+            else:
+                results.append({"buyer_address": buyer_address, "receipt_index": receipt_index, "status": "Failed", "reason": event['args']['reason']})
+        return {
+            "transaction_hash": tx_receipt['transactionHash'].hex(),
+            "status": "Success" if tx_receipt['status'] == 1 else "Failed",
+            "results": results
+        }
+
+    async def get_return_window(self, contract_address):
+        """The contract's return window in seconds."""
+        if contract_address not in self.return_windows:
+            with track_rpc('call'):
+                self.return_windows[contract_address] = await self.get_contract(contract_address).functions.returnWindow().call()
+        return self.return_windows[contract_address]
+
+    async def get_receipt_state(self, contract_address, buyer_address, receipt_index):
+        """The on-chain state of a receipt from getReceipt, served from a bounded cache. Raises ContractLogicError for an invalid index."""
+        key = (contract_address, buyer_address, receipt_index)
+        receipt_state = self.receipt_states.get(key)
+        if receipt_state is not None:
+            self.receipt_states.move_to_end(key)
+            return receipt_state
+        with track_rpc('call'):
+            purchase_amount, purchase_time, refund_issued, funds_released = await self.get_contract(contract_address).functions.getReceipt(buyer_address, receipt_index).call()
+        receipt_state = {'purchase_amount': purchase_amount, 'purchase_time': purchase_time, 'refund_issued': refund_issued, 'funds_released': funds_released}
+        self.receipt_states[key] = receipt_state
+        if len(self.receipt_states) > self.receipt_state_cache_size:
+            self.receipt_states.popitem(last=False)
+        return receipt_state
+
+    def mark_receipt_state(self, contract_address, buyer_address, receipt_index, **flags):
+        """Records a refund or release we just made in the cached receipt state, if it is cached."""
+        receipt_state = self.receipt_states.get((contract_address, buyer_address, receipt_index))
+        if receipt_state is not None:
+            receipt_state.update(flags)
+
+    async def get_eligibility(self, contract_address, buyer_address, receipt_index, seller_address=None, actions=('return', 'release')):
+        """
+        Tells whether requestReturn ('return') and releaseFunds ('release') would go through for a receipt, without
+        sending anything. Returns {action: {'eligible': bool, 'reason': revert message or None}}.
+        In 'view' mode the contract's checks are evaluated against the cached receipt state and the latest block's
+        timestamp (for releases, the wall clock if later, since the transaction lands in a later block).
+        In 'simulate' mode each call is run with eth_call from the account that would send it.
+        """
+        if self.preflight_mode == 'off':
+            return {action: {'eligible': True, 'reason': None} for action in actions}
+        if self.preflight_mode == 'simulate':
+            contract = self.get_contract(contract_address)
+            calls = {
+                'return': (contract.functions.requestReturn(receipt_index), buyer_address),
+                'release': (contract.functions.releaseFunds(buyer_address, receipt_index), seller_address)
+            }
+            async def simulate(action):
+                contract_function, sender = calls[action]
+                try:
+                    with track_rpc('simulate'):
+                        await contract_function.call({'from': sender})
+                    return {'eligible': True, 'reason': None}
+                except ContractLogicError as e:
+                    return {'eligible': False, 'reason': revert_reason(e)}
+            return dict(zip(actions, await asyncio.gather(*[simulate(action) for action in actions])))
+        try:
+            receipt_state, return_window, chain_time = await asyncio.gather(
+                self.get_receipt_state(contract_address, buyer_address, receipt_index),
+                self.get_return_window(contract_address),
+                self.get_chain_time()
+            )
+        except ContractLogicError as e:
+            return {action: {'eligible': False, 'reason': revert_reason(e)} for action in actions}
+        eligibility = {}
+        for action in actions:
+            action_time = max(chain_time, int(time.time())) if action == 'release' else chain_time
+            eligible, reason = receipt_eligibility(receipt_state, return_window, action_time, action)
+            eligibility[action] = {'eligible': eligible, 'reason': reason}
+        return eligibility
+
+    async def deploy_new_contract(self,seller_account,return_window_days):
         """Deploy a new instance of the ReceiptManager contract and return the address."""
-        ReceiptManager = self.web3.eth.contract(abi=self.contract_abi, bytecode=self.contract_bytecode)
-        tx_hash = ReceiptManager.constructor(return_window_days).transact({'from': seller_account})
-        tx_receipt = self.web3.eth.wait_for_transaction_receipt(tx_hash)
+        if self._deployer is None:
+            self._deployer = self.web3.eth.contract(abi=self.contract_abi, bytecode=self.contract_bytecode)
+        ReceiptManager = self._deployer
+        tx_hash = await self.send_transaction(ReceiptManager.constructor(return_window_days), {'from': seller_account})
+        tx_receipt = await self.wait_for_outcome(tx_hash)
         return tx_receipt.contractAddress
 
-    def get_all_accounts_on_ganache(self):
-        accounts = self.web3.eth.accounts
-        return accounts
-        
-    def get_balance_of_account(self, account):
-        balance_wei = self.web3.eth.get_balance(account)
+    async def get_all_accounts_on_ganache(self):
+        if self.accounts_cache is None:
+            with track_rpc('get_accounts'):
+                node_accounts = list(await self.web3.eth.accounts)
+            # Locally held accounts can send even if the node doesn't know them
+            local_accounts = [address for address in self.signer.addresses if address not in node_accounts] if self.signer is not None else []
+            self.accounts_cache = node_accounts + local_accounts
+        return self.accounts_cache
+
+    async def get_chain_time(self):
+        """Timestamp of the latest block, the clock the contract checks return windows against."""
+        with track_rpc('get_block'):
+            block = await self.web3.eth.get_block('latest')
+        return block['timestamp']
+
+    async def get_balance_of_account(self, account):
+        with track_rpc('get_balance'):
+            balance_wei = await self.web3.eth.get_balance(account)
         balance_eth = self.web3.from_wei(balance_wei, 'ether')
         return balance_eth
     
-    def get_balance_of_contract(self, contract_address):
-        balance_wei = self.web3.eth.get_balance(contract_address)
+    def note_block(self, block_number):
+        """Drops balances read at a block tag such as 'latest' before block_number, since they may have changed since."""
+        for block_identifier, cached in list(self.balance_cache.items()):
+            if not isinstance(block_identifier, int) and cached['block_number'] < block_number:
+                self.balance_cache.pop(block_identifier, None)
+    async def get_balances_of_accounts(self, accounts, block_identifier='latest'):
+        """
+        Returns the Ether balance of every account, in order, using one JSON-RPC batch request.
+        Results are cached per block identifier for a short TTL, and until a newer block is seen (see note_block).
+        """
+        cached = self.balance_cache.get(block_identifier)
+        if cached is not None and cached['expires_at'] > time.monotonic() and all(account in cached['balances'] for account in accounts):
+            return [cached['balances'][account] for account in accounts]
+
+        with track_rpc('get_balances_batch'):
+            async with self.web3.batch_requests() as batch:
+                # Asked first, so the balances are from this block or a later one and note_block never keeps them too long
+                batch.add(self.web3.eth.get_block_number())
+                for account in accounts:
+                    batch.add(self.web3.eth.get_balance(account, block_identifier))
+                block_number, *balances_wei = await batch.async_execute()
+
+        balances = {account: self.web3.from_wei(balance_wei, 'ether') for account, balance_wei in zip(accounts, balances_wei)}
+        self.balance_cache[block_identifier] = {'expires_at': time.monotonic() + self.balance_cache_ttl, 'block_number': block_number, 'balances': balances}
+        return [balances[account] for account in accounts]
+    
+    async def get_balance_of_contract(self, contract_address):
+        with track_rpc('get_balance'):
+            balance_wei = await self.web3.eth.get_balance(contract_address)
         balance_eth = self.web3.from_wei(balance_wei, 'ether')
         return balance_eth
 
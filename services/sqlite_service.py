@@ -0,0 +1,462 @@
+import json
+import sqlite3
+import threading
+import logging
+from contextlib import contextmanager
+from datetime import datetime
+from decimal import Decimal
+from services.storage import SellerStore, ReceiptStore, AccountStore, AccountAddressStore, encode_next_token, decode_next_token
+
+logger = logging.getLogger(__name__)
+
+# Each record is kept whole as a JSON document; the columns next to it are copies of the attributes that are
+# looked up, filtered or ordered on, so they can be indexed
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sellers (
+    seller_address TEXT PRIMARY KEY,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS receipts (
+    transaction_hash TEXT PRIMARY KEY,
+    buyer_address TEXT,
+    seller_address TEXT,
+    seller_contract_address TEXT,
+    receipt_index INTEGER,
+    purchase_time TEXT,
+    amount REAL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS receipts_buyer_purchase_time ON receipts (buyer_address, purchase_time, transaction_hash);
+CREATE INDEX IF NOT EXISTS receipts_seller_purchase_time ON receipts (seller_address, purchase_time, transaction_hash);
+CREATE INDEX IF NOT EXISTS receipts_contract_buyer_index ON receipts (seller_contract_address, buyer_address, receipt_index);
+CREATE TABLE IF NOT EXISTS accounts (
+    user_id TEXT PRIMARY KEY,
+    account_address TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS accounts_account_address ON accounts (account_address);
+CREATE TABLE IF NOT EXISTS account_addresses (
+    account_address TEXT PRIMARY KEY,
+    user_id TEXT
+);
+"""
+
+RECEIPT_COLUMNS = ('buyer_address', 'seller_address', 'seller_contract_address', 'receipt_index', 'purchase_time', 'amount')
+
+# Fields returned by get_receipt_details, as (returned name, stored attribute)
+RECEIPT_DETAIL_FIELDS = (
+    ('contract_address', 'seller_contract_address'),
+    ('buyer_address', 'buyer_address'),
+    ('seller_address', 'seller_address'),
+    ('receipt_index', 'receipt_index')
+)
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dump_item(item):
+    return json.dumps(item, default=_json_default)
+
+def load_item(data):
+    """Numbers come back as Decimal, the way boto3 returns them from DynamoDB."""
+    return json.loads(data, parse_float=Decimal, parse_int=Decimal)
+
+def column_value(value):
+    if isinstance(value, Decimal):
+        return _json_default(value)
+    return value
+
+class SQLiteDatabase:
+    """
+    One SQLite database file shared by the stores below. Each thread gets its own connection
+    (the services call the stores through asyncio.to_thread); WAL mode lets readers run alongside a writer.
+    """
+    def __init__(self, path='receipts.db', timeout=30.0):
+        self.path = path
+        self.timeout = timeout
+        self.local = threading.local()
+        self.connection().executescript(SCHEMA)
+
+    def connection(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            # Autocommit mode; writes that must be atomic go through transaction()
+            connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self.local.connection = connection
+        return connection
+
+    @contextmanager
+    def transaction(self):
+        connection = self.connection()
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield connection
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+
+    def execute(self, sql, parameters=()):
+        return self.connection().execute(sql, parameters)
+
+    def clear(self, table, progress=None):
+        """Deletes every row of table. progress, when given, is called once with the number of deleted rows."""
+        with self.transaction() as connection:
+            deleted = connection.execute(f"DELETE FROM {table}").rowcount
+        if progress is not None:
+            progress(deleted)
+        return deleted
+
+class SellersSQLite(SellerStore):
+    def __init__(self, database):
+        self.database = database
+
+    def insert_seller(self, seller_data):
+        """Inserts a new seller record, leaving an existing one untouched."""
+        try:
+            cursor = self.database.execute(
+                "INSERT OR IGNORE INTO sellers (seller_address, data) VALUES (?, ?)",
+                (seller_data['seller_address'], dump_item(seller_data))
+            )
+            if cursor.rowcount == 0:
+                logger.info("Seller already exists.")
+        except sqlite3.Error as e:
+            logger.error("Error inserting seller: %s", e)
+
+    def seller_exists(self, seller_address):
+        return self.get_seller(seller_address) is not None
+
+    def get_seller(self, seller_address):
+        try:
+            row = self.database.execute("SELECT data FROM sellers WHERE seller_address = ?", (seller_address,)).fetchone()
+            return load_item(row[0]) if row else None
+        except sqlite3.Error as e:
+            logger.error("Error retrieving seller: %s", e)
+            return None
+
+    def get_all_sellers(self):
+        try:
+            sellers = []
+            for (data,) in self.database.execute("SELECT data FROM sellers"):
+                seller = load_item(data)
+                sellers.append({key: seller[key] for key in ('seller_address', 'seller_contract_address', 'return_window_days') if key in seller})
+            return sellers
+        except sqlite3.Error as e:
+            logger.error("Error retrieving sellers: %s", e)
+            return []
+
+    def clear_table(self, progress=None):
+        try:
+            deleted = self.database.clear('sellers', progress)
+            logger.info("Sellers table cleared successfully (%d items).", deleted)
+        except sqlite3.Error as e:
+            logger.error("Error clearing Sellers table: %s", e)
+
+class ReceiptsSQLite(ReceiptStore):
+    def __init__(self, database):
+        self.database = database
+
+    def _write(self, connection, receipt):
+        connection.execute(
+            "INSERT OR REPLACE INTO receipts (transaction_hash, buyer_address, seller_address, seller_contract_address, "
+            "receipt_index, purchase_time, amount, data) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (receipt['transaction_hash'], *(column_value(receipt.get(column)) for column in RECEIPT_COLUMNS), dump_item(receipt))
+        )
+
+    def insert_receipt(self, receipt_details):
+        try:
+            with self.database.transaction() as connection:
+                self._write(connection, receipt_details)
+        except sqlite3.Error as e:
+            logger.error("Error saving receipt: %s", e)
+
+    def insert_receipts_batch(self, receipts):
+        """Inserts many receipts in one transaction. Returns True if all of them were written."""
+        try:
+            with self.database.transaction() as connection:
+                for receipt_details in receipts:
+                    self._write(connection, receipt_details)
+            return True
+        except sqlite3.Error as e:
+            logger.error("Error saving receipts: %s", e)
+            return False
+
+    def search_by_transaction_id(self, transaction_id):
+        try:
+            row = self.database.execute("SELECT data FROM receipts WHERE transaction_hash = ?", (transaction_id,)).fetchone()
+            return load_item(row[0]) if row else None
+        except sqlite3.Error as e:
+            logger.error("Failed to retrieve receipt: %s", e)
+            return None
+
+    def search_by_buyer_address(self, buyer_address, filter_by=None, sort_by=None, ascending=True, limit=None, next_token=None):
+        return self._search_by_attribute('buyer_address', buyer_address, filter_by, sort_by, ascending, limit, next_token)
+
+    def search_by_seller_address(self, seller_address, filter_by=None, sort_by=None, ascending=True, limit=None, next_token=None):
+        return self._search_by_attribute('seller_address', seller_address, filter_by, sort_by, ascending, limit, next_token)
+
+    def _page_query(self, attribute, value, ascending, after, limit, filter_by=None):
+        """
+        Builds a keyset-paginated query over (purchase_time, transaction_hash), the order of the DynamoDB index.
+        Like that index, receipts without a purchase_time (still pending) are left out.
+        """
+        conditions = [f"{attribute} = ?", "purchase_time IS NOT NULL"]
+        parameters = [value]
+        if filter_by:
+            if 'purchase_time' in filter_by:
+                conditions.append("purchase_time = ?")
+                parameters.append(filter_by['purchase_time'])
+            if 'amount' in filter_by:
+                conditions.append("amount = ?")
+                parameters.append(float(filter_by['amount']))
+        if after:
+            conditions.append(f"(purchase_time, transaction_hash) {'>' if ascending else '<'} (?, ?)")
+            parameters.extend([after['purchase_time'], after['transaction_hash']])
+        direction = 'ASC' if ascending else 'DESC'
+        sql = f"SELECT data FROM receipts WHERE {' AND '.join(conditions)} ORDER BY purchase_time {direction}, transaction_hash {direction}"
+        if limit:
+            sql += " LIMIT ?"
+            parameters.append(limit)
+        return sql, parameters
+
+    def _search_by_attribute(self, attribute, value, filter_by=None, sort_by=None, ascending=True, limit=None, next_token=None):
+        """
+        Same contract as ReceiptDyanmoDB._search_by_attribute: results ordered by purchase_time, at most limit
+        of them with a next_token to resume from. Returns (items, next_token), or (None, None) on failure.
+        """
+        try:
+            sql, parameters = self._page_query(attribute, value, ascending, decode_next_token(next_token), limit, filter_by)
+            items = [load_item(data) for (data,) in self.database.execute(sql, parameters)]
+            last_key = None
+            if limit and len(items) == limit:
+                last_key = {'purchase_time': items[-1]['purchase_time'], 'transaction_hash': items[-1]['transaction_hash']}
+            if sort_by == 'amount':
+                items.sort(key=lambda x: x['amount'], reverse=not ascending)
+            return items, encode_next_token(last_key)
+        except sqlite3.Error as e:
+            logger.error("Failed to search receipts: %s", e)
+            return None, None
+
+    def iter_receipt_pages(self, attribute=None, value=None, ascending=True, page_size=500, projection=None):
+        """
+        Yields receipts page_size at a time (1000 if page_size is None). With attribute the receipts of that buyer or
+        seller are read in purchase_time order, otherwise the whole table in transaction_hash order.
+        """
+        page_size = page_size or 1000
+        after = None
+        while True:
+            if attribute is not None:
+                sql, parameters = self._page_query(attribute, value, ascending, after, page_size)
+            else:
+                sql = "SELECT data FROM receipts"
+                parameters = []
+                if after:
+                    sql += " WHERE transaction_hash > ?"
+                    parameters.append(after['transaction_hash'])
+                sql += " ORDER BY transaction_hash LIMIT ?"
+                parameters.append(page_size)
+            items = [load_item(data) for (data,) in self.database.execute(sql, parameters)]
+            if items:
+                after = {'purchase_time': items[-1].get('purchase_time'), 'transaction_hash': items[-1]['transaction_hash']}
+            if projection:
+                items = [{key: item[key] for key in projection if key in item} for item in items]
+            yield items
+            if len(items) < page_size:
+                break
+
+    def get_receipt_details(self, transaction_hash):
+        item = self.search_by_transaction_id(transaction_hash)
+        if not item:
+            logger.info("No receipt found for transaction hash %s.", transaction_hash)
+            return None
+        receipt_details = {name: item.get(attribute) for name, attribute in RECEIPT_DETAIL_FIELDS}
+        receipt_details['receipt_index'] = int(receipt_details['receipt_index'])
+        return receipt_details
+
+    def get_receipts_details_batch(self, transaction_hashes):
+        try:
+            receipts_details = {}
+            unique_hashes = list(dict.fromkeys(transaction_hashes))
+            # Stay well below SQLite's limit on bound parameters
+            for start in range(0, len(unique_hashes), 500):
+                chunk = unique_hashes[start:start+500]
+                rows = self.database.execute(
+                    f"SELECT transaction_hash, seller_contract_address, buyer_address, seller_address, receipt_index "
+                    f"FROM receipts WHERE transaction_hash IN ({', '.join('?' * len(chunk))})",
+                    chunk
+                )
+                for transaction_hash, contract_address, buyer_address, seller_address, receipt_index in rows:
+                    receipts_details[transaction_hash] = {
+                        'contract_address': contract_address,
+                        'buyer_address': buyer_address,
+                        'seller_address': seller_address,
+                        'receipt_index': int(receipt_index)
+                    }
+            return receipts_details
+        except sqlite3.Error as e:
+            logger.error("Error retrieving receipt details in batch: %s", e)
+            return None
+
+    def change_receipt_status(self, transaction_hash, status, time_key):
+        self.change_receipts_status_batch([transaction_hash], status, time_key)
+
+    def change_receipts_status_batch(self, transaction_hashes, status, time_key):
+        change_time = Decimal(datetime.timestamp(datetime.now()))
+        return self.upsert_receipts({transaction_hash: {'status': status, time_key: change_time} for transaction_hash in transaction_hashes})
+
+    def upsert_receipts(self, receipts_fields, keep_existing=()):
+        """
+        Creates or updates many receipts in one transaction without overwriting attributes that aren't given.
+        Attributes listed in keep_existing are only written if the receipt doesn't have them yet.
+        """
+        try:
+            with self.database.transaction() as connection:
+                for transaction_hash, fields in receipts_fields.items():
+                    row = connection.execute("SELECT data FROM receipts WHERE transaction_hash = ?", (transaction_hash,)).fetchone()
+                    receipt = load_item(row[0]) if row else {'transaction_hash': transaction_hash}
+                    for name, value in fields.items():
+                        if name not in keep_existing or name not in receipt:
+                            receipt[name] = value
+                    self._write(connection, receipt)
+            return True
+        except sqlite3.Error as e:
+            logger.error("Error upserting receipts: %s", e)
+            return False
+
+    def find_receipt_hash(self, contract_address, buyer_address, receipt_index):
+        try:
+            row = self.database.execute(
+                "SELECT transaction_hash FROM receipts WHERE seller_contract_address = ? AND buyer_address = ? AND receipt_index = ?",
+                (contract_address, buyer_address, int(receipt_index))
+            ).fetchone()
+            return row[0] if row else None
+        except sqlite3.Error as e:
+            logger.error("Error finding receipt: %s", e)
+            return None
+
+    def get_all_transactions(self, max_number_of_pages=None):
+        try:
+            transactions = []
+            for page, items in enumerate(self.iter_receipt_pages(page_size=None)):
+                transactions.extend(items)
+                if max_number_of_pages is not None and page + 1 >= max_number_of_pages:
+                    break
+            return transactions
+        except sqlite3.Error as e:
+            logger.error("Error retrieving transactions: %s", e)
+            return None
+
+    def get_unique_buyers(self):
+        try:
+            return [buyer_address for (buyer_address,) in self.database.execute(
+                "SELECT buyer_address FROM receipts WHERE buyer_address IS NOT NULL GROUP BY buyer_address ORDER BY MIN(rowid)"
+            )]
+        except sqlite3.Error as e:
+            logger.error("Error retrieving unique buyers: %s", e)
+            return []
+
+    def clear_table(self, progress=None):
+        try:
+            deleted = self.database.clear('receipts', progress)
+            logger.info("Receipts table cleared successfully (%d items).", deleted)
+        except sqlite3.Error as e:
+            logger.error("Error clearing Receipts table: %s", e)
+
+class AccountsSQLite(AccountStore):
+    def __init__(self, database):
+        self.database = database
+
+    def insert_account(self, accounts_data):
+        try:
+            cursor = self.database.execute(
+                "INSERT OR IGNORE INTO accounts (user_id, account_address, data) VALUES (?, ?, ?)",
+                (accounts_data['user_id'], accounts_data.get('account_address'), dump_item(accounts_data))
+            )
+            if cursor.rowcount == 0:
+                logger.info("Account already exists.")
+                return False, "Account already exists."
+            return True, "Account address inserted successfully"
+        except sqlite3.Error as e:
+            return False, f"Error creating account: {e}"
+
+    def account_exists(self, user_id):
+        try:
+            row = self.database.execute("SELECT data FROM accounts WHERE user_id = ?", (user_id,)).fetchone()
+            return [load_item(row[0])] if row else []
+        except sqlite3.Error as e:
+            logger.error("Error checking account existence: %s", e)
+            return {}
+
+    def update_password(self, user_id, password_hash):
+        try:
+            with self.database.transaction() as connection:
+                row = connection.execute("SELECT data FROM accounts WHERE user_id = ?", (user_id,)).fetchone()
+                if row:
+                    account = load_item(row[0])
+                    account['password'] = password_hash
+                    connection.execute("UPDATE accounts SET data = ? WHERE user_id = ?", (dump_item(account), user_id))
+        except sqlite3.Error as e:
+            logger.error("Error updating password: %s", e)
+
+    def address_used(self, address):
+        try:
+            return [load_item(data) for (data,) in self.database.execute("SELECT data FROM accounts WHERE account_address = ?", (address,))]
+        except sqlite3.Error as e:
+            logger.error("Failed to search accounts: %s", e)
+            return []
+
+    def get_all_accounts(self):
+        try:
+            return [
+                {'user_id': user_id, 'account_address': account_address}
+                for user_id, account_address in self.database.execute("SELECT user_id, account_address FROM accounts")
+            ]
+        except sqlite3.Error as e:
+            logger.error("Error retrieving accounts: %s", e)
+            return []
+
+    def clear_table(self, progress=None):
+        try:
+            self.database.clear('accounts', progress)
+            return "Accounts table cleared successfully."
+        except sqlite3.Error as e:
+            return f"Error clearing Accounts table: {e}"
+
+class AccountAddressesSQLite(AccountAddressStore):
+    def __init__(self, database):
+        self.database = database
+
+    def claim_address(self, account_address, user_id):
+        try:
+            cursor = self.database.execute(
+                "INSERT OR IGNORE INTO account_addresses (account_address, user_id) VALUES (?, ?)",
+                (account_address, user_id)
+            )
+            return cursor.rowcount == 1
+        except sqlite3.Error as e:
+            logger.error("Error claiming account address: %s", e)
+            raise
+
+    def release_address(self, account_address):
+        try:
+            self.database.execute("DELETE FROM account_addresses WHERE account_address = ?", (account_address,))
+        except sqlite3.Error as e:
+            logger.error("Error releasing account address: %s", e)
+
+    def get_claimed_addresses(self):
+        try:
+            return {account_address for (account_address,) in self.database.execute("SELECT account_address FROM account_addresses")}
+        except sqlite3.Error as e:
+            logger.error("Error retrieving claimed addresses: %s", e)
+            return None
+
+    def clear_table(self, progress=None):
+        try:
+            deleted = self.database.clear('account_addresses', progress)
+            logger.info("AccountAddresses table cleared successfully (%d items).", deleted)
+        except sqlite3.Error as e:
+            logger.error("Error clearing AccountAddresses table: %s", e)
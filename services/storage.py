@@ -0,0 +1,167 @@
+import base64
+import json
+import os
+from abc import ABC, abstractmethod
+
+def encode_next_token(last_evaluated_key):
+    """Turns a backend's resume key (e.g. a DynamoDB LastEvaluatedKey) into an opaque cursor for API clients."""
+    if not last_evaluated_key:
+        return None
+    return base64.urlsafe_b64encode(json.dumps(last_evaluated_key).encode("utf-8")).decode("utf-8")
+
+class InvalidNextToken(ValueError):
+    """Raised by decode_next_token for a cursor that encode_next_token didn't produce."""
+
+def decode_next_token(next_token):
+    """
+    Turns a cursor produced by encode_next_token back into the backend's resume key.
+    Raises InvalidNextToken if it isn't base64-encoded JSON of a key.
+    """
+    if not next_token:
+        return None
+    try:
+        start_key = json.loads(base64.urlsafe_b64decode(next_token.encode("utf-8")))
+    except ValueError as e:
+        # binascii.Error, UnicodeDecodeError and JSONDecodeError are all ValueErrors
+        raise InvalidNextToken("invalid next_token") from e
+    if not isinstance(start_key, dict):
+        raise InvalidNextToken("invalid next_token")
+    return start_key
+
+class SellerStore(ABC):
+    """Sellers keyed by seller_address, each with its seller_contract_address and return_window_days."""
+    @abstractmethod
+    def insert_seller(self, seller_data): ...
+
+    @abstractmethod
+    def seller_exists(self, seller_address): ...
+
+    @abstractmethod
+    def get_seller(self, seller_address):
+        """Returns the seller record, or None if there isn't one."""
+
+    @abstractmethod
+    def get_all_sellers(self): ...
+
+    @abstractmethod
+    def clear_table(self, progress=None): ...
+
+class ReceiptStore(ABC):
+    """
+    Receipts keyed by transaction_hash, searchable by buyer_address and seller_address in purchase_time order.
+    Numbers come back as Decimal, as DynamoDB returns them.
+    """
+    @abstractmethod
+    def insert_receipt(self, receipt_details): ...
+
+    @abstractmethod
+    def insert_receipts_batch(self, receipts):
+        """Returns True if every receipt was written."""
+
+    @abstractmethod
+    def search_by_transaction_id(self, transaction_id): ...
+
+    @abstractmethod
+    def search_by_buyer_address(self, buyer_address, filter_by=None, sort_by=None, ascending=True, limit=None, next_token=None):
+        """Returns (items, next_token), or (None, None) on failure."""
+
+    @abstractmethod
+    def search_by_seller_address(self, seller_address, filter_by=None, sort_by=None, ascending=True, limit=None, next_token=None):
+        """Returns (items, next_token), or (None, None) on failure."""
+
+    @abstractmethod
+    def iter_receipt_pages(self, attribute=None, value=None, ascending=True, page_size=500, projection=None):
+        """Yields lists of receipts, one page at a time."""
+
+    @abstractmethod
+    def get_receipt_details(self, transaction_hash):
+        """Returns contract_address, buyer_address, seller_address and receipt_index, or None."""
+
+    @abstractmethod
+    def get_receipts_details_batch(self, transaction_hashes):
+        """Returns a dictionary of transaction_hash to receipt details, or None on failure."""
+
+    @abstractmethod
+    def change_receipt_status(self, transaction_hash, status, time_key): ...
+
+    @abstractmethod
+    def change_receipts_status_batch(self, transaction_hashes, status, time_key):
+        """Returns True if every update was applied."""
+
+    @abstractmethod
+    def upsert_receipts(self, receipts_fields, keep_existing=()):
+        """Sets the given fields on each receipt, creating it if needed. Returns True if every update was applied."""
+
+    @abstractmethod
+    def find_receipt_hash(self, contract_address, buyer_address, receipt_index): ...
+
+    @abstractmethod
+    def get_all_transactions(self, max_number_of_pages=None): ...
+
+    @abstractmethod
+    def get_unique_buyers(self): ...
+
+    @abstractmethod
+    def clear_table(self, progress=None): ...
+
+class AccountStore(ABC):
+    """User accounts keyed by user_id, each holding its network account_address."""
+    @abstractmethod
+    def insert_account(self, accounts_data):
+        """Returns (success, message)."""
+
+    @abstractmethod
+    def account_exists(self, user_id):
+        """Returns [item] if the account exists, [] otherwise."""
+
+    @abstractmethod
+    def update_password(self, user_id, password_hash): ...
+
+    @abstractmethod
+    def address_used(self, address): ...
+
+    @abstractmethod
+    def get_all_accounts(self): ...
+
+    @abstractmethod
+    def clear_table(self, progress=None):
+        """Returns a message for the API response."""
+
+class AccountAddressStore(ABC):
+    """Network addresses that have been handed to a user; claiming one must be atomic."""
+    @abstractmethod
+    def claim_address(self, account_address, user_id):
+        """Returns False if the address is already claimed. Any other failure is raised, since the address may still be free."""
+
+    @abstractmethod
+    def release_address(self, account_address): ...
+
+    @abstractmethod
+    def get_claimed_addresses(self):
+        """Returns a set of addresses, or None on failure."""
+
+    @abstractmethod
+    def clear_table(self, progress=None): ...
+
+class Stores:
+    """The four stores of one backend, as handed to DataService and the indexer."""
+    def __init__(self, sellers, receipts, accounts, account_addresses):
+        self.sellers = sellers
+        self.receipts = receipts
+        self.accounts = accounts
+        self.account_addresses = account_addresses
+
+def create_stores(backend=None):
+    """
+    Builds the stores for STORAGE_BACKEND: 'dynamodb' (default) or 'sqlite', an embedded database at
+    SQLITE_PATH that needs no AWS credentials or network. Backends are imported on demand.
+    """
+    backend = backend or os.getenv('STORAGE_BACKEND', 'dynamodb')
+    if backend == 'dynamodb':
+        from services.dynamoDB_service import SellersDyanmoDB, ReceiptDyanmoDB, AccountsDynamoDB, AccountAddressesDynamoDB
+        return Stores(SellersDyanmoDB(), ReceiptDyanmoDB(), AccountsDynamoDB(), AccountAddressesDynamoDB())
+    if backend == 'sqlite':
+        from services.sqlite_service import SQLiteDatabase, SellersSQLite, ReceiptsSQLite, AccountsSQLite, AccountAddressesSQLite
+        database = SQLiteDatabase(os.getenv('SQLITE_PATH', 'receipts.db'))
+        return Stores(SellersSQLite(database), ReceiptsSQLite(database), AccountsSQLite(database), AccountAddressesSQLite(database))
+    raise ValueError(f"Unknown STORAGE_BACKEND {backend!r}, expected 'dynamodb' or 'sqlite'")
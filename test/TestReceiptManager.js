@@ -216,6 +216,73 @@ contract('ReceiptManager', (accounts) => {
 
     });
 
+    it('should issue several receipts in one batch transaction', async () => {
+        const amount = web3.utils.toWei('0.1', 'ether');
+        const otherAmount = web3.utils.toWei('0.2', 'ether');
+        const otherBuyer = accounts[2];
+        const total = new BN(amount).add(new BN(otherAmount)).add(new BN(amount));
+
+        const result = await receiptManager.issueReceiptsBatch(
+            [buyer, otherBuyer, buyer],
+            [amount, otherAmount, amount],
+            { from: buyer, value: total }
+        );
+
+        assert.equal(result.logs.length, 3, 'Expected one ReceiptIssued per entry');
+        expectEvent(result, 'ReceiptIssued', { buyer: otherBuyer, purchaseAmount: otherAmount, receiptIndex: '0' });
+        assert.equal(result.logs[0].args.receiptIndex.toNumber(), 0, 'First receipt index is incorrect');
+        assert.equal(result.logs[2].args.receiptIndex.toNumber(), 1, 'Second receipt for the same buyer should get the next index');
+
+        const receipt = await receiptManager.getReceipt(otherBuyer, 0);
+        assert.equal(receipt[0].toString(), otherAmount, 'Purchase amount is incorrect');
+
+        try {
+            await receiptManager.issueReceiptsBatch([buyer], [amount], { from: buyer, value: otherAmount });
+            assert.fail('Batch should revert when the sent value does not match the amounts');
+        } catch (error) {
+            assert(
+                error.message.includes('Sent value does not match amounts'),
+                'Expected error for mismatched value'
+            );
+        }
+    });
+
+    it('should release eligible receipts in a batch and skip the rest', async () => {
+        const amount = web3.utils.toWei('0.1', 'ether');
+        const otherBuyer = accounts[2];
+
+        const first = await receiptManager.issueReceipt(buyer, { from: seller, value: amount });
+        const second = await receiptManager.issueReceipt(otherBuyer, { from: seller, value: amount });
+        const refunded = await receiptManager.issueReceipt(buyer, { from: seller, value: amount });
+        const firstIndex = first.logs[0].args.receiptIndex.toNumber();
+        const secondIndex = second.logs[0].args.receiptIndex.toNumber();
+        const refundedIndex = refunded.logs[0].args.receiptIndex.toNumber();
 
+        await receiptManager.requestReturn(refundedIndex, { from: buyer });
+        await time.increase(time.duration.days(31));
+
+        const sellerInitialBalance = await web3.eth.getBalance(seller);
+
+        const tx = await receiptManager.releaseFundsBatch(
+            [buyer, otherBuyer, buyer],
+            [firstIndex, secondIndex, refundedIndex],
+            { from: seller }
+        );
+
+        expectEvent(tx, 'FundsReleased', { seller: seller, amount: amount, receiptIndex: firstIndex.toString() });
+        expectEvent(tx, 'FundsReleaseSkipped', { buyer: buyer, reason: 'Refund already issued' });
+
+        const firstAfterRelease = await receiptManager.getReceipt(buyer, firstIndex);
+        const secondAfterRelease = await receiptManager.getReceipt(otherBuyer, secondIndex);
+        assert.equal(firstAfterRelease[3], true, 'First receipt should be released');
+        assert.equal(secondAfterRelease[3], true, 'Second receipt should be released');
+
+        const sellerBalanceAfterRelease = await web3.eth.getBalance(seller);
+        const balanceDifference = new BN(sellerBalanceAfterRelease).sub(new BN(sellerInitialBalance));
+        assert(
+            balanceDifference > amount * 1.8,
+            'Seller should have funds for both released receipts'
+        );
+    });
     
 });
@@ -0,0 +1,44 @@
+import asyncio
+import pytest
+from services.account_pool import AccountPool
+
+class FakeContractInterface:
+    async def get_all_accounts_on_ganache(self):
+        return ['0xA', '0xB']
+
+class FakeAccountsStore:
+    def get_all_accounts(self):
+        return []
+
+class FlakyAddressClaims:
+    """The first claim fails with a storage error; later ones succeed unless the address is taken."""
+    def __init__(self):
+        self.claims = {}
+        self.failures_left = 1
+
+    def get_claimed_addresses(self):
+        return set(self.claims)
+
+    def claim_address(self, account_address, user_id):
+        if self.failures_left:
+            self.failures_left -= 1
+            raise ConnectionError('throttled')
+        if account_address in self.claims:
+            return False
+        self.claims[account_address] = user_id
+        return True
+
+    def release_address(self, account_address):
+        self.claims.pop(account_address, None)
+
+def test_address_is_kept_when_claim_raises():
+    claims = FlakyAddressClaims()
+    pool = AccountPool(FakeContractInterface(), claims, FakeAccountsStore())
+
+    async def scenario():
+        with pytest.raises(ConnectionError):
+            await pool.claim('alice')
+        return await pool.claim('alice'), await pool.claim('bob'), await pool.claim('carol')
+
+    assert asyncio.run(scenario()) == ('0xA', '0xB', None)
+    assert claims.claims == {'0xA': 'alice', '0xB': 'bob'}
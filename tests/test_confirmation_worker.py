@@ -0,0 +1,78 @@
+import asyncio
+import time
+from services.confirmation_worker import ReceiptConfirmationWorker
+
+class FakeReceiptStore:
+    def __init__(self, items):
+        self.items = items
+        self.status_changes = []
+        self.inserted = []
+
+    def iter_receipt_pages(self, attribute=None, value=None, ascending=True, page_size=500, projection=None):
+        yield [{key: item[key] for key in projection if key in item} for item in self.items]
+
+    def change_receipt_status(self, transaction_hash, status, time_key):
+        self.status_changes.append((transaction_hash, status))
+
+    def insert_receipt(self, receipt_details):
+        self.inserted.append(receipt_details)
+
+class FakeContractInterface:
+    def __init__(self, mined):
+        self.mined = mined
+
+    async def get_transaction_receipts(self, tx_hashes):
+        return {tx_hash: self.mined.get(tx_hash) for tx_hash in tx_hashes}
+
+    async def build_receipt_details(self, contract_address, seller_address, buyer_address, amount, tx_receipt):
+        return {'transaction_hash': tx_receipt['transactionHash'], 'amount': amount, 'receipt_index': 0}
+
+def pending_item(transaction_hash, status='Pending'):
+    return {'transaction_hash': transaction_hash, 'buyer_address': 'buyer', 'seller_address': 'seller', 'seller_contract_address': 'contract', 'amount': 1, 'item_name': 'item', 'status': status}
+
+def test_pending_receipts_are_recovered_and_unmined_ones_expire():
+    store = FakeReceiptStore([pending_item('mined'), pending_item('dropped'), pending_item('done', status='Active')])
+    contract_interface = FakeContractInterface({'mined': {'status': 1, 'transactionHash': 'mined'}})
+    worker = ReceiptConfirmationWorker(contract_interface, store, poll_interval=0.01, pending_timeout_seconds=60)
+
+    async def scenario():
+        worker.start()
+        while 'dropped' not in worker.jobs:
+            await asyncio.sleep(0.01)
+        await worker.wait_for_job('mined', 1)
+        assert worker.get_job('dropped')['status'] == 'Pending'
+        worker.jobs['dropped']['submitted_at'] = time.time() - 61
+        await worker.wait_for_job('dropped', 1)
+        await worker.stop()
+
+    asyncio.run(scenario())
+    assert set(worker.jobs) == {'mined', 'dropped'}
+    assert worker.get_job('mined')['status'] == 'Confirmed'
+    assert [receipt['transaction_hash'] for receipt in store.inserted] == ['mined']
+    assert worker.get_job('dropped')['status'] == 'Failed'
+    assert 'not mined within 60 seconds' in worker.get_job('dropped')['error']
+    assert store.status_changes == [('dropped', 'Failed')]
+
+def test_every_pending_job_is_polled_each_tick():
+    class RecordingContractInterface(FakeContractInterface):
+        def __init__(self, mined):
+            super().__init__(mined)
+            self.requests = []
+
+        async def get_transaction_receipts(self, tx_hashes):
+            self.requests.append(list(tx_hashes))
+            return await super().get_transaction_receipts(tx_hashes)
+
+    # Only the last job is mined; the ones ahead of it stay pending
+    contract_interface = RecordingContractInterface({'tx4': {'status': 1, 'transactionHash': 'tx4'}})
+    worker = ReceiptConfirmationWorker(contract_interface, FakeReceiptStore([]), batch_size=2)
+
+    async def scenario():
+        for index in range(5):
+            worker.add_job(f'tx{index}', pending_item(f'tx{index}'))
+        await worker.poll_once()
+
+    asyncio.run(scenario())
+    assert contract_interface.requests == [['tx0', 'tx1'], ['tx2', 'tx3'], ['tx4']]
+    assert worker.get_job('tx4')['status'] == 'Confirmed'
+    assert [worker.get_job(f'tx{index}')['status'] for index in range(4)] == ['Pending'] * 4
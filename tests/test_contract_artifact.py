@@ -0,0 +1,38 @@
+import json
+import pytest
+import services.smart_contract_interactions as smart_contract_interactions
+from services.smart_contract_interactions import ReceiptsContractInterface, REQUIRED_ABI_NAMES
+
+SOURCE = "contract ReceiptManager {}\n"
+
+@pytest.fixture
+def artifact_paths(tmp_path, monkeypatch):
+    paths = {name: str(tmp_path / file_name) for name, file_name in [('ARTIFACT_PATH', 'ReceiptManager.json'), ('SLIM_ARTIFACT_PATH', 'ReceiptManager.slim.json'), ('CONTRACT_SOURCE_PATH', 'ReceiptManager.sol')]}
+    for name, path in paths.items():
+        monkeypatch.setattr(smart_contract_interactions, name, path)
+    return paths
+
+def write_artifact(paths, abi_names, source):
+    with open(paths['ARTIFACT_PATH'], 'w') as f:
+        json.dump({'abi': [{'name': name} for name in abi_names], 'bytecode': '0x00', 'source': source}, f)
+
+def check(paths, contract_source):
+    with open(paths['CONTRACT_SOURCE_PATH'], 'w', newline='') as f:
+        f.write(contract_source)
+    interface = object.__new__(ReceiptsContractInterface)
+    interface.artifact = None
+    interface.check_artifact()
+
+def test_current_artifact_passes(artifact_paths):
+    write_artifact(artifact_paths, REQUIRED_ABI_NAMES, SOURCE)
+    check(artifact_paths, SOURCE.replace("\n", "\r\n"))
+
+def test_artifact_from_older_source_fails(artifact_paths):
+    write_artifact(artifact_paths, REQUIRED_ABI_NAMES, SOURCE)
+    with pytest.raises(RuntimeError, match="changed since it was compiled"):
+        check(artifact_paths, "contract ReceiptManager { uint x; }\n")
+
+def test_artifact_without_batch_functions_fails(artifact_paths):
+    write_artifact(artifact_paths, ['issueReceipt', 'requestReturn', 'releaseFunds', 'getReceipt'], SOURCE)
+    with pytest.raises(RuntimeError, match="releaseFundsBatch.*truffle compile"):
+        check(artifact_paths, SOURCE)
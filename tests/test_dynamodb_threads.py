@@ -0,0 +1,21 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from services.dynamoDB_service import ReceiptDyanmoDB
+
+def test_each_thread_gets_its_own_resource_and_table():
+    store = ReceiptDyanmoDB('Receipts')
+    # Every lookup waits for the others, so each runs on a different worker thread
+    barrier = threading.Barrier(3)
+
+    def lookup(_):
+        barrier.wait()
+        # The same thread keeps getting the same objects
+        assert store.table is store.table and store.dynamodb is store.dynamodb
+        return store.dynamodb, store.table
+
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        results = list(executor.map(lookup, range(3)))
+
+    assert len({id(resource) for resource, _ in results}) == 3
+    assert len({id(table) for _, table in results}) == 3
+    assert all(table.name == 'Receipts' for _, table in results)
@@ -0,0 +1,75 @@
+import asyncio
+import json
+from hexbytes import HexBytes
+from web3.exceptions import BlockNotFound
+from services.event_indexer import ReceiptEventIndexer, clear_checkpoint
+
+class FakeEth:
+    """A chain of `height + 1` blocks whose hashes are derived from `name`, so two chains differ at every height."""
+    def __init__(self, name, height):
+        self.name = name
+        self.height = height
+
+    @property
+    async def block_number(self):
+        return self.height
+
+    async def get_block(self, block_number):
+        if block_number > self.height:
+            raise BlockNotFound(f"Block {block_number} not found")
+        return {'number': block_number, 'hash': HexBytes(f'{self.name}-{block_number}'.encode())}
+
+class FakeWeb3:
+    def __init__(self, name, height):
+        self.eth = FakeEth(name, height)
+
+def make_indexer(checkpoint_path, chain):
+    indexer = object.__new__(ReceiptEventIndexer)
+    indexer.web3 = chain
+    indexer.checkpoint_path = str(checkpoint_path)
+    indexer.confirmations = 0
+    indexer.max_block_range = 1000
+    indexer.block_timestamps = {}
+    indexer.sellers_by_contract = None
+    indexer.last_indexed_block, indexer.last_indexed_hash = -1, None
+    indexer.indexed_ranges = []
+
+    async def index_range(from_block, to_block):
+        indexer.indexed_ranges.append((from_block, to_block))
+    indexer.index_range = index_range
+    return indexer
+
+def test_replaced_chain_past_the_checkpoint_is_indexed_from_genesis(tmp_path):
+    checkpoint_path = tmp_path / 'checkpoint.json'
+    old_indexer = make_indexer(checkpoint_path, FakeWeb3('old', 5))
+    asyncio.run(old_indexer.poll_once())
+    assert old_indexer.indexed_ranges == [(0, 5)]
+
+    # The chain is restarted while the indexer is down and grows past the old checkpoint
+    indexer = make_indexer(checkpoint_path, FakeWeb3('new', 8))
+    indexer.last_indexed_block, indexer.last_indexed_hash = indexer.load_checkpoint()
+    assert indexer.last_indexed_block == 5
+    asyncio.run(indexer.poll_once())
+
+    assert indexer.indexed_ranges == [(0, 8)]
+    assert json.loads(checkpoint_path.read_text()) == {'last_indexed_block': 8, 'block_hash': HexBytes(b'new-8').hex()}
+
+def test_same_chain_resumes_after_the_checkpoint(tmp_path):
+    checkpoint_path = tmp_path / 'checkpoint.json'
+    asyncio.run(make_indexer(checkpoint_path, FakeWeb3('chain', 5)).poll_once())
+
+    indexer = make_indexer(checkpoint_path, FakeWeb3('chain', 8))
+    indexer.last_indexed_block, indexer.last_indexed_hash = indexer.load_checkpoint()
+    asyncio.run(indexer.poll_once())
+
+    assert indexer.indexed_ranges == [(6, 8)]
+
+def test_clear_checkpoint_starts_from_genesis(tmp_path):
+    checkpoint_path = tmp_path / 'checkpoint.json'
+    indexer = make_indexer(checkpoint_path, FakeWeb3('chain', 5))
+    indexer.save_checkpoint(5, 'hash')
+
+    clear_checkpoint(str(checkpoint_path))
+    clear_checkpoint(str(checkpoint_path))
+
+    assert indexer.load_checkpoint() == (-1, None)
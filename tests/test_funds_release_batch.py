@@ -0,0 +1,79 @@
+import asyncio
+from services.dataservice import DataService
+
+class FakeReceiptCache:
+    def __init__(self, receipts_details):
+        self.receipts_details = receipts_details
+        self.invalidated = []
+
+    def get_many(self, transaction_hashes):
+        return {transaction_hash: self.receipts_details[transaction_hash] for transaction_hash in transaction_hashes if transaction_hash in self.receipts_details}
+
+    def invalidate_status(self, transaction_hash):
+        self.invalidated.append(transaction_hash)
+
+class FakeSellerRegistry:
+    def get(self, seller_address):
+        return {'seller_address': seller_address, 'seller_contract_address': f'contract-{seller_address}'}
+
+class FakeReceiptStore:
+    def __init__(self):
+        self.status_updates = []
+
+    def change_receipts_status_batch(self, transaction_hashes, status, time_key):
+        self.status_updates.append((list(transaction_hashes), status))
+        return True
+
+class FakeContractInterface:
+    """Releases everything on contract-a, skipping entries it already released; the RPC call for contract-b blows up."""
+    def __init__(self):
+        self.released = set()
+
+    async def release_funds_batch(self, contract_address, buyer_addresses, receipt_indices, seller_address):
+        if contract_address == 'contract-b':
+            raise ConnectionError('RPC endpoint went away')
+        results = []
+        for entry in zip(buyer_addresses, receipt_indices):
+            if entry in self.released:
+                results.append({'status': 'Failed', 'reason': 'Funds already released'})
+            else:
+                self.released.add(entry)
+                results.append({'status': 'Success'})
+        return {'status': 'Success', 'transaction_hash': f'release-{contract_address}', 'results': results}
+
+def receipt(seller_address, receipt_index):
+    return {'contract_address': f'contract-{seller_address}', 'buyer_address': 'buyer', 'seller_address': seller_address, 'receipt_index': receipt_index}
+
+def make_data_service(receipts_details):
+    ds = object.__new__(DataService)
+    ds.receipt_cache = FakeReceiptCache(receipts_details)
+    ds.seller_registry = FakeSellerRegistry()
+    ds.receipt_Dynamo_DB = FakeReceiptStore()
+    ds.receipt_smart_contract_interface = FakeContractInterface()
+    ds.indexer_enabled = False
+    return ds
+
+def test_failing_batch_does_not_lose_released_batch():
+    ds = make_data_service({'tx1': receipt('a', 0), 'tx2': receipt('a', 1), 'tx3': receipt('b', 0)})
+
+    response, success, error_message = asyncio.run(ds.funds_release_batch(['tx1', 'tx2', 'tx3']))
+
+    assert success and error_message is None
+    assert response['released'] == 2
+    results = {result['transaction_hash']: result for result in response['results']}
+    assert results['tx1']['status'] == 'Success' and results['tx1']['release_transaction_hash'] == 'release-contract-a'
+    assert results['tx2']['status'] == 'Success'
+    assert results['tx3'] == {'status': 'Failed', 'reason': 'RPC endpoint went away', 'transaction_hash': 'tx3'}
+    assert ds.receipt_Dynamo_DB.status_updates == [(['tx1', 'tx2'], 'Funds Released to Seller')]
+    assert ds.receipt_cache.invalidated == ['tx1', 'tx2']
+
+def test_duplicate_hashes_are_released_once():
+    ds = make_data_service({'tx1': receipt('a', 0), 'tx2': receipt('a', 1)})
+
+    response, success, error_message = asyncio.run(ds.funds_release_batch(['tx1', 'tx2', 'tx1']))
+
+    assert success and error_message is None
+    assert response['released'] == 2
+    assert [(result['transaction_hash'], result['status']) for result in response['results']] == [('tx1', 'Success'), ('tx2', 'Success')]
+    assert ds.receipt_Dynamo_DB.status_updates == [(['tx1', 'tx2'], 'Funds Released to Seller')]
+    assert ds.receipt_cache.invalidated == ['tx1', 'tx2']
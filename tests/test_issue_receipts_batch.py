@@ -0,0 +1,80 @@
+import asyncio
+from services.dataservice import DataService
+
+class FakeSellerRegistry:
+    def get(self, seller_address):
+        return {'seller_address': seller_address, 'seller_contract_address': f'contract-{seller_address}'}
+
+class FakeReceiptCache:
+    def put(self, receipt_details):
+        pass
+
+class FakeReceiptStore:
+    def __init__(self):
+        self.saved = []
+
+    def insert_receipts_batch(self, receipts):
+        self.saved.extend(receipts)
+        return True
+
+class FakeContractInterface:
+    """Records each issueReceiptsBatch transaction and emits a ReceiptIssued for the first emitted entries."""
+    def __init__(self, emitted=None):
+        self.transactions = []
+        self.emitted = emitted
+
+    async def issue_receipts_batch(self, contract_address, seller_address, payer_address, buyer_addresses, amounts_eth):
+        self.transactions.append((payer_address, list(buyer_addresses)))
+        transaction_hash = f'tx{len(self.transactions)}'
+        return {
+            'transaction_hash': transaction_hash,
+            'status': 'Success',
+            'receipts': [
+                {'transaction_hash': f'{transaction_hash}-{position}', 'buyer_address': buyer_address, 'amount': amount_eth}
+                for position, (buyer_address, amount_eth) in enumerate(zip(buyer_addresses, amounts_eth))
+            ][:self.emitted]
+        }
+
+def make_data_service(contract_interface):
+    ds = object.__new__(DataService)
+    ds.seller_registry = FakeSellerRegistry()
+    ds.receipt_cache = FakeReceiptCache()
+    ds.receipt_Dynamo_DB = FakeReceiptStore()
+    ds.receipt_smart_contract_interface = contract_interface
+    ds.indexer_enabled = False
+    ds.release_scheduler = None
+    return ds
+
+def entries(buyers):
+    return [{'seller_address': 'seller', 'buyer_address': buyer, 'amount_eth': 0.01, 'item_name': 'item'} for buyer in buyers]
+
+def test_each_buyer_pays_without_payer():
+    contract_interface = FakeContractInterface()
+    ds = make_data_service(contract_interface)
+
+    response, success, _ = asyncio.run(ds.issue_receipts_batch(entries(['b1', 'b2', 'b1'])))
+
+    assert success and response['issued'] == 3
+    assert sorted(contract_interface.transactions) == [('b1', ['b1', 'b1']), ('b2', ['b2'])]
+
+def test_payer_sends_one_transaction_for_distinct_buyers():
+    contract_interface = FakeContractInterface()
+    ds = make_data_service(contract_interface)
+
+    response, success, _ = asyncio.run(ds.issue_receipts_batch(entries(['b1', 'b2', 'b3']), payer_address='checkout'))
+
+    assert success and response['issued'] == 3
+    assert contract_interface.transactions == [('checkout', ['b1', 'b2', 'b3'])]
+    assert [result['receipt_details']['buyer_address'] for result in response['results']] == ['b1', 'b2', 'b3']
+    assert len(ds.receipt_Dynamo_DB.saved) == 3
+
+def test_entries_without_an_event_are_failed():
+    contract_interface = FakeContractInterface(emitted=2)
+    ds = make_data_service(contract_interface)
+
+    response, success, _ = asyncio.run(ds.issue_receipts_batch(entries(['b1', 'b2', 'b3']), payer_address='checkout'))
+
+    assert success and response['issued'] == 2
+    assert [result['status'] for result in response['results']] == ['Success', 'Success', 'Failed']
+    assert 'no ReceiptIssued event' in response['results'][2]['reason']
+    assert [receipt['buyer_address'] for receipt in ds.receipt_Dynamo_DB.saved] == ['b1', 'b2']
@@ -0,0 +1,136 @@
+import asyncio
+import time
+import pytest
+from services.fee_oracle import FeeOracle
+from services.nonce_manager import NonceManager
+from services.smart_contract_interactions import ReceiptsContractInterface
+
+class FakeEth:
+    """Answers eth_getTransactionCount from pending, yielding first so concurrent callers interleave."""
+    def __init__(self, pending):
+        self.pending = pending
+        self.count_calls = 0
+
+    async def get_transaction_count(self, address, block_identifier):
+        assert block_identifier == 'pending'
+        self.count_calls += 1
+        await asyncio.sleep(0)
+        return self.pending[address]
+
+class FakeWeb3:
+    def __init__(self, pending):
+        self.eth = FakeEth(pending)
+
+    def to_checksum_address(self, address):
+        return address.lower()
+
+def test_concurrent_reservations_are_consecutive_and_in_order():
+    web3 = FakeWeb3({'0xseller': 5, '0xbuyer': 0})
+    nonce_manager = NonceManager(web3)
+
+    async def reserve():
+        return await asyncio.gather(*[nonce_manager.next_nonce('0xSELLER') for _ in range(10)], nonce_manager.next_nonce('0xbuyer'))
+
+    *seller_nonces, buyer_nonce = asyncio.run(reserve())
+
+    assert seller_nonces == list(range(5, 15))
+    assert buyer_nonce == 0
+    # The pending count is read once per address, not once per reservation
+    assert web3.eth.count_calls == 2
+
+def test_released_nonces_are_reused_lowest_first_before_new_ones():
+    nonce_manager = NonceManager(FakeWeb3({'0xseller': 0}))
+
+    async def run():
+        reserved = [await nonce_manager.next_nonce('0xseller') for _ in range(4)]
+        # The sends with nonces 2 and 1 failed before they were broadcast
+        nonce_manager.release_nonce('0xseller', 2)
+        nonce_manager.release_nonce('0xseller', 1)
+        return reserved, [await nonce_manager.next_nonce('0xseller') for _ in range(3)]
+
+    reserved, reused = asyncio.run(run())
+
+    assert reserved == [0, 1, 2, 3]
+    # No gap is left below 3, which would stall it and everything after it
+    assert reused == [1, 2, 4]
+
+def test_nonce_never_handed_out_is_not_released():
+    nonce_manager = NonceManager(FakeWeb3({'0xseller': 3}))
+
+    async def run():
+        first = await nonce_manager.next_nonce('0xseller')
+        nonce_manager.release_nonce('0xseller', 7)
+        return first, await nonce_manager.next_nonce('0xseller')
+
+    assert asyncio.run(run()) == (3, 4)
+
+def test_resync_after_nonce_too_low_reloads_the_pending_count():
+    web3 = FakeWeb3({'0xseller': 0})
+    nonce_manager = NonceManager(web3)
+
+    async def run():
+        await nonce_manager.next_nonce('0xseller')
+        await nonce_manager.next_nonce('0xseller')
+        nonce_manager.release_nonce('0xseller', 1)
+        # Another client sent from the account, so the node is already at 6
+        web3.eth.pending['0xseller'] = 6
+        await nonce_manager.resync('0xseller')
+        return [await nonce_manager.next_nonce('0xseller') for _ in range(2)]
+
+    # The released nonce 1 is below the node's count and is dropped along with the old state
+    assert asyncio.run(run()) == [6, 7]
+
+class FailingContractFunction:
+    fn_name = 'issueReceipt'
+    args = ()
+
+    def __init__(self, errors):
+        self.errors = list(errors)
+        self.sent_nonces = []
+
+    async def transact(self, tx_params):
+        self.sent_nonces.append(tx_params['nonce'])
+        if self.errors:
+            raise self.errors.pop(0)
+        return f"0xsent{tx_params['nonce']}"
+
+def make_interface(web3):
+    interface = object.__new__(ReceiptsContractInterface)
+    interface.preflight_mode = 'off'
+    interface.fee_oracle = FeeOracle(None)
+    interface.fee_oracle.estimates['issueReceipt'] = 40000
+    interface.fee_oracle.fees = {'gasPrice': 1}
+    interface.fee_oracle.fees_expire_at = time.monotonic() + 60
+    interface.chain_id = 1337
+    interface.nonce_manager = NonceManager(web3)
+    interface.signer = None
+    interface.balance_cache = {}
+    return interface
+
+def test_send_releases_the_nonce_of_a_failed_send():
+    interface = make_interface(FakeWeb3({'0xbuyer': 0}))
+    contract_function = FailingContractFunction([ValueError('insufficient funds for gas * price + value')])
+
+    async def run():
+        with pytest.raises(ValueError):
+            await interface.send_transaction(contract_function, {'from': '0xbuyer'})
+        return await interface.send_transaction(contract_function, {'from': '0xbuyer'})
+
+    assert asyncio.run(run()) == '0xsent0'
+    assert contract_function.sent_nonces == [0, 0]
+
+def test_send_resyncs_after_nonce_too_low():
+    web3 = FakeWeb3({'0xbuyer': 0})
+    interface = make_interface(web3)
+    contract_function = FailingContractFunction([ValueError('nonce too low')])
+
+    async def run():
+        # The node moved on without us, e.g. after a transaction sent from another client
+        await interface.nonce_manager.next_nonce('0xbuyer')
+        web3.eth.pending['0xbuyer'] = 4
+        with pytest.raises(ValueError):
+            await interface.send_transaction(contract_function, {'from': '0xbuyer'})
+        return await interface.send_transaction(contract_function, {'from': '0xbuyer'})
+
+    assert asyncio.run(run()) == '0xsent4'
+    assert contract_function.sent_nonces == [1, 4]
@@ -0,0 +1,15 @@
+import asyncio
+import pytest
+from services.dataservice import DataService
+from services.receipt_cache import ReceiptDetailsCache
+
+class EmptyReceiptStore:
+    def get_receipt_details(self, transaction_hash):
+        return None
+
+@pytest.mark.parametrize('action', ['request_return', 'funds_release'])
+def test_unknown_receipt_is_reported_not_raised(action):
+    ds = object.__new__(DataService)
+    ds.receipt_cache = ReceiptDetailsCache(EmptyReceiptStore())
+
+    assert asyncio.run(getattr(ds, action)('missing')) == (None, False, "Receipt not found")
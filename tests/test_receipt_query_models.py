@@ -0,0 +1,11 @@
+import pytest
+from pydantic import ValidationError
+from services.models import get_seller_receipts_model, get_buyer_receipts_model
+
+@pytest.mark.parametrize('model, address_field', [(get_seller_receipts_model, 'seller_address'), (get_buyer_receipts_model, 'buyer_address')])
+def test_limit_must_be_at_least_one(model, address_field):
+    for limit in (0, -1):
+        with pytest.raises(ValidationError):
+            model(**{address_field: '0xabc', 'limit': limit})
+    assert model(**{address_field: '0xabc', 'limit': 1}).limit == 1
+    assert model(**{address_field: '0xabc'}).limit is None
@@ -0,0 +1,78 @@
+import asyncio
+import time
+import pytest
+from web3.exceptions import ContractLogicError
+from services.fee_oracle import FeeOracle
+from services.smart_contract_interactions import ReceiptsContractInterface, revert_reason
+
+class FakeContractFunction:
+    fn_name = 'requestReturn'
+    args = (0,)
+
+    def __init__(self, reverts):
+        self.reverts = reverts
+        self.calls = []
+        self.estimates = 0
+        self.sent = []
+
+    async def call(self, tx_params):
+        self.calls.append(tx_params)
+        if self.reverts:
+            raise ContractLogicError('execution reverted: Return window has closed')
+
+    async def estimate_gas(self, tx_params):
+        self.estimates += 1
+        return 40000
+
+    async def transact(self, tx_params):
+        self.sent.append(tx_params)
+        return '0xsent'
+
+class FakeNonceManager:
+    def __init__(self):
+        self.reserved = []
+
+    async def next_nonce(self, sender):
+        self.reserved.append(sender)
+        return len(self.reserved) - 1
+
+def make_interface(preflight_mode):
+    interface = object.__new__(ReceiptsContractInterface)
+    interface.preflight_mode = preflight_mode
+    interface.fee_oracle = FeeOracle(None)
+    # requestReturn's gas was learned from an earlier estimate, and the fees are fresh
+    interface.fee_oracle.estimates['requestReturn'] = 40000
+    interface.fee_oracle.fees = {'gasPrice': 1}
+    interface.fee_oracle.fees_expire_at = time.monotonic() + 60
+    interface.chain_id = 1337
+    interface.nonce_manager = FakeNonceManager()
+    interface.signer = None
+    interface.balance_cache = {}
+    return interface
+
+def test_learned_gas_send_that_would_revert_fails_before_a_nonce():
+    interface = make_interface('view')
+    contract_function = FakeContractFunction(reverts=True)
+
+    with pytest.raises(ContractLogicError) as error:
+        asyncio.run(interface.send_transaction(contract_function, {'from': '0xbuyer'}))
+
+    assert revert_reason(error.value) == 'Return window has closed'
+    assert contract_function.calls == [{'from': '0xbuyer'}]
+    assert contract_function.estimates == 0
+    assert interface.nonce_manager.reserved == [] and contract_function.sent == []
+
+def test_learned_gas_send_goes_through_after_preflight():
+    interface = make_interface('view')
+    contract_function = FakeContractFunction(reverts=False)
+
+    assert asyncio.run(interface.send_transaction(contract_function, {'from': '0xbuyer'})) == '0xsent'
+    assert len(contract_function.calls) == 1 and contract_function.estimates == 0
+    assert contract_function.sent[0]['gas'] == 50000 and contract_function.sent[0]['nonce'] == 0
+
+def test_preflight_off_sends_without_a_call():
+    interface = make_interface('off')
+    contract_function = FakeContractFunction(reverts=True)
+
+    assert asyncio.run(interface.send_transaction(contract_function, {'from': '0xbuyer'})) == '0xsent'
+    assert contract_function.calls == []
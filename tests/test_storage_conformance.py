@@ -0,0 +1,153 @@
+"""
+Runs every storage backend through the same cases, so DataService and the indexer can rely on
+the contracts in services/storage.py whichever backend is configured.
+
+The SQLite stores always run. The DynamoDB stores run when STORAGE_CONFORMANCE_DYNAMODB_PREFIX is set,
+against tables named <prefix>Sellers, <prefix>Receipts, <prefix>Accounts and <prefix>AccountAddresses
+(created like the production tables, with the Receipts indexes). Those tables are cleared by the tests.
+"""
+import os
+from decimal import Decimal
+import pytest
+from services.storage import Stores, InvalidNextToken, encode_next_token
+
+def sqlite_stores(tmp_path):
+    from services.sqlite_service import SQLiteDatabase, SellersSQLite, ReceiptsSQLite, AccountsSQLite, AccountAddressesSQLite
+    database = SQLiteDatabase(str(tmp_path / 'receipts.db'))
+    return Stores(SellersSQLite(database), ReceiptsSQLite(database), AccountsSQLite(database), AccountAddressesSQLite(database))
+
+def dynamodb_stores(tmp_path):
+    prefix = os.getenv('STORAGE_CONFORMANCE_DYNAMODB_PREFIX')
+    if not prefix:
+        pytest.skip("STORAGE_CONFORMANCE_DYNAMODB_PREFIX is not set")
+    from services.dynamoDB_service import SellersDyanmoDB, ReceiptDyanmoDB, AccountsDynamoDB, AccountAddressesDynamoDB
+    return Stores(SellersDyanmoDB(f'{prefix}Sellers'), ReceiptDyanmoDB(f'{prefix}Receipts'), AccountsDynamoDB(f'{prefix}Accounts'), AccountAddressesDynamoDB(f'{prefix}AccountAddresses'))
+
+@pytest.fixture(params=[sqlite_stores, dynamodb_stores], ids=['sqlite', 'dynamodb'])
+def stores(request, tmp_path):
+    stores = request.param(tmp_path)
+    for store in (stores.sellers, stores.receipts, stores.accounts, stores.account_addresses):
+        store.clear_table()
+    return stores
+
+def receipt(transaction_hash, buyer_address='buyer-1', purchase_time='2024-01-01 00:00:00', receipt_index=0, amount='1.5', status='Active'):
+    return {
+        'transaction_hash': transaction_hash,
+        'buyer_address': buyer_address,
+        'seller_address': 'seller-1',
+        'seller_contract_address': 'contract-1',
+        'receipt_index': receipt_index,
+        'purchase_time': purchase_time,
+        'amount': Decimal(amount),
+        'item_name': 'item',
+        'status': status
+    }
+
+def test_sellers(stores):
+    seller = {'seller_address': 'seller-1', 'seller_contract_address': 'contract-1', 'return_window_days': 30}
+    stores.sellers.insert_seller(seller)
+    stores.sellers.insert_seller(dict(seller, seller_contract_address='contract-2'))
+
+    assert stores.sellers.seller_exists('seller-1')
+    assert not stores.sellers.seller_exists('seller-2')
+    assert stores.sellers.get_seller('seller-2') is None
+    assert stores.sellers.get_seller('seller-1')['seller_contract_address'] == 'contract-1'
+    assert stores.sellers.get_all_sellers() == [{'seller_address': 'seller-1', 'seller_contract_address': 'contract-1', 'return_window_days': 30}]
+
+def test_receipt_lookups(stores):
+    stores.receipts.insert_receipt(receipt('tx-1'))
+    assert stores.receipts.insert_receipts_batch([receipt('tx-2', receipt_index=1), receipt('tx-3', buyer_address='buyer-2')])
+
+    item = stores.receipts.search_by_transaction_id('tx-1')
+    assert item['amount'] == Decimal('1.5') and isinstance(item['amount'], Decimal)
+    assert stores.receipts.search_by_transaction_id('missing') is None
+    assert stores.receipts.get_receipt_details('tx-2') == {'contract_address': 'contract-1', 'buyer_address': 'buyer-1', 'seller_address': 'seller-1', 'receipt_index': 1}
+    assert stores.receipts.get_receipt_details('missing') is None
+    assert set(stores.receipts.get_receipts_details_batch(['tx-1', 'tx-3', 'missing', 'tx-1'])) == {'tx-1', 'tx-3'}
+    assert stores.receipts.find_receipt_hash('contract-1', 'buyer-1', 1) == 'tx-2'
+    assert stores.receipts.find_receipt_hash('contract-1', 'buyer-1', 5) is None
+    assert sorted(stores.receipts.get_unique_buyers()) == ['buyer-1', 'buyer-2']
+
+def test_search_orders_pages_and_filters(stores):
+    stores.receipts.insert_receipts_batch([
+        receipt('tx-b', purchase_time='2024-01-02 00:00:00', amount='2'),
+        receipt('tx-a', purchase_time='2024-01-01 00:00:00'),
+        receipt('tx-c', purchase_time='2024-01-03 00:00:00'),
+        receipt('tx-other', buyer_address='buyer-2', purchase_time='2024-01-04 00:00:00')
+    ])
+    # Pending receipts have no purchase_time yet and are not in the buyer/seller indexes
+    stores.receipts.insert_receipt({'transaction_hash': 'tx-pending', 'buyer_address': 'buyer-1', 'seller_address': 'seller-1', 'status': 'Pending'})
+
+    items, next_token = stores.receipts.search_by_buyer_address('buyer-1')
+    assert [item['transaction_hash'] for item in items] == ['tx-a', 'tx-b', 'tx-c'] and next_token is None
+    items, _ = stores.receipts.search_by_seller_address('seller-1', ascending=False)
+    assert [item['transaction_hash'] for item in items] == ['tx-other', 'tx-c', 'tx-b', 'tx-a']
+
+    pages = []
+    next_token = None
+    while True:
+        items, next_token = stores.receipts.search_by_buyer_address('buyer-1', limit=2, next_token=next_token)
+        pages.append([item['transaction_hash'] for item in items])
+        if next_token is None:
+            break
+    assert [transaction_hash for page in pages for transaction_hash in page] == ['tx-a', 'tx-b', 'tx-c']
+    assert pages[0] == ['tx-a', 'tx-b']
+
+    items, _ = stores.receipts.search_by_buyer_address('buyer-1', filter_by={'amount': 2})
+    assert [item['transaction_hash'] for item in items] == ['tx-b']
+    items, _ = stores.receipts.search_by_buyer_address('buyer-1', filter_by={'purchase_time': '2024-01-03 00:00:00'})
+    assert [item['transaction_hash'] for item in items] == ['tx-c']
+
+@pytest.mark.parametrize('next_token', ['not base64!', 'bm90IGpzb24', encode_next_token(['a', 'list'])])
+def test_search_rejects_a_malformed_next_token(stores, next_token):
+    with pytest.raises(InvalidNextToken):
+        stores.receipts.search_by_buyer_address('buyer-1', limit=2, next_token=next_token)
+
+def test_iter_receipt_pages(stores):
+    stores.receipts.insert_receipts_batch([receipt(f'tx-{i:02d}', purchase_time=f'2024-01-01 00:00:{i:02d}') for i in range(5)])
+
+    pages = list(stores.receipts.iter_receipt_pages(page_size=2, projection=['transaction_hash', 'status']))
+    items = [item for page in pages for item in page]
+    assert sorted(item['transaction_hash'] for item in items) == [f'tx-{i:02d}' for i in range(5)]
+    assert all(set(item) == {'transaction_hash', 'status'} for item in items)
+    by_buyer = [item['transaction_hash'] for page in stores.receipts.iter_receipt_pages('buyer_address', 'buyer-1', ascending=False, page_size=2) for item in page]
+    assert by_buyer == [f'tx-{i:02d}' for i in reversed(range(5))]
+    assert len(stores.receipts.get_all_transactions()) == 5
+
+def test_status_changes_and_upserts(stores):
+    stores.receipts.insert_receipts_batch([receipt('tx-1'), receipt('tx-2', receipt_index=1)])
+
+    stores.receipts.change_receipt_status('tx-1', 'Returned', 'return_time')
+    assert stores.receipts.change_receipts_status_batch(['tx-2'], 'Funds Released to Seller', 'funds_release_time')
+    first, second = stores.receipts.search_by_transaction_id('tx-1'), stores.receipts.search_by_transaction_id('tx-2')
+    assert first['status'] == 'Returned' and 'return_time' in first and first['item_name'] == 'item'
+    assert second['status'] == 'Funds Released to Seller' and 'funds_release_time' in second
+
+    assert stores.receipts.upsert_receipts({
+        'tx-1': {'status': 'Active', 'item_name': 'renamed'},
+        'tx-new': {'status': 'Pending', 'item_name': 'new'}
+    }, keep_existing=('status',))
+    assert stores.receipts.search_by_transaction_id('tx-1')['status'] == 'Returned'
+    assert stores.receipts.search_by_transaction_id('tx-1')['item_name'] == 'renamed'
+    assert stores.receipts.search_by_transaction_id('tx-new')['status'] == 'Pending'
+
+def test_accounts(stores):
+    assert stores.accounts.insert_account({'user_id': 'alice', 'account_address': '0xA', 'password': 'hash-1'})[0]
+    assert not stores.accounts.insert_account({'user_id': 'alice', 'account_address': '0xB', 'password': 'hash-2'})[0]
+
+    assert stores.accounts.account_exists('bob') == []
+    assert stores.accounts.account_exists('alice')[0]['account_address'] == '0xA'
+    stores.accounts.update_password('alice', 'hash-3')
+    assert stores.accounts.account_exists('alice')[0]['password'] == 'hash-3'
+    assert [account['user_id'] for account in stores.accounts.address_used('0xA')] == ['alice']
+    assert stores.accounts.address_used('0xB') == []
+    assert stores.accounts.get_all_accounts() == [{'user_id': 'alice', 'account_address': '0xA'}]
+
+def test_account_address_claims(stores):
+    assert stores.account_addresses.claim_address('0xA', 'alice') is True
+    assert stores.account_addresses.claim_address('0xA', 'bob') is False
+    assert stores.account_addresses.get_claimed_addresses() == {'0xA'}
+
+    stores.account_addresses.release_address('0xA')
+    assert stores.account_addresses.get_claimed_addresses() == set()
+    assert stores.account_addresses.claim_address('0xA', 'bob') is True
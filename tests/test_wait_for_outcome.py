@@ -0,0 +1,57 @@
+import asyncio
+import pytest
+from hexbytes import HexBytes
+from web3.exceptions import ContractLogicError
+from services.smart_contract_interactions import ReceiptsContractInterface, revert_reason
+
+class FakeEth:
+    def __init__(self, replay_reverts):
+        self.replay_reverts = replay_reverts
+        self.calls = []
+
+    async def get_transaction(self, tx_hash):
+        return {'from': '0xbuyer', 'to': '0xcontract', 'input': '0x', 'value': 0, 'gas': 50000}
+
+    async def call(self, transaction, block_identifier):
+        self.calls.append(block_identifier)
+        if self.replay_reverts:
+            raise ContractLogicError('execution reverted: Return window has closed')
+        return b''
+
+class FakeWeb3:
+    def __init__(self, replay_reverts):
+        self.eth = FakeEth(replay_reverts)
+
+def make_interface(tx_receipt, replay_reverts):
+    interface = object.__new__(ReceiptsContractInterface)
+    interface.web3 = FakeWeb3(replay_reverts)
+
+    async def wait_for_receipt(tx_hash):
+        return tx_receipt
+    interface.wait_for_receipt = wait_for_receipt
+    return interface
+
+def reverted_receipt():
+    return {'status': 0, 'blockNumber': 7, 'transactionHash': HexBytes('0x' + 'ab' * 32), 'gasUsed': 50000}
+
+def test_replay_runs_on_parent_block_and_reports_reason():
+    interface = make_interface(reverted_receipt(), replay_reverts=True)
+
+    with pytest.raises(ContractLogicError) as error:
+        asyncio.run(interface.wait_for_outcome('0xab'))
+
+    assert revert_reason(error.value) == 'Return window has closed'
+    assert interface.web3.eth.calls == [6]
+
+def test_status_zero_raises_even_if_replay_succeeds():
+    interface = make_interface(reverted_receipt(), replay_reverts=False)
+
+    with pytest.raises(ContractLogicError, match='reverted'):
+        asyncio.run(interface.wait_for_outcome('0xab'))
+
+def test_successful_transaction_returns_receipt():
+    tx_receipt = dict(reverted_receipt(), status=1)
+    interface = make_interface(tx_receipt, replay_reverts=True)
+
+    assert asyncio.run(interface.wait_for_outcome('0xab')) is tx_receipt
+    assert interface.web3.eth.calls == []